@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成 Solidity 语料生成器（基准测试用）
+Synthetic Solidity corpus for the offline benchmarks.
+
+- 入口文件按 --pragmas 给定的比例分布在各 solc 版本上，pragma 写法轮换（精确、^、>=,<）
+- 公共库组成 --depth 层的 import 链，入口从链的不同位置 import，多个入口共享同一批库
+- 正文含快筛会命中的模式（call.value、tx.origin、onlyOwner、unchecked 等），
+  也有只出现在注释 / 字符串里的关键词；--dup 比例的入口与另一入口内容完全相同
+- --broken 比例的入口含 SYNTAX_ERROR 标记，stubs.py 的 solc 会对其报编译错误
+- 每 1000 个入口一个子目录，避免单目录过大
+
+用法 / Usage:
+  python3 bench/gen_corpus.py --n 10000 --out /tmp/corpus/datasets
+"""
+import argparse, random
+from pathlib import Path
+
+DEFAULT_PRAGMAS = "0.4.26:3,0.5.17:1,0.6.12:1,0.7.6:1,0.8.20:4"
+
+BODY = """
+    // reentrancy guard is NOT used here (comment only)
+    mapping(address => uint256) public balances{i};
+    address public owner{i};
+    string public note{i} = "tx.origin is not checked in this string";
+
+    modifier onlyOwner{i}() {{ require(msg.sender == owner{i}); _; }}
+
+    function deposit{i}() public payable {{
+        balances{i}[msg.sender] = balances{i}[msg.sender] + msg.value;
+    }}
+
+    function withdraw{i}(uint256 amount) public {{
+        require(balances{i}[msg.sender] >= amount);
+        {call}
+        balances{i}[msg.sender] = balances{i}[msg.sender] - amount;
+    }}
+
+    function auth{i}() public view returns (bool) {{
+        return tx.origin == owner{i};
+    }}
+"""
+
+CALLS = {
+    "0.4": 'require(msg.sender.call.value(amount)());',
+    "0.5": '(bool ok, ) = msg.sender.call.value(amount)(""); require(ok);',
+    "0.6": '(bool ok, ) = msg.sender.call{value: amount}(""); require(ok);',
+    "0.7": '(bool ok, ) = msg.sender.call{value: amount}(""); require(ok);',
+    "0.8": 'unchecked { (bool ok, ) = msg.sender.call{value: amount}(""); require(ok); }',
+}
+
+def pragma_line(ver: str, k: int) -> str:
+    major, minor, _ = ver.split(".")
+    forms = [f"pragma solidity {ver};",
+             f"pragma solidity ^{ver};",
+             f"pragma solidity >={major}.{minor}.0 <{major}.{int(minor)+1}.0;"]
+    return forms[k % len(forms)]
+
+def parse_mix(spec: str):
+    out = []
+    for part in spec.split(","):
+        ver, _, w = part.partition(":")
+        out.append((ver.strip(), float(w or 1)))
+    return out
+
+def gen_libs(root: Path, depth: int, chains: int):
+    """chains 条深度为 depth 的库链：lib/c{j}/L{k}.sol import L{k-1}.sol"""
+    heads = []
+    for j in range(chains):
+        d = root / "lib" / f"c{j}"
+        d.mkdir(parents=True, exist_ok=True)
+        for k in range(depth):
+            imp = f'import "./L{k-1}.sol";\n' if k else ""
+            (d / f"L{k}.sol").write_text(
+                f"// SPDX-License-Identifier: MIT\npragma solidity >=0.4.0 <0.9.0;\n{imp}\nlibrary C{j}L{k} {{\n"
+                f"    function add(uint a, uint b) internal pure returns (uint) {{ return a + b; }}\n"
+                f"    function sub(uint a, uint b) internal pure returns (uint) {{ return a - b; }}\n}}\n",
+                encoding="utf-8")
+        heads.append([d / f"L{k}.sol" for k in range(depth)])
+    return heads
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=100, help="入口文件数")
+    ap.add_argument("--out", required=True, help="输出目录（作为 datasets/）")
+    ap.add_argument("--pragmas", default=DEFAULT_PRAGMAS, help="版本:权重,...")
+    ap.add_argument("--depth", type=int, default=3, help="import 链深度，0 表示不 import")
+    ap.add_argument("--chains", type=int, default=8, help="公共库链条数")
+    ap.add_argument("--contracts", type=int, default=2, help="每个入口的合约数")
+    ap.add_argument("--dup", type=float, default=0.05, help="与已有入口内容完全相同的比例")
+    ap.add_argument("--broken", type=float, default=0.0, help="编译失败的入口比例")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    root = Path(args.out)
+    root.mkdir(parents=True, exist_ok=True)
+    heads = gen_libs(root, args.depth, args.chains) if args.depth > 0 else []
+    mix = parse_mix(args.pragmas)
+    vers, weights = [v for v, _ in mix], [w for _, w in mix]
+
+    written = []
+    for i in range(args.n):
+        d = root / f"s{i // 1000:04d}"
+        d.mkdir(exist_ok=True)
+        p = d / f"C{i:06d}.sol"
+        if written and rnd.random() < args.dup:
+            p.write_bytes(rnd.choice(written).read_bytes())
+            continue
+        ver = rnd.choices(vers, weights)[0]
+        lines = ["// SPDX-License-Identifier: MIT", pragma_line(ver, i)]
+        if heads:
+            chain = heads[i % len(heads)]
+            lib = chain[rnd.randrange(len(chain))]
+            lines.append(f'import "../{lib.relative_to(root).as_posix()}";')
+        if rnd.random() < args.broken:
+            lines.append("// SYNTAX_ERROR")
+        call = CALLS[ver[:3]]
+        for c in range(args.contracts):
+            kind = "interface" if c == args.contracts - 1 and c > 0 and i % 4 == 0 else "contract"
+            if kind == "interface":
+                lines.append(f"interface I{i}_{c} {{ function ping() external; }}")
+            else:
+                lines.append(f"contract C{i}_{c} {{" + BODY.format(i=c, call=call) + "}")
+        p.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        if len(written) < 256:
+            written.append(p)
+    print(f"[OK] {args.n} entries -> {root} (versions: {', '.join(vers)}; import depth {args.depth})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+slither 库的替身（run_bench.py 把 bench/pylib 加入 PYTHONPATH），供 slither_worker.py 的常驻 worker 导入。
+导入时付出 BENCH_STARTUP_SLITHER 秒，每次分析 BENCH_LATENCY_SLITHER 秒，结果与 stubs.py 的 CLI 替身相同。
+BENCH_LEAK_SLITHER：每次分析后留在进程里不释放的内存（KB，默认 0），模拟常驻 worker 的泄漏。
+"""
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import stubs
+
+stubs.slither_startup()
+_leaked = []
+
+class Slither:
+    def __init__(self, target, **kw):
+        self.target = target
+        self.detectors = []
+        stubs.sleep("SLITHER")
+        err = stubs.slither_load_error(str(target))
+        if err:
+            raise ValueError(err)
+
+    def register_detector(self, d):
+        self.detectors.append(d)
+
+    def run_detectors(self):
+        leak = stubs.env_num("BENCH_LEAK_SLITHER", 0, int)
+        if leak:
+            _leaked.append(b"\x01" * (leak * 1024))     # 写满的页才计入 RSS
+        return [stubs.slither_results(self.target)]
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线基准：合成语料 + 工具替身，测量各阶段脚本自身的编排开销
+Hermetic benchmark runner for the pipeline scripts.
+
+每个规模在独立的临时目录中进行：复制 scripts/ tools/ config/，用 gen_corpus.py 生成 datasets/，
+HOME 指向临时目录（其中的 ~/.solc-select/artifacts 由 stubs.py 的软链接组成），PATH 最前面是
+stubs.py 的 solc / solc-select / slither / myth（--forge 时还有 forge），PYTHONPATH 中有 slither 库的替身
+（bench/pylib，03 的常驻 worker 导入它）。依次运行：
+
+  prepare       scripts/01_prepare.py（冷启动）
+  prepare-warm  scripts/01_prepare.py（增量，无变化）
+  screen        scripts/02_quick_screen.py
+  slither       scripts/03_run_slither.py --no-cache
+  mythril       scripts/04_run_mythril.py --no-cache
+  summarize     tools/summarize.py
+  report        tools/make_report.py --pmap config/p_mapping.yaml
+
+每个阶段记录墙钟、CPU（user+sys）、峰值 RSS（os.wait4）与吞吐（文件/秒），汇总成表格，
+--json 时另存结果，便于与之前的基线比较。
+
+用法 / Usage:
+  python3 bench/run_bench.py                              # 100 个文件
+  python3 bench/run_bench.py --sizes 100,10000,100000 --json bench.json
+  BENCH_LATENCY_MYTH=0.5 python3 bench/run_bench.py --stages prepare,mythril -j 8
+  BENCH_STARTUP_SLITHER=1 python3 bench/run_bench.py --stages prepare,slither --cold-slither   # 对比常驻 worker
+"""
+import argparse, json, os, shutil, subprocess, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCH = ROOT / "bench"
+STUB = BENCH / "stubs.py"
+TOOLS = ["solc", "solc-select", "slither", "myth"]
+STAGES = ["prepare", "prepare-warm", "screen", "slither", "mythril", "summarize", "report"]
+
+def setup_tree(tmp: Path, n: int, args) -> dict:
+    for d in ("scripts", "tools", "config"):
+        shutil.copytree(ROOT / d, tmp / d, ignore=shutil.ignore_patterns("__pycache__"))
+    subprocess.run([sys.executable, str(BENCH / "gen_corpus.py"), "--n", str(n), "--out", str(tmp / "datasets"),
+                    "--pragmas", args.pragmas, "--depth", str(args.depth), "--seed", str(args.seed),
+                    "--broken", str(args.broken)],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    bindir = tmp / "bin"
+    bindir.mkdir()
+    for name in TOOLS + (["forge"] if args.forge else []):
+        (bindir / name).symlink_to(STUB)
+    home = tmp / "home"
+    for part in args.pragmas.split(","):
+        ver = part.split(":")[0].strip()
+        d = home / ".solc-select" / "artifacts" / f"solc-{ver}"
+        d.mkdir(parents=True, exist_ok=True)
+        (d / f"solc-{ver}").symlink_to(STUB)
+
+    env = dict(os.environ)
+    env["HOME"] = str(home)
+    env["PATH"] = f"{bindir}{os.pathsep}{env.get('PATH', '')}"
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BENCH / "pylib"), env.get("PYTHONPATH")]))
+    env.pop("METRICS_FILE", None)
+    return env
+
+def link_reports(tmp: Path) -> Path:
+    """
+    把 03/04 的输出按 tools/ 流程的命名放到 out/bench/：<name>.slither.json 直接硬链接；
+    04 输出的是 jsonv2（报告列表），summarize / make_report 读的是 run_one.sh 的 -o json 结构，转换一次
+    """
+    dst = tmp / "out" / "bench"
+    dst.mkdir(parents=True, exist_ok=True)
+    for p in (tmp / "out" / "slither").glob("*.json"):
+        target = dst / (p.stem + ".slither.json")
+        if not target.exists():
+            os.link(p, target)
+    for p in (tmp / "out" / "mythril").glob("*.json"):
+        target = dst / (p.stem + ".myth.json")
+        if target.exists():
+            continue
+        try:
+            reports = json.loads(p.read_text(encoding="utf-8"))
+        except ValueError:
+            continue
+        issues = [{"swc-id": f"SWC-{it.get('swcID')}", "title": it.get("swcTitle"), "severity": it.get("severity")}
+                  for rep in (reports if isinstance(reports, list) else [reports]) for it in rep.get("issues") or []]
+        target.write_text(json.dumps({"success": True, "error": None, "issues": issues}), encoding="utf-8")
+    return dst
+
+def stage_cmd(stage: str, tmp: Path, workers: int, batch: int = 0, clusters: bool = True, warm: bool = True):
+    py = sys.executable
+    prep = [py, "scripts/01_prepare.py", "-j", str(workers)] + (["--batch", str(batch)] if batch else [])
+    scan = [] if clusters else ["--no-clusters"]
+    cold = [] if warm else ["--no-warm"]
+    return {
+        "prepare":      prep,
+        "prepare-warm": prep,
+        "screen":       [py, "scripts/02_quick_screen.py", "-j", str(workers)],
+        "slither":      [py, "scripts/03_run_slither.py", "-j", str(workers), "--no-cache"] + scan + cold,
+        "mythril":      [py, "scripts/04_run_mythril.py", "-j", str(workers), "--no-cache", "--timeout", "10"] + scan,
+        "summarize":    [py, "tools/summarize.py", "out/bench"],
+        "report":       [py, "tools/make_report.py", "out/bench", "--pmap", "config/p_mapping.yaml",
+                         "--emit-md", "out/bench/report.md", "--emit-csv", "out/bench/findings.csv"],
+    }[stage]
+
+def timed(cmd, cwd: Path, env: dict, log: Path) -> dict:
+    t0 = time.monotonic()
+    with open(log, "w") as lf:
+        p = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=lf, stderr=subprocess.STDOUT)
+        _, status, ru = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    return {"rc": p.returncode, "wall": time.monotonic() - t0,
+            "cpu": ru.ru_utime + ru.ru_stime, "maxrss_mb": ru.ru_maxrss / 1024}
+
+def bench_size(n: int, args) -> list:
+    tmp = Path(tempfile.mkdtemp(prefix=f"bench-{n}-"))
+    try:
+        t0 = time.monotonic()
+        env = setup_tree(tmp, n, args)
+        print(f"[I] n={n}: corpus ready in {time.monotonic() - t0:.1f}s ({tmp})")
+        (tmp / "logs").mkdir()
+        rows = []
+        for stage in args.stages:
+            if stage in ("summarize", "report"):
+                link_reports(tmp)
+            cmd = stage_cmd(stage, tmp, args.workers, args.batch, not args.no_clusters, not args.cold_slither)
+            r = timed(cmd, tmp, env, tmp / "logs" / f"{stage}.log")
+            r.update(size=n, stage=stage, files_per_s=n / r["wall"] if r["wall"] else 0.0)
+            rows.append(r)
+            flag = "" if r["rc"] == 0 else f"  [rc={r['rc']}, see {tmp}/logs/{stage}.log]"
+            print(f"    {stage:<13} {r['wall']:8.2f}s  cpu {r['cpu']:8.2f}s  rss {r['maxrss_mb']:7.1f}MB  "
+                  f"{r['files_per_s']:9.1f} files/s{flag}")
+            if r["rc"] != 0:
+                args.keep = True
+        return rows
+    finally:
+        if args.keep:
+            print(f"[I] kept {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100", help="逗号分隔的语料规模，如 100,10000,100000")
+    ap.add_argument("--stages", default=",".join(STAGES), help=f"要测的阶段（默认全部：{','.join(STAGES)}）")
+    ap.add_argument("-j", "--workers", type=int, default=4)
+    ap.add_argument("--pragmas", default="0.4.26:3,0.5.17:1,0.6.12:1,0.7.6:1,0.8.20:4")
+    ap.add_argument("--depth", type=int, default=3, help="语料 import 链深度")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--broken", type=float, default=0.0, help="编译失败的入口比例")
+    ap.add_argument("--batch", type=int, default=0, help="01_prepare.py --batch（0 为其默认值）")
+    ap.add_argument("--forge", action="store_true", help="PATH 中加入 forge 替身（prepare 走 forge flatten）")
+    ap.add_argument("--no-clusters", action="store_true", help="03 / 04 不做克隆聚类（合成语料几乎全是克隆）")
+    ap.add_argument("--cold-slither", action="store_true", help="03 每个文件起一个 slither CLI（--no-warm）")
+    ap.add_argument("--keep", action="store_true", help="保留临时目录")
+    ap.add_argument("--json", help="结果另存为 JSON")
+    args = ap.parse_args()
+    args.stages = [s for s in args.stages.split(",") if s]
+    bad = set(args.stages) - set(STAGES)
+    if bad:
+        ap.error(f"unknown stages: {', '.join(sorted(bad))}")
+
+    results = []
+    for n in (int(x) for x in args.sizes.split(",") if x):
+        results += bench_size(n, args)
+
+    print(f"\n{'size':>8} {'stage':<13} {'wall(s)':>9} {'cpu(s)':>9} {'rss(MB)':>8} {'files/s':>10}")
+    for r in results:
+        print(f"{r['size']:>8} {r['stage']:<13} {r['wall']:9.2f} {r['cpu']:9.2f} {r['maxrss_mb']:8.1f} {r['files_per_s']:10.1f}")
+    if args.json:
+        meta = {"python": sys.version.split()[0], "cpus": os.cpu_count(), "workers": args.workers,
+                "pragmas": args.pragmas, "depth": args.depth, "ts": time.time()}
+        Path(args.json).write_text(json.dumps({"meta": meta, "results": results}, indent=2), encoding="utf-8")
+        print(f"[OK] Wrote {args.json}")
+    sys.exit(1 if any(r["rc"] for r in results) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+solc / solc-select / slither / myth / forge 的替身（多调用程序，按 argv[0] 的文件名分派）
+Stand-ins for the external tools so the scripts can be benchmarked offline.
+
+run_bench.py 会把这些名字（以及 solc-select 目录下的 solc-<ver>）软链接到本文件。
+输出的 JSON 结构与真实工具一致，延迟与体积可调：
+  BENCH_LATENCY            所有工具每次调用的固定延迟（秒，默认 0）
+  BENCH_LATENCY_<TOOL>     单个工具的延迟，TOOL 为 SOLC / SLITHER / MYTH / FORGE
+  BENCH_STARTUP_SLITHER    slither 每次启动（导入 slither / crytic-compile、加载 detector）的固定开销（秒，默认 0）；
+                           bench/pylib/slither 是库形式的替身，常驻 worker 只在导入时付一次
+  BENCH_FINDINGS           每个文件的 Slither detector 条数 / 每个合约的 Mythril issue 条数（默认 3）
+  BENCH_BYTECODE           每个合约 runtime bytecode 的字节数（默认 2048）
+源码中含 SYNTAX_ERROR、或 0.6.8 起同一文件有多个 SPDX 标识时 solc 报错退出（--standard-json 时在 errors 中报告该文件）。
+solc 的 srcmap-runtime 把每条指令映射到合约定义（字节偏移），myth -c 的 issue 位置是 bytecode 中的 pc。
+"""
+import json, os, re, sys, time
+
+CONTRACT_RE = re.compile(r'\b(contract|interface|library)\s+(\w+)')
+DETECTORS = [("reentrancy-eth", "High"), ("tx-origin", "Medium"), ("timestamp", "Low"),
+             ("unchecked-send", "Medium"), ("missing-zero-check", "Low"), ("solc-version", "Informational")]
+SWCS = [("107", "External Call To User-Supplied Address"), ("115", "Dependence on tx.origin"),
+        ("101", "Integer Arithmetic Bugs"), ("104", "Unchecked return value from external call.")]
+
+def env_num(name, default, cast=float):
+    try:
+        return cast(os.environ.get(name) or default)
+    except ValueError:
+        return default
+
+def sleep(tool):
+    time.sleep(env_num(f"BENCH_LATENCY_{tool}", env_num("BENCH_LATENCY", 0)))
+
+def read(path):
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+def solc_error(text, ver):
+    """与真实 solc 一致的两类报错；无错误返回空串"""
+    if "SYNTAX_ERROR" in text:
+        return "ParserError: Expected pragma, import directive or contract/interface/library definition."
+    if text.count("SPDX-License-Identifier:") > 1 and tuple(map(int, ver.split(".")[:3])) >= (0, 6, 8):
+        return "ParserError: Multiple SPDX license identifiers found in source file. " \
+               "Use \"AND\" or \"OR\" to combine multiple licenses."
+    return ""
+
+def contracts(text, i, nbytes):
+    """源码中的合约 → [(名字, runtime bytecode, srcmap-runtime)]；i 为该文件在 srcmap 中的序号"""
+    res = []
+    raw = text.encode("utf-8")
+    for m in CONTRACT_RE.finditer(text):
+        kind, cname = m.groups()
+        if kind == "interface":
+            res.append((cname, "", ""))
+            continue
+        code = "6080604052" + "5b" * max(0, nbytes - 5)
+        start = len(text[:m.start()].encode("utf-8"))
+        end = raw.find(b"}", start) + 1 or len(raw)
+        # PUSH1 80, PUSH1 40, MSTORE, 之后每个字节一条 JUMPDEST；后续条目全部沿用第一条
+        res.append((cname, code, f"{start}:{end - start}:{i}:-" + ";" * (2 + max(0, nbytes - 5))))
+    return res
+
+def solc(name, argv):
+    ver = name[len("solc-"):] if name.startswith("solc-") else os.environ.get("SOLC_VERSION", "0.8.20")
+    if "--version" in argv:
+        print(f"solc, the solidity compiler commandline interface\nVersion: {ver}+commit.stub.Linux.g++")
+        return 0
+    sleep("SOLC")
+    if "--standard-json" in argv:
+        return solc_standard(ver)
+    files = [a for a in argv if a.endswith(".sol")]
+    nbytes = env_num("BENCH_BYTECODE", 2048, int)
+    out = {"contracts": {}, "sourceList": files, "sources": {}, "version": f"{ver}+commit.stub.Linux.g++"}
+    for i, f in enumerate(files):
+        text = read(f)
+        err = solc_error(text, ver)
+        if err:
+            print(f"{f}:1:1: {err}", file=sys.stderr)
+            return 1
+        for cname, code, srcmap in contracts(text, i, nbytes):
+            out["contracts"][f"{f}:{cname}"] = {"abi": "[]", "bin": code, "bin-runtime": code,
+                                                "srcmap": "0:0:0:-", "srcmap-runtime": srcmap}
+        out["sources"][f] = {"AST": {"absolutePath": f, "id": i, "nodeType": "SourceUnit", "nodes": [],
+                                     "src": f"0:{len(text.encode('utf-8'))}:{i}"}}
+    print(json.dumps(out))
+    return 0
+
+def solc_standard(ver):
+    """--standard-json：与真实 solc 一样，任一源文件出错时整批都没有 bytecode"""
+    inp = json.load(sys.stdin)
+    nbytes = env_num("BENCH_BYTECODE", 2048, int)
+    out = {"contracts": {}, "sources": {}, "errors": []}
+    for i, (name, src) in enumerate(sorted(inp.get("sources", {}).items())):
+        text = src.get("content") or read(src["urls"][0])
+        err = solc_error(text, ver)
+        if err:
+            out["errors"].append({"severity": "error", "type": "ParserError", "message": err.split(": ", 1)[1],
+                                  "sourceLocation": {"file": name, "start": 0, "end": 1},
+                                  "formattedMessage": f"{err}\n --> {name}:1:1:"})
+        ast = "legacyAST" if tuple(map(int, ver.split(".")[:3])) < (0, 8, 0) else "ast"
+        out["sources"][name] = {"id": i, ast: {"absolutePath": name, "id": i, "nodeType": "SourceUnit", "nodes": [],
+                                               "src": f"0:{len(text.encode('utf-8'))}:{i}"}}
+        out["contracts"][name] = {}
+        for cname, code, srcmap in contracts(text, i, nbytes):
+            out["contracts"][name][cname] = {"abi": [], "evm": {
+                "bytecode": {"object": code, "sourceMap": "0:0:0:-"},
+                "deployedBytecode": {"object": code, "sourceMap": srcmap}}}
+    if out["errors"]:
+        out["contracts"] = {}
+    print(json.dumps(out))
+    return 0
+
+def slither_startup():
+    time.sleep(env_num("BENCH_STARTUP_SLITHER", 0))
+
+def slither_results(target):
+    """一个文件的 detector 结果（CLI 替身与库替身共用）"""
+    n = env_num("BENCH_FINDINGS", 3, int)
+    dets = []
+    for k in range(n):
+        check, impact = DETECTORS[k % len(DETECTORS)]
+        dets.append({"check": check, "impact": impact, "confidence": "Medium",
+                     "description": f"{check} in {os.path.basename(target)} (stub #{k})",
+                     "elements": [{"type": "function", "name": f"f{k}",
+                                   "source_mapping": {"filename_short": os.path.basename(target),
+                                                      "lines": [10 + k, 11 + k]}}]})
+    return dets
+
+def slither_load_error(target):
+    """与 crytic-compile 一样：.json 目标只有 *_export.json 才按导出文件载入，其余当作源码编译而失败"""
+    if target.endswith(".json") and not target.endswith("_export.json"):
+        return f"InvalidCompilation: Invalid solc compilation {os.path.basename(target)}"
+    return ""
+
+def slither(argv):
+    slither_startup()
+    if argv[:1] == ["--version"]:
+        print("0.10.0-stub")
+        return 0
+    sleep("SLITHER")
+    target = argv[0]
+    out_json = argv[argv.index("--json") + 1]
+    err = slither_load_error(target)
+    if err:
+        with open(out_json, "w") as f:
+            json.dump({"success": False, "error": err, "results": {}}, f)
+        print(err, file=sys.stderr)
+        return 1
+    dets = slither_results(target)
+    with open(out_json, "w") as f:
+        json.dump({"success": True, "error": None, "results": {"detectors": dets}}, f)
+    return 255 if dets else 0  # 与真实 slither 一样：有发现时退出码非 0
+
+def myth(argv):
+    if argv[:1] in (["version"], ["--version"]):
+        print("Mythril version v0.24.8-stub")
+        return 0
+    sleep("MYTH")
+    n = env_num("BENCH_FINDINGS", 3, int)
+    issues = []
+    bytecode = "-c" in argv
+    for k in range(n):
+        swc, title = SWCS[k % len(SWCS)]
+        # 与真实 myth 一样：-c 时位置是 "pc:1:0"（这里取 JUMPDEST 的 pc），源码模式时是源码偏移
+        loc = f"{5 + k * 10}:1:0" if bytecode else f"{k * 10}:5:0"
+        issues.append({"swcID": swc, "swcTitle": title, "severity": "Medium",
+                       "description": {"head": title, "tail": "stub"},
+                       "locations": [{"sourceMap": loc}], "extra": {}})
+    print(json.dumps([{"issues": issues, "meta": {"mythril_execution_info": {}},
+                       "sourceType": "raw-bytecode" if bytecode else "solidity-file",
+                       "sourceFormat": "evm-byzantium-bytecode" if bytecode else "text",
+                       "sourceList": [] if bytecode else [a for a in argv if a.endswith(".sol")][:1]}]))
+    return 0
+
+def forge(argv):
+    if argv[:1] != ["flatten"]:
+        print("forge 0.2.0 (stub)")
+        return 0
+    sleep("FORGE")
+    # 与真实 forge flatten 一样：依赖在前、入口在后，每个文件的内容前有一行 "// <相对项目根（当前目录）的路径>"
+    parts, seen = [], set()
+    def visit(src, top):
+        if src in seen:
+            return
+        seen.add(src)
+        text = read(src)
+        for m in re.finditer(r'^\s*import\s+["\']([^"\']+)["\'];', text, re.MULTILINE):
+            dep = os.path.normpath(os.path.join(os.path.dirname(src), m.group(1)))
+            if os.path.exists(dep):
+                visit(dep, False)
+        body = re.sub(r'^\s*import\b.*$', "", text, flags=re.MULTILINE)
+        if not top:
+            body = re.sub(r'^\s*(pragma\b.*|//\s*SPDX-License-Identifier:.*)$', "", body, flags=re.MULTILINE)
+        parts.append(f"// {os.path.relpath(src)}\n{body}")
+    visit(os.path.normpath(argv[1]), True)
+    print("\n".join(parts))
+    return 0
+
+def solc_select(argv):
+    cmd = argv[0] if argv else ""
+    home = os.path.join(os.path.expanduser("~"), ".solc-select", "artifacts")
+    if cmd == "versions":
+        for d in sorted(os.listdir(home)) if os.path.isdir(home) else []:
+            print(d[len("solc-"):])
+    return 0
+
+def main():
+    name = os.path.basename(sys.argv[0])
+    argv = sys.argv[1:]
+    if name == "solc-select":
+        return solc_select(argv)
+    if name == "solc" or name.startswith("solc-"):
+        return solc(name, argv)
+    if name == "slither":
+        return slither(argv)
+    if name == "myth":
+        return myth(argv)
+    if name == "forge":
+        return forge(argv)
+    print(f"stubs.py: unknown tool name {name!r}", file=sys.stderr)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, re, subprocess
+import argparse, hashlib, json, os, re, shutil, threading
 from pathlib import Path
-from typing import List, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from solc_resolver import SolcResolver, parse_version
+from artifacts import (ARTIFACT_DIR, COMBINED_FIELDS, STANDARD_JSON_MIN, artifact_path, artifact_files, export_path,
+                       crytic_export, standard_input, combined_from_standard)
+from prepare_manifest import Manifest
+from import_graph import ImportGraph, read_file
+from findings_db import DEFAULT_DB, open_db
+from scan_pool import run, run_pool, default_workers
 
 ROOT = Path(__file__).resolve().parents[1]
 DATASETS = ROOT / "datasets"
@@ -10,133 +18,408 @@ FLAT_DIR = ROOT / "work" / "flattened"
 OUT_DIR = ROOT / "out"
 FLAT_DIR.mkdir(parents=True, exist_ok=True)
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
 
-PRAGMA_RE = re.compile(r'pragma\s+solidity\s+([^;]+);', re.IGNORECASE)
-
-# 将 ^、~ 等范围限定到一个“代表版本”
-# Map a pragma range to a pinned compiler version you installed via solc-select.
-PIN_MAP = [
-    ("0.4", "0.4.25"),
-    ("0.5", "0.5.17"),
-    ("0.6", "0.6.12"),
-    ("0.7", "0.7.6"),
-    ("0.8", "0.8.20"),
-]
+RESOLVE_CACHE = ROOT / "work" / "cache" / "solc_resolve.json"
+MANIFEST = ROOT / "work" / "prepare_manifest.json"
+ALIASES = ROOT / "work" / "flat_aliases.json"
+SOLC_TIMEOUT = 300      # 单次编译的墙钟上限（秒），超时连同子进程一起杀掉
+BATCH_FILES = 200       # 一次 --standard-json 最多带多少个源文件
+BATCH_BYTES = 16 << 20  # 一次 --standard-json 的源码总量上限
 
 def which(cmd: str) -> str:
     from shutil import which as _which
     return _which(cmd) or ""
 
-def run(cmd: List[str]) -> Tuple[int, str, str]:
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    out, err = p.communicate()
-    return p.returncode, out, err
+def try_compile(sol_file: Path, ver: str, solc_bin: str) -> Tuple[bool, str, str]:
+    """→ (ok, 失败原因, combined-json 输出)；输出保留给扫描器复用，避免重复编译"""
+    # 直接调用解析出的 solc 二进制；未安装时退回 PATH 上的 solc（solc-select shim 读 SOLC_VERSION）
+    solc = solc_bin or which("solc")
+    if not solc:
+        return False, "solc not found", ""
+    env = dict(os.environ)
+    if ver and not solc_bin:
+        env["SOLC_VERSION"] = ver
+    code, out, err = run([solc, "--combined-json", COMBINED_FIELDS, str(sol_file)], env=env,
+                          meta={"tool": "solc", "file": sol_file.name, "solc": ver}, timeout=SOLC_TIMEOUT)
+    if code == 0:
+        return True, "", out
+    return False, (err or out).strip()[:800], ""
+
+_full_versions: Dict[str, str] = {}
+
+def solc_full_version(solc: str, env: dict) -> str:
+    """如 0.8.20+commit.a1b79de6.Linux.g++（写进产物的 version 字段，与 --combined-json 一致）；按二进制缓存"""
+    key = f"{solc}|{env.get('SOLC_VERSION', '')}"
+    if key not in _full_versions:
+        code, out, err = run([solc, "--version"], env=env)
+        line = next((l for l in out.splitlines() if l.startswith("Version:")), "")
+        _full_versions[key] = line.split(":", 1)[-1].strip()
+    return _full_versions[key]
 
-def detect_version_by_pragma(sol_path: Path) -> str:
-    """根据 pragma 推断主版本 → 映射到已安装的固定版本"""
+def standard_compile(files: List[Tuple[Path, str]], ver: str, solc: str, env: dict):
+    """
+    一次 solc --standard-json 编译多个源文件。
+    → (成功：{文件: combined-json 文本}, 出错的文件：{文件: 原因}, 无法归到具体文件的错误)
+    有任何文件出错时 solc 不会为其他文件生成 bytecode，由调用方去掉出错文件后重编
+    """
+    v = parse_version(ver) or (0, 8, 0)
+    sources = {str(p): text for p, text in files}
+    code, out, err = run([solc, "--standard-json"], env=env, input=standard_input(sources, v),
+                         meta={"tool": "solc", "file": f"batch:{len(files)}", "solc": ver},
+                         timeout=SOLC_TIMEOUT)
     try:
-        text = sol_path.read_text(encoding="utf-8", errors="ignore")
-    except:
-        text = sol_path.read_text(errors="ignore")
-    m = PRAGMA_RE.search(text)
-    if not m:
-        return ""  # 未声明 pragma 就用当前系统默认
-    clause = m.group(1)
-    # 找到第一个形如 0.x 的主版本号
-    m2 = re.search(r"0\.(\d+)", clause)
-    if not m2:
-        return ""
-    major_minor = f"0.{m2.group(1)}"
-    for key, pinned in PIN_MAP:
-        if major_minor.startswith(key):
-            return pinned
-    return ""
-
-def solc_use(ver: str) -> Tuple[bool, str]:
-    if not ver:
-        return True, "no-switch"
-    if not which("solc-select"):
-        return False, "solc-select not installed"
-    code, out, err = run(["solc-select", "use", ver])
-    if code == 0:
-        return True, ver
-    return False, err or out
-
-def try_compile(sol_file: Path, ver: str) -> Tuple[bool, str]:
-    if not which("solc"):
-        return False, "solc not found"
-    # 切版本
-    ok_switch, msg = solc_use(ver)
-    if not ok_switch:
-        return False, f"solc-select failed: {msg}"
-    code, out, err = run(["solc", "--combined-json", "abi,bin", str(sol_file)])
-    if code == 0:
-        return True, ""
-    return False, (err or out).strip()[:800]
+        data = json.loads(out)
+    except ValueError:
+        return {}, {}, (err or out).strip()[:800] or f"solc --standard-json exited with {code}"
+    bad: Dict[Path, List[str]] = {}
+    general: List[str] = []
+    for e in data.get("errors") or []:
+        if e.get("severity") != "error":
+            continue
+        msg = (e.get("formattedMessage") or e.get("message") or "").strip()
+        src = (e.get("sourceLocation") or {}).get("file")
+        if src in sources:
+            bad.setdefault(Path(src), []).append(msg)
+        else:
+            general.append(msg)
+    if bad or general:
+        return {}, {p: "\n".join(m)[:800] for p, m in bad.items()}, "\n".join(general)[:800]
+    if code != 0:
+        return {}, {}, (err or f"solc --standard-json exited with {code}")[:800]
+    full = solc_full_version(solc, env)
+    return {p: json.dumps(combined_from_standard(data, str(p), full, v)) for p, _ in files}, {}, ""
+
+def compile_batch(files: List[Tuple[Path, str]], ver: str, solc_bin: str) -> Dict[Path, Tuple[bool, str, str]]:
+    """
+    同一 solc 版本的一组文件 → {文件: (ok, 失败原因, combined-json 输出)}。
+    报错定位到某个文件时只剔除该文件，其余文件重编；定位不到（崩溃、超时、内部错误）时对半拆分，
+    直到单个文件，单个文件走 try_compile（--combined-json）。
+    """
+    solc = solc_bin or which("solc")
+    if not solc:
+        return {p: (False, "solc not found", "") for p, _ in files}
+    v = parse_version(ver)
+    if len(files) == 1 or (v is not None and v < STANDARD_JSON_MIN):
+        return {p: try_compile(p, ver, solc_bin) for p, _ in files}
+    env = dict(os.environ)
+    if ver and not solc_bin:
+        env["SOLC_VERSION"] = ver
+    res: Dict[Path, Tuple[bool, str, str]] = {}
+    todo = files
+    while todo:
+        if len(todo) == 1:
+            res.update(compile_batch(todo, ver, solc_bin))
+            break
+        good, bad, general = standard_compile(todo, ver, solc, env)
+        if general:
+            mid = len(todo) // 2
+            res.update(compile_batch(todo[:mid], ver, solc_bin))
+            res.update(compile_batch(todo[mid:], ver, solc_bin))
+            break
+        for p, reason in bad.items():
+            res[p] = (False, reason, "")
+        for p, combined in good.items():
+            res[p] = (True, "", combined)
+        todo = [(p, t) for p, t in todo if p not in res]
+    return res
 
-IMPORT_RE = re.compile(r'^\s*import\s+["\']([^"\']+)["\'];', re.MULTILINE)
-def read_file(p: Path) -> str:
+def simple_flatten(entry: Path, graph: Optional[ImportGraph] = None) -> str:
+    # 传入同一个 graph 时，被多个入口共享的依赖只读一次
+    return (graph or ImportGraph()).flatten(entry)
+
+def link_copy(src: Path, dst: Path) -> None:
+    """dst 作为 src 的硬链接（文件系统不支持时复制）；dst 原有内容先删掉，不会写穿到别的链接"""
+    dst.unlink(missing_ok=True)
     try:
-        return p.read_text(encoding="utf-8")
-    except:
-        return p.read_text(errors="ignore")
-
-def simple_flatten(entry: Path) -> str:
-    visited: Set[Path] = set()
-    parts: List[str] = []
-    def dfs(fp: Path):
-        if fp in visited: return
-        visited.add(fp)
-        content = read_file(fp)
-        pos = 0
-        for m in IMPORT_RE.finditer(content):
-            s, e = m.span()
-            parts.append(content[pos:s])
-            pos = e
-            imp = m.group(1)
-            cand = (fp.parent / imp).resolve()
-            if cand.exists():
-                dfs(cand)
-            else:
-                parts.append(f"// [WARN] unresolved import kept: {m.group(0)}\n")
-        parts.append(content[pos:])
-    header = f"// Flattened simple\n// Entry: {entry}\n\n"
-    dfs(entry.resolve())
-    return header + "".join(parts)
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def body_sha(flat_src: str) -> str:
+    """flatten 结果去掉 simple_flatten 头部（含入口路径）后的哈希，用于识别完全相同的输出"""
+    body = flat_src
+    if body.startswith("// Flattened simple\n"):
+        body = body.split("\n\n", 1)[-1]
+    return hashlib.sha256(body.encode("utf-8", errors="ignore")).hexdigest()
+
+# forge flatten 在每个源文件的内容前写一行 "// <相对项目根的路径>"
+FORGE_SOURCE_RE = re.compile(r'^// (\S[^\n]*\.sol)[ \t]*$', re.MULTILINE)
+
+def forge_sources(flat_src: str, entry: Path) -> Set[str]:
+    """
+    forge flatten 的输出 → 实际拼进去的源文件（绝对路径）。forge 按 foundry.toml / remappings 解析 import，
+    比 ImportGraph 的正则更准；路径相对于 forge 的项目根（当前目录或入口上层带 foundry.toml 的目录）
+    """
+    roots = [Path.cwd()] + [d for d in entry.resolve().parents if (d / "foundry.toml").is_file()]
+    res = set()
+    for m in FORGE_SOURCE_RE.finditer(flat_src):
+        for r in roots:
+            p = r / m.group(1)
+            if p.is_file():
+                res.add(str(p.resolve()))
+                break
+    return res
 
 def forge_flatten(entry: Path) -> str:
     if not which("forge"):
         raise RuntimeError("forge not found")
-    code, out, err = run(["forge", "flatten", str(entry)])
+    code, out, err = run(["forge", "flatten", str(entry)], meta={"file": entry.name})
     if code != 0:
         raise RuntimeError((err or out)[:800])
     return out
 
-def main():
-    sol_files = [p for p in DATASETS.rglob("*.sol") if p.is_file()]
-    pass_list, fail_list = [], []
+class Preparer:
+    """
+    flatten + 编译的状态（增量清单、import 图、正文去重表），供 main() 顺序使用，
+    也供 tools/pipeline.py 逐文件流式驱动：classify → flatten（串行，便宜）→ compile（可并行）→ finish
+    """
+    def __init__(self, force: bool = False, db=None, resolver: Optional[SolcResolver] = None,
+                 manifest: Optional[Manifest] = None):
+        # 长驻进程（tools/scan_daemon.py）每轮新建 Preparer，但沿用同一个 solc 解析缓存与增量清单
+        self.resolver = resolver or SolcResolver(RESOLVE_CACHE)
+        self.manifest = manifest or Manifest(MANIFEST, self.resolver.installed, force=force)
+        self.graph = ImportGraph()
+        self.use_forge = bool(which("forge"))
+        self.db = db
+        self.lock = threading.Lock()
+        self.canon: Dict[str, str] = {}                  # 正文哈希 -> 实际写出的 flattened 文件名
+        self.status: Dict[str, Tuple[bool, str]] = {}    # flattened 文件名 -> (编译是否通过, 原因)
+        self.solc: Dict[str, str] = {}                   # flattened 文件名 -> solc 版本（登记别名用）
+        self.result: Dict[str, Tuple[bool, str]] = {}    # 入口 -> (编译是否通过, 原因)
+        self.aliases: List[tuple] = []                   # 本次新识别的别名，finish 时按规范文件的编译结果登记
+        self.skipped = self.aliased = 0
 
-    for f in sol_files:
-        pinned = detect_version_by_pragma(f)  # e.g., '0.4.25'
-        ok, reason = try_compile(f, pinned)
-        if ok: pass_list.append(str(f))
-        else:  fail_list.append(f"{f} ::: {reason}")
+    def classify(self, sol_files: List[Path]) -> Tuple[List[Path], List[Path]]:
+        """
+        第一遍：依赖闭包与 solc 集合都没变的入口沿用上次结果，并先登记它们的正文哈希
+        → (需要重新处理的入口, 可直接扫描的 [(入口, flattened 文件)])
+        """
+        todo: List[Path] = []
+        ready: List[Tuple[Path, Path]] = []
+        fresh_aliases = []
+        for f in sol_files:
+            entry = str(f.resolve())
+            prev = self.manifest.entries.get(entry, {})
+            target = FLAT_DIR / (prev.get("alias_of") or f"{f.stem}__flattened.sol")
+            outputs = [target] + (artifact_files(target) if prev.get("ok") else [])
+            if prev.get("alias_of"):
+                own = FLAT_DIR / prev["flat"]
+                outputs += [own] + (artifact_files(own) if prev.get("ok") else [])
+            rec = self.manifest.fresh(entry, outputs)
+            if rec is None:
+                todo.append(f)
+            elif rec.get("alias_of"):
+                fresh_aliases.append((f, rec))
+            else:
+                self.canon.setdefault(rec["body"], rec["flat"])
+                self.status[rec["flat"]] = (rec["ok"], rec["reason"])
+                self.solc[rec["flat"]] = rec.get("solc", "")
+                self.result[entry] = (rec["ok"], rec["reason"])
+                self.skipped += 1
+                if rec["ok"]:
+                    ready.append((f, FLAT_DIR / rec["flat"]))
+        for f, rec in fresh_aliases:
+            if self.canon.get(rec["body"]) == rec["alias_of"]:
+                self.result[str(f.resolve())] = self.status[rec["alias_of"]]
+                self.skipped += 1
+                if rec["ok"]:
+                    ready.append((f, FLAT_DIR / rec["flat"]))
+            else:
+                todo.append(f)  # 原来的规范文件已变化，重新处理
+        return todo, ready
 
+    def flatten(self, f: Path) -> Optional[tuple]:
+        """
+        第二遍的前半：flatten 并按正文去重。正文与已写出的文件完全相同时只记别名
+        （不编译，登记时硬链接规范文件及其产物），返回 None；否则写出 flattened 文件并返回编译任务
+        """
         out_name = f"{f.stem}__flattened.sol"
         out_path = FLAT_DIR / out_name
+        entry = str(f.resolve())
+        forged: Set[str] = set()
         try:
-            if which("forge"):
+            if self.use_forge:
                 flat_src = forge_flatten(f)
+                forged = forge_sources(flat_src, f)
             else:
-                flat_src = simple_flatten(f)
+                flat_src = simple_flatten(f, self.graph)
         except Exception as e:
+            print(f"[WARN] flatten failed for {f}: {str(e).strip()[:300]}; using the entry source as is")
             flat_src = "// [WARN] flatten failed; fallback\n" + read_file(f)
+        body = body_sha(flat_src)
+        # 依赖闭包取 forge 实际用到的文件；forge 输出里没有文件标记（或没用 forge）时才用 import 图
+        if forged:
+            deps, missing = forged | {entry}, set()
+        else:
+            deps, missing = self.graph.closure(f)
+
+        with self.lock:
+            same = self.canon.get(body)
+            if same and same != out_name:
+                for p in [out_path] + artifact_files(out_path):
+                    p.unlink(missing_ok=True)
+                self.aliases.append((entry, deps, missing, out_name, body, same))
+                self.aliased += 1
+                return None
+            self.canon[body] = out_name
+        out_path.unlink(missing_ok=True)  # 可能是上次作为别名留下的硬链接
         out_path.write_text(flat_src, encoding="utf-8")
+        return entry, out_path, flat_src, body, deps, missing
+
+    def compile(self, job: tuple) -> Tuple[Path, bool]:
+        """第二遍的后半：编译 flattened 结果（即扫描器实际分析的文件），产物留给 03/04 复用"""
+        return self.compile_chunk(self.batch_key(job), [self.slim(job)], 1)[0]
+
+    def batch_key(self, job: tuple) -> Tuple[str, str]:
+        """→ (solc 版本, solc 路径)：同一个键的任务可以放进同一次 --standard-json"""
+        return self.resolver.resolve_text(job[2])  # e.g., ('0.4.26', '~/.solc-select/artifacts/solc-0.4.26/solc-0.4.26')
+
+    @staticmethod
+    def slim(job: tuple) -> tuple:
+        # 源码只在编译那一刻从 flattened 文件重新读，排队的任务不把全部源码留在内存里
+        return job[:2] + ("",) + job[3:]
+
+    def compile_chunk(self, key: Tuple[str, str], chunk: List[tuple], batch: int = BATCH_FILES) -> List[Tuple[Path, bool]]:
+        """
+        同一 batch_key 的一组任务编译并逐个 store → [(flattened 文件, 是否通过)]；
+        编译过程本身抛异常时整组按失败 store（进入 compile_fail），不会丢掉条目
+        """
+        ver, solc_bin = key
+        res: Dict[Path, Tuple[bool, str, str]] = {}
+        err = (False, "", "")
+        try:
+            if batch <= 1:
+                res = {j[1]: try_compile(j[1], ver, solc_bin) for j in chunk}
+            else:
+                res = compile_batch([(j[1], read_file(j[1])) for j in chunk], ver, solc_bin)
+        except Exception as e:
+            print(f"[WARN] compile failed for {len(chunk)} file(s) with solc {ver or '?'}: {e!r}")
+            err = (False, f"compile error: {e!r}"[:800], "")
+        return [self.store(j, ver, *res.get(j[1], err)) for j in chunk]
+
+    def compile_many(self, jobs: Iterable[tuple], workers: int = 1, batch: int = BATCH_FILES) -> int:
+        """
+        批量编译：按解析出的 solc 版本分组，每组每 batch 个文件一次 --standard-json（而不是每个文件
+        启动一次 solc），各批在 workers 个线程中并行；batch<=1 时等同逐个 compile
+        → 编译的文件数
+        """
+        groups: Dict[Tuple[str, str], List[tuple]] = {}
+        for job in jobs:
+            groups.setdefault(self.batch_key(job), []).append(self.slim(job))
+        work = [(key, chunk) for key, js in groups.items() for chunk in batches(js, batch)]
+        return sum(run_pool(work, lambda item: len(self.compile_chunk(*item, batch)), workers))
+
+    def store(self, job: tuple, ver: str, ok: bool, reason: str, combined: str) -> Tuple[Path, bool]:
+        entry, out_path, _, body, deps, missing = job
+        for p in artifact_files(out_path):
+            p.unlink(missing_ok=True)
+        if ok:
+            # combined-json 给 04 取 bytecode，standard 导出给 03 交给 slither / crytic-compile
+            artifact_path(out_path).write_text(combined, encoding="utf-8")
+            export_path(out_path).write_text(json.dumps(crytic_export(json.loads(combined))), encoding="utf-8")
+        with self.lock:
+            self.status[out_path.name] = (ok, reason)
+            self.result[entry] = (ok, reason)
+            self.solc[out_path.name] = ver
+            self.manifest.record(entry, deps, missing, solc=ver, flat=out_path.name, ok=ok, reason=reason, body=body)
+        if self.db:
+            self.db.record_file(entry, sha256=self.manifest.hasher.sha(entry), solc=ver)
+            self.db.record_compile(out_path, ver, ok, reason, source=entry)
+        return out_path, ok
+
+    def register_aliases(self) -> List[Tuple[Path, Path]]:
+        """
+        登记本次新识别的别名（须在其规范文件编译完成之后）→ 编译通过的 [(入口, flattened 文件)]。
+        别名不单独编译，但要有自己的 flattened 文件与产物（硬链接规范文件的），
+        03/04 才会为它输出结果：内容完全相同，克隆聚类把它归入规范文件的簇，只扫描一次再分发
+        """
+        done = []
+        for entry, deps, missing, out_name, body, same in self.aliases:
+            ok, reason = self.status[same]
+            ver = self.solc.get(same, "")
+            self.result[entry] = (ok, reason)
+            self.manifest.record(entry, deps, missing, solc=ver, flat=out_name, ok=ok, reason=reason,
+                                 body=body, alias_of=same)
+            if out_name in self.status:  # 不同目录的同名入口已占用这个文件名，不能覆盖
+                continue
+            link_copy(FLAT_DIR / same, FLAT_DIR / out_name)
+            for src, dst in zip(artifact_files(FLAT_DIR / same), artifact_files(FLAT_DIR / out_name)):
+                dst.unlink(missing_ok=True)
+                if ok:
+                    link_copy(src, dst)
+            if ok:
+                done.append((Path(entry), FLAT_DIR / out_name))
+            if self.db:
+                self.db.record_file(entry, sha256=self.manifest.hasher.sha(entry), solc=ver)
+                self.db.record_compile(FLAT_DIR / out_name, ver, ok, reason, source=entry)
+        self.aliases = []
+        return done
+
+    def save(self) -> None:
+        """登记别名，写出清单、别名表与 solc 解析缓存（不动 pass/fail 列表；长驻进程每轮调用）"""
+        self.register_aliases()
+        aliases = {rec["flat"]: rec["alias_of"] for rec in self.manifest.entries.values() if rec.get("alias_of")}
+        ALIASES.write_text(json.dumps(aliases, indent=2, sort_keys=True), encoding="utf-8")
+        self.manifest.save()
+        self.resolver.save()
+
+    def finish(self, sol_files: List[Path], prune: bool = True) -> Tuple[List[str], List[str]]:
+        """登记别名、清理已删除的入口、写清单与 pass/fail 列表；prune=False 用于只处理部分入口的运行"""
+        self.register_aliases()
+
+        # 已从 datasets/ 删除的入口：清掉清单记录及其产物（含别名的硬链接；除非同名产物仍被其他入口使用）
+        if prune:
+            removed = self.manifest.prune(str(f.resolve()) for f in sol_files)
+            live_flat = set(self.status) | {rec.get("flat") for rec in self.manifest.entries.values()}
+            for rec in removed:
+                if rec.get("flat") and rec["flat"] not in live_flat:
+                    for p in [FLAT_DIR / rec["flat"]] + artifact_files(FLAT_DIR / rec["flat"]):
+                        p.unlink(missing_ok=True)
+
+        self.save()
+        pass_list = [str(f) for f in sol_files if self.result[str(f.resolve())][0]]
+        fail_list = [f"{f} ::: {self.result[str(f.resolve())][1]}" for f in sol_files if not self.result[str(f.resolve())][0]]
+        (OUT_DIR / "compile_pass.txt").write_text("\n".join(pass_list), encoding="utf-8")
+        (OUT_DIR / "compile_fail.txt").write_text("\n".join(fail_list), encoding="utf-8")
+        return pass_list, fail_list
+
+def batches(jobs: List[tuple], max_files: int) -> Iterator[List[tuple]]:
+    """按文件数与源码总量切块"""
+    chunk: List[tuple] = []
+    size = 0
+    for job in jobs:
+        n = job[1].stat().st_size
+        if chunk and (len(chunk) >= max(1, max_files) or size + n > BATCH_BYTES):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(job)
+        size += n
+    if chunk:
+        yield chunk
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--force", action="store_true", help="忽略增量清单，全部重新 flatten + 编译")
+    ap.add_argument("-j", "--workers", type=int, default=default_workers(), help="并行编译的批数（默认取 PARALLEL 或 4）")
+    ap.add_argument("--batch", type=int, default=BATCH_FILES,
+                    help="同一 solc 版本每次 --standard-json 编译的文件数；1 为逐个 --combined-json")
+    ap.add_argument("--db", default=str(DEFAULT_DB), help="编译记录写入的 SQLite 库")
+    ap.add_argument("--no-db", action="store_true", help="不写 SQLite 库")
+    args = ap.parse_args()
+
+    sol_files = sorted(p for p in DATASETS.rglob("*.sol") if p.is_file())
+    db = open_db(args.db, not args.no_db)
+    prep = Preparer(force=args.force, db=db)
 
-    (OUT_DIR / "compile_pass.txt").write_text("\n".join(pass_list), encoding="utf-8")
-    (OUT_DIR / "compile_fail.txt").write_text("\n".join(fail_list), encoding="utf-8")
-    print(f"[OK] Compile pass: {len(pass_list)}; fail: {len(fail_list)}")
-    print(f"[OK] Flattened -> {FLAT_DIR}")
+    todo, _ = prep.classify(sol_files)
+    prep.compile_many((job for job in map(prep.flatten, todo) if job is not None), args.workers, args.batch)
+    pass_list, fail_list = prep.finish(sol_files)
+    if db:
+        db.close()
+    print(f"[OK] Compile pass: {len(pass_list)}; fail: {len(fail_list)}; unchanged (skipped): {prep.skipped}")
+    print(f"[OK] Flattened -> {FLAT_DIR} (duplicates aliased: {prep.aliased}, see {ALIASES.name}; files read: {prep.graph.files_read})")
+    print(f"[OK] Artifacts -> {ARTIFACT_DIR}")
 
 if __name__ == "__main__":
     main()
@@ -5,21 +5,48 @@
 Quick screening using regex patterns to prioritize suspicious files/functions.
 
 输出 / Output:
-- out/quick_screen.csv: file, category, pattern, context_snippet
+- out/quick_screen.csv: file, category, pattern, context_snippet, function, line
+  （function 为命中位置所在的 "Contract.function"，line 从 1 开始）
 
 说明 / Notes:
 - 这不是“漏洞定论”，而是帮助你挑出“优先跑 Mythril / 高价值复核”的样本
 - 你可按需扩展 PATTERNS 中的正则
+- 匹配前先去掉注释（含 NatSpec）和字符串字面量（见 sol_lexer.py），避免文档里的
+  “reentrancy” 之类抬高命中数
+- 单遍匹配：所有模式的字面前缀合成一个正则，在小写化后的文件内容上只扫一遍，
+  候选位置再用对应模式确认；文件经 mmap 读取，CSV 边扫边写
+- 并行：目录惰性遍历，按批送入进程池（在途批次有上限），每个 worker 写自己的 CSV 分片，结束时合并
+- 结果同时写入 out/findings.db（见 findings_db.py），tool=quick_screen，rule=模式，category=P 类别
+- 多机：--shard i/N 按相对路径的稳定哈希只处理第 i 份（i 从 1 开始），之后可用 --merge 合并各机结果
+
+用法 / Usage:
+  python3 scripts/02_quick_screen.py -j 16
+  python3 scripts/02_quick_screen.py --shard 2/4          # -> out/quick_screen.shard-2of4.csv
+  python3 scripts/02_quick_screen.py --merge out/quick_screen.shard-*of4.csv
 """
 
+import argparse
+import os
 import re
 import csv
+import mmap
+import shutil
+import time
+import zlib
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sol_lexer import blank_comments_strings, SourceIndex
+from findings_db import DEFAULT_DB, open_db
 
 ROOT = Path(__file__).resolve().parents[1]
 DATASETS = ROOT / "datasets"
 OUT = ROOT / "out"
 OUT.mkdir(parents=True, exist_ok=True)
+HEADER = ["file", "category", "pattern", "context", "function", "line"]
+BATCH = 256             # 每个进程池任务的文件数
 
 # 可扩展的关键词/模式（大小写不敏感）
 # Extensible patterns (case-insensitive)
@@ -39,38 +66,261 @@ PATTERNS = {
     ]
 }
 
-def read_text(p: Path) -> str:
-    try:
-        return p.read_text(encoding="utf-8")
-    except:
-        return p.read_text(errors="ignore")
+def _fold(pat: str) -> str:
+    """小写化模式中的字面字母（转义序列如 \\B、\\S 保持原样），配合小写化的文本实现大小写不敏感"""
+    return re.sub(r'(\\.)|([A-Z])', lambda m: m.group(1) or m.group(2).lower(), pat)
+
+def _literal_prefix(pat: str) -> str:
+    """模式开头必然出现的字面串（去掉开头的 \\b）；含顶层 | 或以元字符开头时返回空串"""
+    if re.search(r'(?<!\\)\|', pat):
+        return ""
+    p = pat[2:] if pat.startswith("\\b") else pat
+    out, i = [], 0
+    while i < len(p):
+        c = p[i]
+        if c == "\\" and i + 1 < len(p) and not p[i+1].isalnum():
+            lit, step = p[i+1], 2
+        elif c.isalnum() or c in "-_ ":
+            lit, step = c, 1
+        else:
+            break
+        if i + step < len(p) and p[i+step] in "*?{+":
+            break  # 后面带量词，这个字符不一定出现
+        out.append(lit); i += step
+    return "".join(out).lower()
+
+class Matcher:
+    """
+    单遍多模式匹配：
+    - 有字面前缀的模式：前缀合成一个交替正则（纯字面，走 C 层快速扫描），命中位置按首字节分桶，
+      只用同桶的模式做 match 确认；同一位置可同时命中多个模式（如 onlyOwner 与 owner\\(）
+    - 没有字面前缀的模式单独 finditer（默认 PATTERNS 中没有这种）
+    """
+    def __init__(self, patterns: Dict[str, List[str]]):
+        self.entries = [(cat, pat) for cat, pats in patterns.items() for pat in pats]
+        self.singles = [re.compile(_fold(pat).encode("utf-8")) for _, pat in self.entries]
+        self.by_first: Dict[int, List[int]] = {}
+        self.fallback: List[int] = []
+        prefixes = set()
+        for i, (_, pat) in enumerate(self.entries):
+            pre = _literal_prefix(pat)
+            if not pre:
+                self.fallback.append(i)
+                continue
+            prefixes.add(pre)
+            self.by_first.setdefault(pre.encode("utf-8")[0], []).append(i)
+        alts = sorted(prefixes, key=len, reverse=True)
+        self.prefilter = re.compile("|".join(re.escape(x) for x in alts).encode("utf-8")) if alts else None
+
+    def finditer(self, folded: bytes) -> Iterator[Tuple[int, int, int]]:
+        """→ (start, end, 模式序号)，按位置排序"""
+        hits = []
+        if self.prefilter is not None:
+            pos = 0
+            search = self.prefilter.search
+            while True:
+                m = search(folded, pos)
+                if not m:
+                    break
+                s = m.start()
+                for j in self.by_first[folded[s]]:
+                    mm = self.singles[j].match(folded, s)
+                    if mm:
+                        hits.append((s, mm.end(), j))
+                pos = s + 1
+        for j in self.fallback:
+            hits.extend((m.start(), m.end(), j) for m in self.singles[j].finditer(folded))
+        if self.fallback:
+            hits.sort()
+        return iter(hits)
+
+MATCHER = Matcher(PATTERNS)
 
 def scan_file(p: Path):
-    text = read_text(p)
     hits = []
-    for cat, patterns in PATTERNS.items():
-        for pat in patterns:
-            for m in re.finditer(pat, text, flags=re.IGNORECASE):
-                s = max(0, m.start()-80)
-                e = min(len(text), m.end()+80)
-                ctx = text[s:e].replace("\n", " ")
-                hits.append((cat, pat, ctx))
+    with open(p, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return hits  # 空文件无法 mmap
+    with buf:
+        clean = blank_comments_strings(buf[:])
+        index = None
+        for start, end, j in MATCHER.finditer(clean.lower()):
+            if index is None:
+                index = SourceIndex(clean)  # 只有命中的文件才建索引
+            cat, pat = MATCHER.entries[j]
+            s = max(0, start-80)
+            e = min(len(buf), end+80)
+            ctx = buf[s:e].decode("utf-8", errors="ignore").replace("\n", " ")
+            func, line = index.locate(start)
+            hits.append((cat, pat, ctx, func, line))
     return hits
 
-def main():
-    sol_files = list(DATASETS.rglob("*.sol"))
-    rows = []
-    for f in sol_files:
-        for cat, pat, ctx in scan_file(f):
-            rows.append([str(f), cat, pat, ctx])
+def iter_sol_files(root: Path) -> Iterator[Path]:
+    """惰性遍历（os.scandir + 显式栈），不预先构造完整文件列表"""
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.name.endswith(".sol") and e.is_file():
+                    yield Path(e.path)
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    m = re.match(r'^(\d+)/(\d+)$', spec or "")
+    if not m or not (1 <= int(m.group(1)) <= int(m.group(2))):
+        raise argparse.ArgumentTypeError(f"--shard 需要 i/N 且 1<=i<=N，收到 {spec!r}")
+    return int(m.group(1)), int(m.group(2))
+
+def in_shard(p: Path, root: Path, shard: Optional[Tuple[int, int]]) -> bool:
+    if not shard:
+        return True
+    i, n = shard
+    try:
+        rel = p.relative_to(root).as_posix()
+    except ValueError:
+        rel = p.as_posix()
+    return zlib.crc32(rel.encode("utf-8")) % n == i - 1
+
+def batches(files: Iterator[Path], size: int) -> Iterator[List[Path]]:
+    buf: List[Path] = []
+    for f in files:
+        buf.append(f)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
 
-    out_csv = OUT / "quick_screen.csv"
+def scan_batch(files: List[Path], shard_dir: str) -> Tuple[int, int]:
+    """进程池 worker：扫描一批文件，追加写入本进程自己的 CSV 分片"""
+    rows = 0
+    part = Path(shard_dir) / f"part-{os.getpid()}.csv"
+    with open(part, "a", newline="", encoding="utf-8") as w:
+        writer = csv.writer(w)
+        for f in files:
+            for hit in scan_file(f):
+                writer.writerow([str(f), *hit])
+                rows += 1
+    return len(files), rows
+
+def merge_csv(parts: List[Path], out_csv: Path, with_header: bool) -> None:
+    with open(out_csv, "w", newline="", encoding="utf-8") as w:
+        w.write(",".join(HEADER) + "\r\n")
+        for p in parts:
+            with open(p, newline="", encoding="utf-8") as r:
+                if with_header:
+                    r.readline()
+                shutil.copyfileobj(r, w)
+
+def merge_by_file(out_csv: Path, part: Path, files: Set[str]) -> None:
+    """
+    部分文件重新筛查的结果（part，无表头）并入 out_csv：files 中的文件（含这次零命中的）旧行全部换成新行，
+    其余文件的行原样保留（同一文件的行仍然连续）；先写临时文件再替换
+    """
+    tmp = out_csv.with_name(out_csv.name + ".tmp")
+    with open(tmp, "w", newline="", encoding="utf-8") as w:
+        writer = csv.writer(w)
+        writer.writerow(HEADER)
+        if out_csv.exists():
+            with open(out_csv, newline="", encoding="utf-8") as r:
+                rows = csv.reader(r)
+                next(rows, None)
+                writer.writerows(row for row in rows if row and row[0] not in files)
+        with open(part, newline="", encoding="utf-8") as r:
+            shutil.copyfileobj(r, w)
+    os.replace(tmp, out_csv)
+
+def run_serial(files: Iterator[Path], out_csv: Path) -> Tuple[int, int]:
+    n = rows = 0
     with open(out_csv, "w", newline="", encoding="utf-8") as w:
         writer = csv.writer(w)
-        writer.writerow(["file", "category", "pattern", "context"])
-        writer.writerows(rows)
+        writer.writerow(HEADER)
+        for f in files:
+            n += 1
+            for hit in scan_file(f):
+                writer.writerow([str(f), *hit])
+                rows += 1
+    return n, rows
+
+def run_parallel(files: Iterator[Path], out_csv: Path, workers: int) -> Tuple[int, int]:
+    shard_dir = out_csv.with_name(out_csv.stem + ".parts")
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    shard_dir.mkdir(parents=True)
+    n = rows = 0
+    max_inflight = workers * 2   # 有界队列：遍历速度受扫描速度约束
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = set()
+        for batch in batches(files, BATCH):
+            if len(pending) >= max_inflight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    a, b = fut.result(); n += a; rows += b
+            pending.add(ex.submit(scan_batch, batch, str(shard_dir)))
+        for fut in pending:
+            a, b = fut.result(); n += a; rows += b
+    merge_csv(sorted(shard_dir.glob("part-*.csv")), out_csv, with_header=False)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    return n, rows
+
+def store_csv(out_csv: Path, db_path: str, started: float) -> int:
+    """把结果 CSV 流式写入 SQLite（同一文件的命中在 CSV 中是连续的，每个文件一条 run）"""
+    db = open_db(db_path)
+    if db is None:
+        return 0
+    with open(out_csv, newline="", encoding="utf-8") as r:
+        rows = csv.reader(r)
+        next(rows, None)
+        per_file = ((f, [(pat, cat, ctx[:200], "", f"{func}:{line}") for _, cat, pat, ctx, func, line in grp])
+                    for f, grp in groupby(rows, key=lambda x: x[0]))
+        n = db.record_runs("quick_screen", "", [], started, per_file)
+    db.close()
+    return n
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--datasets", default=str(DATASETS), help="待筛查目录（默认 datasets/）")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="进程数，1 为单进程")
+    ap.add_argument("--shard", type=parse_shard, help="i/N：只处理第 i 份（多机拆分同一数据集）")
+    ap.add_argument("--out", help="输出 CSV（默认 out/quick_screen.csv，分片时 out/quick_screen.shard-iofN.csv）")
+    ap.add_argument("--merge", nargs="+", metavar="CSV", help="合并多个分片 CSV 到 --out 后退出")
+    ap.add_argument("--db", default=str(DEFAULT_DB), help="命中写入的 SQLite 库")
+    ap.add_argument("--no-db", action="store_true", help="不写 SQLite 库（分片机器上通常只在 --merge 时写）")
+    args = ap.parse_args()
+    started = time.time()
+
+    if args.merge:
+        out_csv = Path(args.out) if args.out else OUT / "quick_screen.csv"
+        merge_csv([Path(p) for p in args.merge], out_csv, with_header=True)
+        print(f"[OK] Merged {len(args.merge)} shards -> {out_csv}")
+        if not args.no_db:
+            print(f"[OK] {store_csv(out_csv, args.db, started)} files -> {args.db}")
+        return
+
+    root = Path(args.datasets)
+    if args.out:
+        out_csv = Path(args.out)
+    elif args.shard:
+        out_csv = OUT / f"quick_screen.shard-{args.shard[0]}of{args.shard[1]}.csv"
+    else:
+        out_csv = OUT / "quick_screen.csv"
+
+    files = (f for f in iter_sol_files(root) if in_shard(f, root, args.shard))
+    if args.workers <= 1:
+        n, rows = run_serial(files, out_csv)
+    else:
+        n, rows = run_parallel(files, out_csv, args.workers)
 
-    print(f"[OK] Wrote quick screen results: {out_csv} (rows={len(rows)})")
+    print(f"[OK] Wrote quick screen results: {out_csv} (files={n}, rows={rows})")
+    if not args.no_db:
+        print(f"[OK] {store_csv(out_csv, args.db, started)} files with hits -> {args.db}")
 
 if __name__ == "__main__":
     main()
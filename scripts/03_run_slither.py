@@ -1,70 +1,163 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import re, subprocess
+import argparse, json, os, time
+from functools import partial
 from pathlib import Path
 
+from scan_pool import which, run, solc_env, default_workers, run_pool, tool_version
+from scan_cache import ScanCache, DEFAULT_MAX_MB
+from solc_resolver import SolcResolver
+from artifacts import export_path, compile_failed_stems
+from findings_db import DEFAULT_DB, open_db, slither_rows
+from clone_clusters import build as build_clusters, remap_slither, spread
+from slither_worker import WarmSlither
+
 ROOT = Path(__file__).resolve().parents[1]
 FLAT = ROOT / "work" / "flattened"
 OUT_DIR = ROOT / "out" / "slither"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
-PRAGMA_RE = re.compile(r'pragma\s+solidity\s+([^;]+);', re.IGNORECASE)
-
-PIN_MAP = [("0.4","0.4.25"),("0.5","0.5.17"),("0.6","0.6.12"),("0.7","0.7.6"),("0.8","0.8.20")]
-
-def which(cmd:str)->str:
-    from shutil import which as _which
-    return _which(cmd) or ""
-
-def run(cmd):
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    out, err = p.communicate()
-    return p.returncode, out, err
-
-def detect_version(text:str)->str:
-    m = PRAGMA_RE.search(text)
-    if not m: return ""
-    clause = m.group(1)
-    m2 = re.search(r"0\.(\d+)", clause)
-    if not m2: return ""
-    mm = f"0.{m2.group(1)}"
-    for key,p in PIN_MAP:
-        if mm.startswith(key): return p
-    return ""
-
-def solc_use(ver:str)->bool:
-    if not ver: return True
-    if not which("solc-select"):
-        print("[WARN] solc-select not found, skip version switch")
-        return True
-    code, out, err = run(["solc-select","use",ver])
-    if code!=0:
-        print(f"[WARN] solc-select use {ver} failed: {err or out}")
+CACHE_DIR = ROOT / "work" / "cache" / "scan"
+RESOLVE_CACHE = ROOT / "work" / "cache" / "solc_resolve.json"
+DEFAULT_HARD_TIMEOUT = int(os.environ.get("SLITHER_TIMEOUT") or 900)  # 单文件墙钟上限，超时杀掉整个进程组
+
+def slither_ok(code: int, out_json: Path) -> bool:
+    # 有发现时 slither 也可能返回非 0；以 JSON 中的 success 为准
+    if code == 0:
+        return out_json.exists()
+    try:
+        return bool(json.loads(out_json.read_text(encoding="utf-8")).get("success"))
+    except (OSError, ValueError, AttributeError):
         return False
-    return True
+
+def record(db, f: Path, ver: str, tool_ver: str, args, t0: float, status: str, out_json: Path):
+    if db is None:
+        return
+    rows = slither_rows(out_json.read_text(encoding="utf-8")) if status != "fail" and out_json.exists() else []
+    db.record_run(f, "slither", tool_ver, args, t0, time.time() - t0, status, rows, solc=ver)
+
+def slither(target: Path, out_json: Path, meta: dict, solc: str = "", env=None, hard_timeout=0, warm=None):
+    """warm 为 WarmSlither 时交给常驻 worker，否则每个文件起一个 slither CLI"""
+    if warm is not None:
+        return warm.run(target, out_json, solc=solc, env=env, meta=meta, timeout=hard_timeout)
+    cmd = ["slither", str(target), "--json", str(out_json)]
+    if solc:
+        cmd += ["--solc", solc]
+    return run(cmd, env=env, meta=meta, timeout=hard_timeout)
+
+def scan_one(f: Path, resolver: SolcResolver, cache=None, tool_ver="", use_artifacts=True, db=None, hard_timeout=0,
+             warm=None):
+    t0 = time.time()
+    text = f.read_text(encoding="utf-8", errors="ignore")
+    ver, solc = resolver.resolve_text(text)
+
+    out_json = OUT_DIR / (f.stem + ".json")
+    args = ["--solc", solc] if solc else []
+    # 产物模式与源码模式的结果不保证一致（crytic-compile 导出 vs 现场编译），缓存键按实际产出结果的模式区分；
+    # 查缓存时两种都认（产物总是载入失败的文件，命中源码模式的结果即可，不必每次先试一遍产物）
+    art = export_path(f)
+    modes = ([["--artifact"]] if use_artifacts and art.exists() else []) + [[]]
+    keys = [ScanCache.key(text, ver, "slither", tool_ver, m) for m in modes]
+    if cache:
+        key, hit = cache.get_any(keys, f.stem)
+        if hit is not None:
+            out_json.write_text(hit, encoding="utf-8")
+            record(db, f, ver, tool_ver, modes[keys.index(key)] or args, t0, "cached", out_json)
+            print(f"[CACHE] Slither => {out_json}")
+            return True
+
+    # 优先分析 01_prepare 留下的 crytic-compile 导出（*_export.json），不再重新编译；
+    # 导出无法载入时退回到源码编译
+    for m, key in zip(modes, keys):
+        out_json.unlink(missing_ok=True)  # slither_ok 会读它，不能让上一次的结果冒充本次
+        if m:
+            code,out,err = slither(art, out_json, {"file": f.name, "solc": ver}, hard_timeout=hard_timeout, warm=warm)
+        else:
+            code,out,err = slither(f, out_json, {"file": f.name, "solc": ver}, solc, solc_env(ver, solc), hard_timeout, warm)
+        if slither_ok(code, out_json):
+            if cache:
+                cache.put(key, out_json.read_text(encoding="utf-8"), f.stem)
+            record(db, f, ver, tool_ver, m or args, t0, "ok", out_json)
+            print(f"[OK] Slither{'(artifact)' if m else ''} => {out_json}")
+            return True
+    (OUT_DIR / (f.stem + ".err.txt")).write_text(err or out, encoding="utf-8")
+    record(db, f, ver, tool_ver, args, t0, "fail", out_json)
+    print(f"[ERR] Slither failed: {f.name}")
+    return False
 
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-j", "--workers", type=int, default=default_workers(), help="并发数（默认取 PARALLEL 或 4）")
+    ap.add_argument("--no-cache", action="store_true", help="不读写结果缓存")
+    ap.add_argument("--no-artifacts", action="store_true", help="忽略 01_prepare 的编译产物，从源码重新编译")
+    ap.add_argument("--cache-dir", default=str(CACHE_DIR))
+    ap.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_MB)
+    ap.add_argument("--hard-timeout", type=int, default=DEFAULT_HARD_TIMEOUT, help="单文件墙钟上限（秒，默认取 SLITHER_TIMEOUT 或 900，0 为不限）")
+    ap.add_argument("--db", default=str(DEFAULT_DB), help="结果写入的 SQLite 库")
+    ap.add_argument("--no-db", action="store_true", help="不写 SQLite 库")
+    ap.add_argument("--no-clusters", action="store_true", help="不做克隆聚类，每个文件都单独扫描")
+    ap.add_argument("--no-warm", action="store_true", help="不用常驻 worker，每个文件起一个 slither CLI")
+    ap.add_argument("--recycle-jobs", type=int, default=200, help="常驻 worker 处理这么多文件后重启（0 为不限）")
+    ap.add_argument("--recycle-mb", type=int, default=2048, help="常驻 worker 当前 RSS 超过该值（MB）后重启（0 为不限）")
+    args = ap.parse_args()
+
     if not which("slither"):
         raise SystemExit("slither not found. pip install slither-analyzer")
 
     files = sorted(FLAT.glob("*.sol"))
     if not files:
         raise SystemExit("No flattened files. Run 01_prepare.py first.")
+    failed = compile_failed_stems()
+    if failed:
+        n = len(files)
+        files = [f for f in files if f.stem not in failed]
+        print(f"[INFO] skip {n - len(files)} files listed in compile_fail.txt")
+
+    # 克隆簇只扫描代表，结果再分发给成员
+    clusters = None if args.no_clusters else build_clusters(files, args.workers)
+    targets = clusters.reps(files) if clusters else files
+    if clusters and clusters.skipped:
+        print(f"[INFO] clone clusters: {len(targets)} representatives for {len(files)} files")
+
+    cache = None if args.no_cache else ScanCache(Path(args.cache_dir), args.cache_max_mb * 1024 * 1024)
+    resolver = SolcResolver(RESOLVE_CACHE)
+    db = open_db(args.db, not args.no_db)
+    tool_ver = tool_version(["slither", "--version"])
+    warm = None
+    if not args.no_warm:
+        warm = WarmSlither(args.recycle_jobs, args.recycle_mb)
+        if not warm.start():
+            warm = None
+    job = partial(scan_one, resolver=resolver, cache=cache, tool_ver=tool_ver,
+                  use_artifacts=not args.no_artifacts, db=db, hard_timeout=args.hard_timeout, warm=warm)
 
-    ok=fail=0
-    for f in files:
-        text = f.read_text(encoding="utf-8", errors="ignore")
-        ver = detect_version(text)
-        solc_use(ver)
+    def record_clone(rep, m, out_json):
+        record(db, m, resolver.resolve_file(m)[0], tool_ver, ["--clone-of", rep.name], time.time(), "cloned", out_json)
 
-        out_json = OUT_DIR / (f.stem + ".json")
-        code,out,err = run(["slither", str(f), "--json", str(out_json)])
-        if code==0:
-            ok+=1; print(f"[OK] Slither => {out_json}")
+    ok=fail=cloned=0
+    stale = []
+    for f, res in run_pool(targets, lambda f: (f, job(f)), args.workers):
+        if res:
+            ok+=1
+            n, s = spread(f, clusters, OUT_DIR, remap_slither, partial(record_clone, f))
+            cloned += n; stale += s
         else:
-            fail+=1; (OUT_DIR / (f.stem + ".err.txt")).write_text(err or out, encoding="utf-8")
-            print(f"[ERR] Slither failed: {f.name}")
+            # 代表失败（可能只是它自己的编译问题）：成员不跟着记失败，逐个单独扫描
+            fail+=1
+            stale += clusters.members(f) if clusters else []
+    for res in run_pool(stale, job, args.workers):
+        if res: ok+=1
+        else: fail+=1
+    resolver.save()
+    if db:
+        db.close()
+    if warm:
+        warm.close()
+        print(f"[INFO] warm Slither workers: started {warm.started}, recycled {warm.recycled}")
 
-    print(f"[DONE] Slither ok={ok}, fail={fail}")
+    print(f"[DONE] Slither ok={ok + cloned} (cloned {cloned}), fail={fail}")
+    if cache:
+        st = cache.save_stats("slither")
+        print(f"[CACHE] hits={st['hits']} misses={st['misses']} evicted={st['evicted']}")
 
 if __name__ == "__main__":
     main()
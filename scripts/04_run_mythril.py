@@ -1,72 +1,359 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import re, subprocess
+import argparse, json, os, threading, time
+from functools import partial
 from pathlib import Path
 
+from scan_pool import which, run, solc_env, default_workers, run_fanout, Subtasks, tool_version, failure_kind
+from scan_cache import ScanCache, DEFAULT_MAX_MB
+from solc_resolver import SolcResolver
+from artifacts import load_artifact, deployable_contracts, source_index, pc_sources, compile_failed_stems
+from myth_schedule import load_scores, plan, split, MIN_TIMEOUT, MIN_DEPTH, OVERHEAD
+from findings_db import DEFAULT_DB, open_db, mythril_rows
+from clone_clusters import build as build_clusters, remap_mythril, spread
+
 ROOT = Path(__file__).resolve().parents[1]
 FLAT_DIR = ROOT / "work" / "flattened"
 OUT_DIR = ROOT / "out" / "mythril"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR = ROOT / "work" / "cache" / "scan"
+RESOLVE_CACHE = ROOT / "work" / "cache" / "solc_resolve.json"
+QUICK_SCREEN = ROOT / "out" / "quick_screen.csv"
 
-PRAGMA_RE = re.compile(r'pragma\s+solidity\s+([^;]+);', re.IGNORECASE)
-PIN_MAP = [("0.4","0.4.25"),("0.5","0.5.17"),("0.6","0.6.12"),("0.7","0.7.6"),("0.8","0.8.20")]
-
-def which(cmd:str)->str:
-    from shutil import which as _which
-    return _which(cmd) or ""
-
-def run(cmd):
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    out, err = p.communicate()
-    return p.returncode, out, err
-
-def detect_version(text:str)->str:
-    m = PRAGMA_RE.search(text)
-    if not m: return ""
-    clause = m.group(1)
-    m2 = re.search(r"0\.(\d+)", clause)
-    if not m2: return ""
-    mm = f"0.{m2.group(1)}"
-    for key,p in PIN_MAP:
-        if mm.startswith(key): return p
-    return ""
-
-def solc_use(ver:str)->bool:
-    if not ver: return True
-    if not which("solc-select"):
-        print("[WARN] solc-select not found, skip version switch")
-        return True
-    code, out, err = run(["solc-select","use",ver])
-    if code!=0:
-        print(f"[WARN] solc-select use {ver} failed: {err or out}")
+HARD_GRACE = 30         # 硬超时 = --execution-timeout + 这段余量（编译、z3 收尾、写报告）
+DEFAULT_MEM_MB = int(os.environ.get("MYTH_MEM_MB") or 4096)   # 每个 myth 进程的 RLIMIT_AS，0 为不限
+DEFAULT_RETRIES = int(os.environ.get("MYTH_RETRIES") or 2)    # 超时 / 内存耗尽后的降级重试次数
+
+def myth_args(timeout: int, depth: int):
+    return ["-o","jsonv2","--execution-timeout",str(timeout),"--max-depth",str(depth)]
+
+def locate_issues(out: str, code: str, srcmap: str, idx: int, src: bytes, flat: Path) -> str:
+    """
+    bytecode 模式的 jsonv2 中 issue 的位置只是 "pc:1:序号"。按 prepare 保存的 srcmap-runtime 映射回
+    flattened 源码：locations 改为 "起点:长度:0"，另加 address / filename / lineno（与源码模式 -o json 的字段相同）。
+    映射不到的（编译器生成的代码、metadata）只留 address，不带源码位置
+    """
+    try:
+        reports = json.loads(out)
+    except ValueError:
+        return out
+    pcs = None
+    for rep in reports if isinstance(reports, list) else [reports]:
+        if not isinstance(rep, dict):
+            continue
+        for it in rep.get("issues") or []:
+            locs = it.get("locations") or []
+            pc = str((locs[0] or {}).get("sourceMap") or "").split(":")[0] if locs else ""
+            if not pc.isdigit():
+                continue
+            if pcs is None:
+                pcs = pc_sources(code, srcmap)
+            it["address"] = int(pc)
+            start, length, fi = pcs.get(int(pc), (0, 0, -1))
+            if fi != idx:
+                it["locations"] = []
+                continue
+            it["locations"] = [{"sourceMap": f"{start}:{length}:0"}]
+            it["filename"] = str(flat)
+            it["lineno"] = src.count(b"\n", 0, start) + 1
+    return json.dumps(reports)
+
+def merge_reports(parts, source: str, degraded=None, deferred=None):
+    """
+    多个 jsonv2 报告（每个合约一次，位置已由 locate_issues 映射回源码）合并为单个文件级报告，
+    issue 上标注所属合约；sourceList 只有 flattened 文件本身（与源码模式一致）。
+    降级重试过的合约记在 meta.degraded（合约 -> [timeout, depth]），
+    因预算用完而未分析的合约记在 meta.deferred
+    """
+    merged = {"issues": [], "meta": {}, "sourceType": "solidity-file", "sourceFormat": "text",
+              "sourceList": [source]}
+    if degraded:
+        merged["meta"]["degraded"] = degraded
+    if deferred:
+        merged["meta"]["deferred"] = deferred
+    for name, out in parts:
+        try:
+            reports = json.loads(out)
+        except ValueError:
+            continue
+        for rep in reports if isinstance(reports, list) else [reports]:
+            for it in rep.get("issues") or []:
+                it["contract"] = name
+                merged["issues"].append(it)
+            for k, v in (rep.get("meta") or {}).items():
+                merged["meta"].setdefault(k, v)
+    return json.dumps([merged])
+
+def myth_run(target, timeout: int, depth: int, env=None, meta=None, mem_mb=0, retries=0):
+    """
+    带看门狗（整个进程组）和内存上限的 myth analyze；被杀（timeout）或内存耗尽（oom）时
+    把 --execution-timeout 与 --max-depth 减半后重试，拿到较浅但仍可用的结果。
+    → (rc, out, err, 最终使用的 (timeout, depth))
+    """
+    for attempt in range(retries + 1):
+        rc,out,err = run(["myth","analyze"] + target + myth_args(timeout, depth), env=env,
+                         meta=dict(meta or {}, attempt=attempt), timeout=timeout + HARD_GRACE, mem_mb=mem_mb)
+        if rc==0 and out.strip():
+            break
+        kind = failure_kind(rc, err)
+        nt, nd = min(timeout, max(MIN_TIMEOUT, timeout // 2)), min(depth, max(MIN_DEPTH, depth // 2))
+        if kind == "error" or attempt == retries or (nt, nd) == (timeout, depth):
+            break
+        name = (meta or {}).get("contract") or (meta or {}).get("file") or ""
+        print(f"[RETRY] Mythril {kind}: {name} {timeout}s/{depth} -> {nt}s/{nd}")
+        timeout, depth = nt, nd
+    return rc, out, err, (timeout, depth)
+
+def record(db, f: Path, ver: str, tool_ver: str, args, t0: float, status: str, out: str = ""):
+    if db is None:
+        return
+    db.record_run(f, "mythril", tool_ver, args, t0, time.time() - t0, status, mythril_rows(out) if out else [], solc=ver)
+
+class FileJob:
+    """
+    一个 flattened 文件按合约拆成的 Mythril 任务：每个可部署合约（file.sol:Contract）单独跑一次
+    myth analyze -c <runtime bytecode>，可以分散到 worker 池里并行；issue 按该合约的 srcmap-runtime
+    映射回源码位置。最后一个合约完成时把各部分合并为文件级 jsonv2 报告并写出结果、缓存与数据库。
+    文件的时间片按 bytecode 大小分给各合约（myth_schedule.split），整个文件仍只用一个时间片；
+    有 --budget 时再按剩余预算截短，但不低于该合约的下限，不够时该合约顺延。
+    """
+    def __init__(self, f: Path, slot, ver: str, timeout: int, depth: int, contracts, idx: int, key: str, key_args,
+                 ctx: dict, t0: float):
+        self.f, self.slot, self.ver = f, slot, ver
+        self.timeout, self.depth = timeout, depth
+        self.contracts = contracts          # [(name, runtime hex, srcmap-runtime)]；提交后由调用方释放
+        self.share = dict(zip((c[0] for c in contracts), split(timeout, [len(c[1]) for c in contracts])))
+        self.idx = idx                      # 本文件在 srcmap 中的文件序号
+        self.src = f.read_bytes()           # srcmap 的偏移是字节偏移
+        self.key, self.key_args, self.ctx, self.t0 = key, key_args, ctx, t0
+        self.parts, self.errs, self.deferred, self.degraded = [], [], [], {}
+        self.clamped = timeout < slot.timeout   # 被剩余预算截短过，结果不写缓存
+        self.left = len(contracts)
+        self.lock = threading.Lock()
+
+    def run(self, name: str, code: str, srcmap: str = ""):
+        """跑一个合约；是文件的最后一个合约时返回 (f, 结果)，否则返回 None"""
+        ctx = self.ctx
+        share = per = self.share[name]
+        if ctx["deadline"]:
+            per = min(per, int(ctx["deadline"] - time.monotonic()) - OVERHEAD)
+        res = None                          # None：预算已用完，该合约顺延
+        if per >= min(MIN_TIMEOUT, share):
+            res = myth_run(["-c",code,"--bin-runtime"], per, self.depth,
+                           meta={"file": self.f.name, "solc": self.ver, "contract": name},
+                           mem_mb=ctx["mem_mb"], retries=ctx["retries"])
+            rc, out, err, used = res
+            if rc==0 and out.strip():
+                res = rc, locate_issues(out, code, srcmap, self.idx, self.src, self.f), err, used
+        with self.lock:
+            self.clamped |= per < share
+            self.collect(name, res, per)
+            self.left -= 1
+            if self.left:
+                return None
+        return self.f, self.finish()
+
+    def collect(self, name, res, per):
+        if res is None:
+            self.deferred.append(name)
+            return
+        rc, out, err, used = res
+        if used != (per, self.depth):
+            self.degraded[name] = list(used)
+        if rc==0 and out.strip():
+            self.parts.append((name, out))
+        else:
+            self.errs.append(f"== {name} ({failure_kind(rc, err)}) ==\n{err or out}")
+
+    def finish(self):
+        """→ True / False；所有合约都因预算不足被顺延时返回 None"""
+        f, ctx = self.f, self.ctx
+        db, cache = ctx["db"], ctx["cache"]
+        if self.deferred and not self.parts and not self.errs:
+            return None
+        self.parts.sort()                   # 完成顺序不定，按合约名排序保证输出稳定
+        if self.errs:
+            (OUT_DIR / (f.stem + ".err.txt")).write_text("\n".join(sorted(self.errs)), encoding="utf-8")
+        if self.parts or not self.errs:
+            out = merge_reports(self.parts, str(f), self.degraded, sorted(self.deferred))
+            (OUT_DIR / (f.stem + ".json")).write_text(out, encoding="utf-8")
+            if cache and not (self.errs or self.degraded or self.deferred or self.clamped):
+                cache.put(self.key, out, f.stem)
+            record(db, f, self.ver, ctx["tool_ver"], self.key_args, self.t0,
+                   "degraded" if self.degraded or self.deferred else "ok", out)
+            tag = f", degraded {len(self.degraded)}" if self.degraded else ""
+            tag += f", deferred {len(self.deferred)}" if self.deferred else ""
+            print(f"[OK] Mythril(bytecode x{len(self.parts)}, {self.slot.tier} {self.timeout}s/{self.depth}{tag})"
+                  f" => {OUT_DIR / (f.stem + '.json')}")
+            return True
+        record(db, f, self.ver, ctx["tool_ver"], self.key_args, self.t0, "fail")
+        print(f"[ERR] Mythril failed: {f.name}")
         return False
-    return True
+
+def open_file(item, resolver: SolcResolver, cache=None, tool_ver="", use_artifacts=True, deadline=0.0, db=None,
+              mem_mb=0, retries=0):
+    """
+    文件级的前半段：预算检查、缓存命中、载入 prepare 产物。
+    有产物时返回 FileJob（由调用方把各合约分派出去）；否则按源码整文件分析，
+    → True / False；预算不足被顺延时返回 None
+    """
+    t0 = time.time()
+    f, slot = item
+    timeout, depth = slot.timeout, slot.depth
+    if slot.tier == "deferred":
+        return None
+    if deadline:
+        left = int(deadline - time.monotonic()) - OVERHEAD
+        if left < MIN_TIMEOUT:
+            return None
+        timeout = min(timeout, left)
+
+    text = f.read_text(encoding="utf-8", errors="ignore")
+    ver, solc = resolver.resolve_text(text)
+
+    out_json = OUT_DIR / (f.stem + ".json")
+    art = load_artifact(f) if use_artifacts else None
+    # 缓存键取时间片的名义参数：同一文件不因本次剩余预算多少而换键；被预算截短的运行不写缓存。
+    # +srcmap 标记产物模式的结果带源码位置（之前只有 pc 的旧结果不再命中）
+    key_args = myth_args(slot.timeout, depth) + (["--bin-runtime", "+srcmap"] if art is not None else [])
+    key = ScanCache.key(text, ver, "mythril", tool_ver, key_args) if cache else ""
+    if cache:
+        hit = cache.get(key, f.stem)
+        if hit is not None:
+            out_json.write_text(hit, encoding="utf-8")
+            record(db, f, ver, tool_ver, key_args, t0, "cached", hit)
+            print(f"[CACHE] Mythril => {out_json}")
+            return True
+
+    if art is not None:
+        ctx = {"deadline": deadline, "mem_mb": mem_mb, "retries": retries, "db": db, "cache": cache,
+               "tool_ver": tool_ver}
+        # 接口 / 抽象合约没有 bytecode，deployable_contracts 已经跳过
+        return FileJob(f, slot, ver, timeout, depth, deployable_contracts(art), source_index(art), key, key_args,
+                       ctx, t0)
+
+    code,out,err,used = myth_run([str(f)], timeout, depth, env=solc_env(ver, solc),
+                                 meta={"file": f.name, "solc": ver}, mem_mb=mem_mb, retries=retries)
+    degraded = used != (timeout, depth)
+    if code==0 and out.strip():
+        out_json.write_text(out, encoding="utf-8")
+        if cache and not degraded and timeout == slot.timeout:
+            cache.put(key, out, f.stem)
+        record(db, f, ver, tool_ver, key_args, t0, "degraded" if degraded else "ok", out)
+        print(f"[OK] Mythril({slot.tier} {used[0]}s/{used[1]}{' degraded' if degraded else ''}) => {out_json}")
+        return True
+    (OUT_DIR / (f.stem + ".err.txt")).write_text(f"[{failure_kind(code, err)}]\n" + (err or out), encoding="utf-8")
+    record(db, f, ver, tool_ver, key_args, t0, "fail")
+    print(f"[ERR] Mythril failed: {f.name}")
+    return False
+
+def scan_one(item, resolver: SolcResolver, cache=None, tool_ver="", use_artifacts=True, deadline=0.0, db=None,
+             mem_mb=0, retries=0):
+    """整个文件在当前线程内完成（合约依次执行），→ True / False / None（顺延）"""
+    res = open_file(item, resolver, cache, tool_ver, use_artifacts, deadline, db, mem_mb, retries)
+    if not isinstance(res, FileJob):
+        return res
+    if not res.contracts:
+        return res.finish()
+    for c in res.contracts:
+        done = res.run(*c)
+    return done[1]
+
+def shard(item, **kw):
+    """run_fanout 用：有产物的文件拆成每个合约一个子任务"""
+    res = open_file(item, **kw)
+    if not isinstance(res, FileJob):
+        return item[0], res
+    if not res.contracts:
+        return item[0], res.finish()
+    tasks = Subtasks(partial(res.run, *c) for c in res.contracts)
+    res.contracts = None
+    return tasks
 
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-j", "--workers", type=int, default=default_workers(), help="并发数（默认取 PARALLEL 或 4）")
+    ap.add_argument("--no-cache", action="store_true", help="不读写结果缓存")
+    ap.add_argument("--no-artifacts", action="store_true", help="忽略 01_prepare 的编译产物，从源码重新编译")
+    ap.add_argument("--timeout", type=int, default=int(os.environ.get("MYTH_TIMEOUT") or 60), help="基础 --execution-timeout（秒）")
+    ap.add_argument("--depth", type=int, default=int(os.environ.get("MYTH_DEPTH") or 80), help="基础 --max-depth")
+    ap.add_argument("--budget", type=float, default=float(os.environ.get("MYTH_BUDGET") or 0),
+                    help="整批的墙钟预算（秒）；按 quick screen 风险分分配时间与深度，0 表示不限")
+    ap.add_argument("--mem-mb", type=int, default=DEFAULT_MEM_MB, help="每个 myth 进程的内存上限（RLIMIT_AS，MB；默认取 MYTH_MEM_MB 或 4096，0 为不限）")
+    ap.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="超时 / 内存耗尽后减半 depth 与时间重试的次数（默认取 MYTH_RETRIES 或 2）")
+    ap.add_argument("--quick-screen", default=str(QUICK_SCREEN), help="02_quick_screen.py 的输出 CSV")
+    ap.add_argument("--cache-dir", default=str(CACHE_DIR))
+    ap.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_MB)
+    ap.add_argument("--db", default=str(DEFAULT_DB), help="结果写入的 SQLite 库")
+    ap.add_argument("--no-db", action="store_true", help="不写 SQLite 库")
+    ap.add_argument("--no-clusters", action="store_true", help="不做克隆聚类，每个文件都单独扫描")
+    args = ap.parse_args()
+
     if not which("myth"):
         raise SystemExit("myth not found. pip install mythril")
 
     files = sorted(FLAT_DIR.glob("*.sol"))
     if not files:
         raise SystemExit("No flattened files. Run 01_prepare.py first.")
+    failed = compile_failed_stems()
+    if failed:
+        n = len(files)
+        files = [f for f in files if f.stem not in failed]
+        print(f"[INFO] skip {n - len(files)} files listed in compile_fail.txt")
+
+    # 克隆簇只扫描代表（预算也只分给代表），结果再分发给成员
+    clusters = None if args.no_clusters else build_clusters(files, args.workers)
+    targets = clusters.reps(files) if clusters else files
+    if clusters and clusters.skipped:
+        print(f"[INFO] clone clusters: {len(targets)} representatives for {len(files)} files")
+
+    cache = None if args.no_cache else ScanCache(Path(args.cache_dir), args.cache_max_mb * 1024 * 1024)
+    scores = load_scores(Path(args.quick_screen))
+    if args.budget > 0 and not scores:
+        print(f"[WARN] {args.quick_screen} 不存在或为空，所有文件按零命中处理")
+    schedule = plan(targets, scores, args.budget, args.workers, args.timeout, args.depth)
+    deadline = time.monotonic() + args.budget if args.budget > 0 else 0.0
+
+    resolver = SolcResolver(RESOLVE_CACHE)
+    db = open_db(args.db, not args.no_db)
+    tool_ver = tool_version(["myth", "version"])
+    job = partial(shard, resolver=resolver, cache=cache, tool_ver=tool_ver,
+                  use_artifacts=not args.no_artifacts, deadline=deadline, db=db,
+                  mem_mb=args.mem_mb, retries=args.retries)
+    slots = dict(schedule)
+
+    def record_clone(rep, m, out_json):
+        record(db, m, resolver.resolve_file(m)[0], tool_ver, ["--clone-of", rep.name], time.time(), "cloned",
+               out_json.read_text(encoding="utf-8"))
 
-    ok=fail=0
-    for f in files:
-        text = f.read_text(encoding="utf-8", errors="ignore")
-        ver = detect_version(text)
-        solc_use(ver)
-
-        out_json = OUT_DIR / (f.stem + ".json")
-        cmd = ["myth","analyze",str(f),"-o","jsonv2","--execution-timeout","60","--max-depth","80"]
-        code,out,err = run(cmd)
-        if code==0 and out.strip():
-            out_json.write_text(out, encoding="utf-8")
-            ok+=1; print(f"[OK] Mythril => {out_json}")
+    ok=fail=cloned=0
+    deferred = []
+    stale = []
+    # 每个可部署合约是池中的一个任务：大文件的多个合约并行，不再占着一个 worker 串行跑完
+    for f, res in run_fanout(schedule, job, args.workers):
+        members = clusters.members(f) if clusters else []
+        if res is None: deferred += [f.name] + [m.name for m in members]
+        elif res:
+            ok+=1
+            n, s = spread(f, clusters, OUT_DIR, remap_mythril, partial(record_clone, f))
+            cloned += n; stale += [(m, slots[f]) for m in s]
         else:
-            fail+=1; (OUT_DIR / (f.stem + ".err.txt")).write_text(err or out, encoding="utf-8")
-            print(f"[ERR] Mythril failed: {f.name}")
+            # 代表失败（可能只是它自己的编译问题）：成员不跟着记失败，逐个单独扫描
+            fail+=1
+            stale += [(m, slots[f]) for m in members]
+    for f, res in run_fanout(stale, job, args.workers):
+        if res is None: deferred.append(f.name)
+        elif res: ok+=1
+        else: fail+=1
+    resolver.save()
+    if db:
+        db.close()
+    (OUT_DIR / "deferred.txt").write_text("\n".join(sorted(deferred)), encoding="utf-8")
 
-    print(f"[DONE] Mythril ok={ok}, fail={fail}")
+    print(f"[DONE] Mythril ok={ok + cloned} (cloned {cloned}), fail={fail}, deferred={len(deferred)}")
+    if cache:
+        st = cache.save_stats("mythril")
+        print(f"[CACHE] hits={st['hits']} misses={st['misses']} evicted={st['evicted']}")
 
 if __name__ == "__main__":
     main()
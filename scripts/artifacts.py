@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+01_prepare 的编译产物（solc --combined-json）读写
+Compilation artifacts kept by 01_prepare.py and reused by the scanners.
+
+work/artifacts/<flattened stem>.json  —— solc combined-json 原样输出（04 的 bytecode / 源码映射）：
+  contracts["<file>:<Name>"] = {abi, bin, bin-runtime, srcmap, srcmap-runtime}
+  sources["<file>"]["AST"], sourceList, version
+work/artifacts/<flattened stem>_export.json  —— 同一份编译结果转成 crytic-compile 的 standard 导出格式
+  （`crytic-compile --export-format standard` 的布局），03 直接把它交给 slither：crytic-compile 只按
+  *_export.json 的文件名识别导出文件，裸的 combined-json 会被当成源码去编译而失败
+
+01_prepare 批量编译时走 solc --standard-json（一次带多个源文件），再用 combined_from_standard()
+拆回与 --combined-json 相同的单文件布局，扫描器无需区分。
+"""
+import json, re
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+ARTIFACT_DIR = ROOT / "work" / "artifacts"
+COMPILE_FAIL = ROOT / "out" / "compile_fail.txt"
+
+COMBINED_FIELDS = "abi,bin,bin-runtime,srcmap,srcmap-runtime,ast"
+EXPORT_SUFFIX = "_export.json"  # crytic-compile 的 Standard 平台只认这个后缀
+CRYTIC_SOLC_TYPE = 1            # crytic_compile.platform.Type.SOLC
+
+STANDARD_JSON_MIN = (0, 4, 11)  # 更早的 solc 没有 --standard-json
+LEGACY_AST_MAX = (0, 8, 0)      # < 0.8.0：--combined-json ast 输出的是 legacy AST
+ABI_STRING_MAX = (0, 8, 10)     # < 0.8.10：--combined-json 中 abi 是 JSON 字符串
+
+# 未链接库的占位符：__$<34 hex>$__（>=0.5）或 __<path:Name 补齐>__（0.4）
+LIB_PLACEHOLDER_RE = re.compile(r'__.{36}__')
+
+def artifact_path(flat_file: Path) -> Path:
+    return ARTIFACT_DIR / (flat_file.stem + ".json")
+
+def export_path(flat_file: Path) -> Path:
+    return ARTIFACT_DIR / (flat_file.stem + EXPORT_SUFFIX)
+
+def artifact_files(flat_file: Path) -> List[Path]:
+    """一个 flattened 文件的全部产物（写出、硬链接、清理时一起处理）"""
+    return [artifact_path(flat_file), export_path(flat_file)]
+
+def load_artifact(flat_file: Path) -> Optional[dict]:
+    p = artifact_path(flat_file)
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def deployable_contracts(art: dict) -> List[Tuple[str, str, str]]:
+    """
+    → [(合约名, runtime bytecode, srcmap-runtime)]；接口 / 抽象合约没有 bytecode，直接跳过。
+    未链接的库地址用 0 填充（长度不变，pc 与 srcmap 仍对得上），保证是合法 hex。
+    """
+    res = []
+    for key, c in sorted((art.get("contracts") or {}).items()):
+        code = (c.get("bin-runtime") or "").strip()
+        if not code:
+            continue
+        name = key.rsplit(":", 1)[-1]
+        res.append((name, LIB_PLACEHOLDER_RE.sub("0" * 40, code), c.get("srcmap-runtime") or ""))
+    return res
+
+def source_index(art: dict) -> int:
+    """
+    本文件在 srcmap 中的文件序号：批量编译时是它在那一批 --standard-json 里的序号，不一定是 0；
+    取自 AST 根节点的 src（"起点:长度:序号"）；没有 AST 时取合约 srcmap 第一条（合约定义本身）的序号。
+    其他序号是编译器生成的代码（>= 0.7.2）
+    """
+    for info in (art.get("sources") or {}).values():
+        parts = str((info.get("AST") or {}).get("src") or "").split(":")
+        if len(parts) == 3 and parts[2].isdigit():
+            return int(parts[2])
+    for c in (art.get("contracts") or {}).values():
+        parts = (c.get("srcmap-runtime") or "").split(";", 1)[0].split(":")
+        if len(parts) > 2 and parts[2].isdigit():
+            return int(parts[2])
+    return 0
+
+def pc_sources(code: str, srcmap: str) -> Dict[int, Tuple[int, int, int]]:
+    """
+    runtime bytecode + srcmap-runtime → {pc: (起点, 长度, 文件序号)}。
+    srcmap 每条对应一条指令（PUSH1..PUSH32 带 1..32 字节立即数），省略的字段沿用上一条；
+    末尾的 metadata 不是指令，没有对应项
+    """
+    try:
+        b = bytes.fromhex(code)
+    except ValueError:
+        return {}
+    res: Dict[int, Tuple[int, int, int]] = {}
+    cur = [0, 0, -1]
+    pc = 0
+    for entry in srcmap.split(";") if srcmap else []:
+        if pc >= len(b):
+            break
+        for k, v in enumerate(entry.split(":")[:3]):
+            if v:
+                cur[k] = int(v)
+        res[pc] = (cur[0], cur[1], cur[2])
+        op = b[pc]
+        pc += 1 + (op - 0x5f if 0x60 <= op <= 0x7f else 0)
+    return res
+
+def standard_input(sources: Dict[str, str], ver: Tuple[int, int, int]) -> str:
+    """{源文件名: 内容} → --standard-json 输入；只要 COMBINED_FIELDS 对应的输出"""
+    ast = "legacyAST" if ver < LEGACY_AST_MAX else "ast"
+    evm = ["abi", "evm.bytecode.object", "evm.bytecode.sourceMap",
+           "evm.deployedBytecode.object", "evm.deployedBytecode.sourceMap"]
+    return json.dumps({
+        "language": "Solidity",
+        "sources": {name: {"content": text} for name, text in sources.items()},
+        "settings": {"outputSelection": {"*": {"*": evm, "": [ast]}}},
+    })
+
+def combined_from_standard(out: dict, src: str, full_ver: str, ver: Tuple[int, int, int]) -> dict:
+    """--standard-json 输出中属于 src 的部分 → 与 `solc --combined-json COMBINED_FIELDS src` 相同的结构"""
+    contracts = {}
+    for name, c in sorted(((out.get("contracts") or {}).get(src) or {}).items()):
+        evm = c.get("evm") or {}
+        abi = c.get("abi") or []
+        contracts[f"{src}:{name}"] = {
+            "abi": json.dumps(abi, separators=(",", ":")) if ver < ABI_STRING_MAX else abi,
+            "bin": (evm.get("bytecode") or {}).get("object") or "",
+            "bin-runtime": (evm.get("deployedBytecode") or {}).get("object") or "",
+            "srcmap": (evm.get("bytecode") or {}).get("sourceMap") or "",
+            "srcmap-runtime": (evm.get("deployedBytecode") or {}).get("sourceMap") or "",
+        }
+    info = (out.get("sources") or {}).get(src) or {}
+    ast = info.get("legacyAST") if ver < LEGACY_AST_MAX else info.get("ast")
+    return {"contracts": contracts, "sourceList": [src], "sources": {src: {"AST": ast or {}}},
+            "version": full_ver}
+
+def crytic_export(art: dict) -> dict:
+    """
+    combined-json → crytic-compile standard 导出（crytic_version 0.0.2，与 generate_standard_export 相同的结构），
+    不依赖 crytic-compile 本身；源文件路径沿用编译时传给 solc 的路径（绝对路径），与 AST 中的 absolutePath 一致
+    """
+    m = re.match(r"\d+\.\d+\.\d+", art.get("version") or "")
+    units: Dict[str, dict] = {}
+    for src in art.get("sourceList") or []:
+        units[src] = {"ast": ((art.get("sources") or {}).get(src) or {}).get("AST") or {}, "contracts": {}}
+    for key, c in sorted((art.get("contracts") or {}).items()):
+        src, name = key.rsplit(":", 1)
+        abi = c.get("abi") or []
+        units.setdefault(src, {"ast": {}, "contracts": {}})["contracts"][name] = {
+            "abi": json.loads(abi) if isinstance(abi, str) else abi,
+            "bin": c.get("bin") or "", "bin-runtime": c.get("bin-runtime") or "",
+            "srcmap": c.get("srcmap") or "", "srcmap-runtime": c.get("srcmap-runtime") or "",
+            "filenames": _filename(src), "libraries": {}, "is_dependency": False, "userdoc": {}, "devdoc": {},
+        }
+    return {
+        "compilation_units": {"prepare": {
+            "compiler": {"compiler": "solc", "version": m.group(0) if m else "", "optimized": False},
+            "source_units": units,
+            "filenames": [_filename(src) for src in units],
+        }},
+        "package": None, "working_dir": str(ROOT), "type": CRYTIC_SOLC_TYPE, "unit_tests": [],
+        "crytic_version": "0.0.2",
+    }
+
+def _filename(src: str) -> dict:
+    p = Path(src).resolve()
+    try:
+        short = str(p.relative_to(ROOT))
+    except ValueError:
+        short = str(p)
+    return {"absolute": str(p), "used": src, "short": short, "relative": short}
+
+def compile_failed_stems(fail_txt: Path = COMPILE_FAIL) -> Set[str]:
+    """compile_fail.txt 中的入口文件 → 对应 flattened 文件的 stem"""
+    stems = set()
+    try:
+        lines = fail_txt.read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return stems
+    for line in lines:
+        entry = line.split(" ::: ", 1)[0].strip()
+        if entry:
+            stems.add(f"{Path(entry).stem}__flattened")
+    return stems
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+克隆聚类：同一族 ERC20 / ICO / token 副本只扫描一次
+Near-duplicate clustering of flattened files so each clone family is analyzed once.
+
+- 指纹：sol_lexer.normalize 的规范化 token 流（去注释空白、标识符改名、字面量占位，pragma 保留）
+  - exact：规范化 token 流的 sha256。完全相同的文件组成一个簇，只有代表（文件名最小者）
+    送去 Slither / Mythril，结果再分发给簇内其他成员：行号 / 偏移按 token 对应关系重映射，
+    文件名与标识符换成成员自己的
+  - near：5-token shingle 的 MinHash（64 桶单次哈希）+ LSH（8 band × 8 行），
+    估计 Jaccard ≥ NEAR_THRESHOLD 的代表归为近似族，只用于统计和人工复核，不跳过扫描
+- 指纹按（文件名, mtime, 大小）缓存在 work/cache/fingerprints.json，未变化的文件不重算
+- 聚类结果写在 work/clusters.json：{"clusters": {代表: [成员...]}, "near": [[代表...]]}
+
+03_run_slither.py / 04_run_mythril.py 默认使用聚类（--no-clusters 关闭）。
+
+用法 / Usage:
+  python3 scripts/clone_clusters.py            # 只做聚类并打印统计
+  python3 scripts/clone_clusters.py --near 20  # 另外列出最大的 20 个近似族
+"""
+import argparse, hashlib, json, os, re
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sol_lexer import normalize, Tokens
+
+ROOT = Path(__file__).resolve().parents[1]
+FLAT_DIR = ROOT / "work" / "flattened"
+CLUSTERS = ROOT / "work" / "clusters.json"
+FP_CACHE = ROOT / "work" / "cache" / "fingerprints.json"
+
+SHINGLE = 5             # shingle 的 token 数
+BINS = 64               # MinHash 桶数（单次哈希，按低 6 位分桶）
+BANDS = 8               # LSH band 数；每 band BINS // BANDS 行
+NEAR_THRESHOLD = 0.8    # 近似族的最低估计 Jaccard
+EMPTY = 0xFFFFFFFF      # 空桶
+
+def read_text(p: Path) -> str:
+    return p.read_text(encoding="utf-8", errors="ignore")
+
+def fingerprint(p: Path) -> Tuple[str, str]:
+    """→ (exact 哈希, MinHash 签名的 hex：BINS 个 32 位值)"""
+    norm = normalize(read_text(p)).norm
+    exact = hashlib.sha256("\x00".join(norm).encode("utf-8")).hexdigest()
+    sig = [EMPTY] * BINS
+    for i in range(max(1, len(norm) - SHINGLE + 1)):
+        sh = "\x00".join(norm[i:i + SHINGLE]).encode("utf-8")
+        h = int.from_bytes(hashlib.blake2b(sh, digest_size=8).digest(), "little")
+        b, v = h & (BINS - 1), (h >> 6) & 0xFFFFFFFF
+        if v < sig[b]:
+            sig[b] = v
+    return exact, "".join(f"{v:08x}" for v in sig)
+
+def _sig(hexs: str) -> List[int]:
+    return [int(hexs[i:i + 8], 16) for i in range(0, len(hexs), 8)]
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """估计 Jaccard：两边都非空的桶中取值相同的比例"""
+    both = [(x, y) for x, y in zip(a, b) if x != EMPTY or y != EMPTY]
+    return sum(x == y for x, y in both) / len(both) if both else 1.0
+
+class Clusters:
+    def __init__(self, clusters: Dict[str, List[str]], near: List[List[str]], files: int):
+        self.clusters = clusters                    # 代表文件名 -> 成员文件名（不含代表）
+        self.near = near
+        self.files = files
+        self.rep_of = {m: rep for rep, ms in clusters.items() for m in ms}
+
+    def reps(self, files: List[Path]) -> List[Path]:
+        """去掉非代表成员后的待扫描文件（保持原顺序）"""
+        return [f for f in files if f.name not in self.rep_of]
+
+    def members(self, rep: Path) -> List[Path]:
+        return [rep.parent / m for m in self.clusters.get(rep.name, [])]
+
+    @property
+    def skipped(self) -> int:
+        return len(self.rep_of)
+
+    def save(self, path: Path = CLUSTERS) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"files": self.files, "clusters": self.clusters, "near": self.near},
+                                   indent=1, sort_keys=True), encoding="utf-8")
+
+def _lsh_families(reps: List[str], sigs: Dict[str, List[int]]) -> List[List[str]]:
+    rows = BINS // BANDS
+    parent = {r: r for r in reps}
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for band in range(BANDS):
+        buckets: Dict[tuple, List[str]] = {}
+        for r in reps:
+            key = tuple(sigs[r][band * rows:(band + 1) * rows])
+            if all(v == EMPTY for v in key):
+                continue    # 很短的文件：空 band 不能作为相似的依据
+            buckets.setdefault(key, []).append(r)
+        for group in buckets.values():
+            for other in group[1:]:
+                a, b = find(group[0]), find(other)
+                if a != b and similarity(sigs[group[0]], sigs[other]) >= NEAR_THRESHOLD:
+                    parent[b] = a
+    fams: Dict[str, List[str]] = {}
+    for r in reps:
+        fams.setdefault(find(r), []).append(r)
+    return sorted((sorted(v) for v in fams.values() if len(v) > 1), key=lambda v: (-len(v), v[0]))
+
+def build(files: List[Path], workers: int = 1, cache_path: Path = FP_CACHE) -> Clusters:
+    """计算（或从缓存取）指纹并聚类；写出 work/clusters.json"""
+    try:
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cache = {}
+    fps: Dict[str, Tuple[str, str]] = {}
+    todo = []
+    for f in files:
+        st = f.stat()
+        hit = cache.get(f.name)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            fps[f.name] = (hit[2], hit[3])
+        else:
+            todo.append((f, st))
+    if todo:
+        if workers > 1 and len(todo) > 64:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                results = list(ex.map(fingerprint, [f for f, _ in todo], chunksize=32))
+        else:
+            results = [fingerprint(f) for f, _ in todo]
+        for (f, st), fp in zip(todo, results):
+            fps[f.name] = fp
+            cache[f.name] = [st.st_mtime_ns, st.st_size, *fp]
+    # 只保留本次文件的缓存项，删除的文件不会越积越多
+    cache = {k: cache[k] for k in fps}
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps(cache), encoding="utf-8")
+
+    groups: Dict[str, List[str]] = {}
+    for name in sorted(fps):
+        groups.setdefault(fps[name][0], []).append(name)
+    clusters = {g[0]: g[1:] for g in groups.values() if len(g) > 1}
+    reps = [g[0] for g in groups.values()]
+    near = _lsh_families(reps, {r: _sig(fps[r][1]) for r in reps})
+    res = Clusters(clusters, near, len(fps))
+    res.save()
+    return res
+
+# ---------------- 结果分发 ----------------
+
+class CloneMap:
+    """代表 → 成员的位置与命名映射（两者规范化 token 流完全相同，逐 token 对应）"""
+    def __init__(self, rep_text: str, member_text: str):
+        a, b = normalize(rep_text), normalize(member_text)
+        if a.norm != b.norm:
+            raise ValueError("not an exact clone")
+        self.a, self.b = a, b
+        self.a_bytes = self._byte_offsets(rep_text, a)
+        self.b_bytes = self._byte_offsets(member_text, b)
+        self.names = {x: y for x, y, n in zip(a.raw, b.raw, a.norm)
+                      if n[:1] == "<" and n[1:-1].isdigit() and x != y}
+        self._name_re = re.compile(r"(?<![\w$])(" + "|".join(map(re.escape, sorted(self.names, key=len, reverse=True)))
+                                   + r")(?![\w$])") if self.names else None
+
+    @staticmethod
+    def _byte_offsets(text: str, t: Tokens) -> List[int]:
+        # Slither 的 start / length 是 UTF-8 字节偏移
+        res, pos, nbytes = [], 0, 0
+        for off in t.offsets:
+            nbytes += len(text[pos:off].encode("utf-8"))
+            pos = off
+            res.append(nbytes)
+        return res
+
+    def line(self, n: int) -> int:
+        """代表的行号 → 成员的行号；没有 token 的行（注释、空行）按到下一个 token 的距离推算"""
+        a, b = self.a.lines, self.b.lines
+        if not a:
+            return n
+        i = bisect_left(a, n)
+        if i >= len(a):
+            return b[-1] + (n - a[-1])
+        return max(1, b[i] - (a[i] - n))
+
+    def offset(self, o: int) -> int:
+        """代表的字节偏移 → 成员的字节偏移（落在 token 内部时保持相对位置）"""
+        i = bisect_right(self.a_bytes, o) - 1
+        if i < 0:
+            return o
+        return self.b_bytes[i] + min(o - self.a_bytes[i], len(self.b.raw[i].encode("utf-8")))
+
+    def rename(self, s: str) -> str:
+        return self._name_re.sub(lambda m: self.names[m.group(1)], s) if self._name_re else s
+
+_LINE_REF_RE = re.compile(r'#(\d+)(?:-(\d+))?')
+
+def _fix_text(s: str, rep: Path, member: Path, cmap: CloneMap) -> str:
+    s = s.replace(rep.name, member.name)
+    s = _LINE_REF_RE.sub(lambda m: f"#{cmap.line(int(m.group(1)))}"
+                         + (f"-{cmap.line(int(m.group(2)))}" if m.group(2) else ""), s)
+    return cmap.rename(s)
+
+def _fix_source_mapping(sm: dict, rep: Path, member: Path, cmap: CloneMap) -> None:
+    lines = [n for n in sm.get("lines") or [] if isinstance(n, int)]
+    if lines:
+        lo, hi = min(lines), max(lines)
+        if hi - lo + 1 == len(set(lines)):
+            # 连续区间（函数体、合约体）：成员里同样是连续区间，中间多出的空行 / 注释也包含在内
+            sm["lines"] = list(range(cmap.line(lo), cmap.line(hi) + 1))
+        else:
+            sm["lines"] = sorted({cmap.line(n) for n in lines})
+    if isinstance(sm.get("start"), int) and isinstance(sm.get("length"), int):
+        s, e = cmap.offset(sm["start"]), cmap.offset(sm["start"] + sm["length"])
+        sm["start"], sm["length"] = s, max(0, e - s)
+    for k in ("filename_absolute", "filename_relative", "filename_short", "filename_used"):
+        if isinstance(sm.get(k), str):
+            sm[k] = sm[k].replace(rep.name, member.name)
+
+def _fix_element(el: dict, rep: Path, member: Path, cmap: CloneMap) -> None:
+    if isinstance(el.get("name"), str):
+        el["name"] = cmap.rename(el["name"])
+    if isinstance(el.get("source_mapping"), dict):
+        _fix_source_mapping(el["source_mapping"], rep, member, cmap)
+    parent = (el.get("type_specific_fields") or {}).get("parent")
+    if isinstance(parent, dict):
+        _fix_element(parent, rep, member, cmap)
+
+def remap_slither(text: str, rep: Path, member: Path, cmap: CloneMap) -> str:
+    data = json.loads(text)
+    for det in ((data or {}).get("results") or {}).get("detectors") or []:
+        for k in ("description", "markdown", "first_markdown_element"):
+            if isinstance(det.get(k), str):
+                det[k] = _fix_text(det[k], rep, member, cmap)
+        for el in det.get("elements") or []:
+            if isinstance(el, dict):
+                _fix_element(el, rep, member, cmap)
+    return json.dumps(data)
+
+def remap_mythril(text: str, rep: Path, member: Path, cmap: CloneMap) -> str:
+    data = json.loads(text)
+    for report in data if isinstance(data, list) else [data]:
+        if not isinstance(report, dict):
+            continue
+        source_mode = report.get("sourceType") == "solidity-file"
+        report["sourceList"] = [s.replace(rep.name, member.name) if isinstance(s, str) else s
+                                for s in report.get("sourceList") or []]
+        for it in report.get("issues") or []:
+            if isinstance(it.get("contract"), str):
+                it["contract"] = cmap.rename(it["contract"])
+            desc = it.get("description")
+            if isinstance(desc, dict):
+                for k in ("head", "tail"):
+                    if isinstance(desc.get(k), str):
+                        desc[k] = cmap.rename(desc[k])
+            if isinstance(it.get("lineno"), int):
+                it["lineno"] = cmap.line(it["lineno"])
+            if isinstance(it.get("filename"), str):
+                it["filename"] = it["filename"].replace(rep.name, member.name)
+            if source_mode:
+                # 源码模式的 sourceMap 是 "起点:长度:文件序号"（字节偏移）；bytecode 模式指向字节码，不变
+                for loc in it.get("locations") or []:
+                    parts = str(loc.get("sourceMap") or "").split(":")
+                    if len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
+                        s = cmap.offset(int(parts[0]))
+                        e = cmap.offset(int(parts[0]) + int(parts[1]))
+                        loc["sourceMap"] = ":".join([str(s), str(max(0, e - s))] + parts[2:])
+    return json.dumps(data)
+
+def fan_out(rep: Path, members: List[Path], out_dir: Path,
+            remap: Callable[[str, Path, Path, CloneMap], str]) -> Iterator[Tuple[Path, Optional[Path]]]:
+    """
+    把代表的结果（out_dir/<代表>.json）改写成各成员的结果文件。
+    → (成员, 结果文件)；成员已不再是代表的克隆（聚类之后被改动）时结果文件为 None
+    """
+    text = (out_dir / (rep.stem + ".json")).read_text(encoding="utf-8")
+    rep_text = read_text(rep)
+    for m in members:
+        try:
+            cmap = CloneMap(rep_text, read_text(m))
+            out = remap(text, rep, m, cmap)
+        except (OSError, ValueError):
+            yield m, None
+            continue
+        dst = out_dir / (m.stem + ".json")
+        dst.write_text(out, encoding="utf-8")
+        yield m, dst
+
+def spread(rep: Path, clusters: Optional[Clusters], out_dir: Path, remap, record) -> Tuple[int, List[Path]]:
+    """
+    扫描器用：代表扫描成功后把结果分发给成员，record(成员, 结果文件) 负责写结果库。
+    → (分发的成员数, 已不再是克隆、需要单独扫描的成员)
+    """
+    members = clusters.members(rep) if clusters else []
+    n, stale = 0, []
+    for m, out in fan_out(rep, members, out_dir, remap) if members else ():
+        if out is None:
+            stale.append(m)
+        else:
+            record(m, out)
+            n += 1
+    if n:
+        print(f"[CLONE] {rep.name} => {n} clones")
+    return n, stale
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="计算指纹的进程数")
+    ap.add_argument("--near", type=int, default=0, help="列出最大的 N 个近似族")
+    args = ap.parse_args()
+
+    from artifacts import compile_failed_stems
+    failed = compile_failed_stems()
+    files = [f for f in sorted(FLAT_DIR.glob("*.sol")) if f.stem not in failed]
+    if not files:
+        raise SystemExit("No flattened files. Run 01_prepare.py first.")
+    cl = build(files, args.workers)
+    n_near = sum(len(f) for f in cl.near)
+    print(f"[OK] {cl.files} files -> {cl.files - cl.skipped} to scan "
+          f"({len(cl.clusters)} clone clusters cover {cl.skipped + len(cl.clusters)} files; "
+          f"{len(cl.near)} near-duplicate families over {n_near} representatives) -> {CLUSTERS}")
+    for fam in cl.near[:args.near]:
+        print(f"  {len(fam):>5}  {', '.join(fam[:5])}{' ...' if len(fam) > 5 else ''}")
+
+if __name__ == "__main__":
+    main()
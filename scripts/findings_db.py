@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描结果的 SQLite 存储（整条流水线的权威记录）
+SQLite findings store shared by every stage and by the report tools.
+
+out/findings.db:
+  files        每个被分析的文件（datasets 原文件或 flattened 文件），solc 版本，来源入口
+  compilations 01_prepare 的每次编译：solc、是否通过、失败原因
+  runs         每次工具运行：tool、版本、参数、耗时、状态（ok / fail / cached）
+  findings     每条发现：tool、rule（SWC-ID / detector / 快筛模式）、类别、标题、严重度、位置
+  rule_p       rule -> P 类别（make_report --pmap 写入，前缀规则展开后的结果）
+
+历史运行全部保留；latest_runs / current_findings 视图只看每个文件每个工具最近的一次。
+多线程扫描器共用一个连接（内部加锁）；WAL 模式下报告工具可同时只读查询。
+"""
+import json, sqlite3, threading, time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_DB = ROOT / "out" / "findings.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id      INTEGER PRIMARY KEY,
+    path    TEXT NOT NULL UNIQUE,
+    stem    TEXT NOT NULL,
+    source  TEXT,
+    sha256  TEXT,
+    solc    TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS files_stem ON files(stem);
+CREATE INDEX IF NOT EXISTS files_solc ON files(solc);
+
+CREATE TABLE IF NOT EXISTS compilations (
+    id      INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    solc    TEXT,
+    ok      INTEGER NOT NULL,
+    reason  TEXT,
+    ts      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS compilations_file ON compilations(file_id, id);
+
+CREATE TABLE IF NOT EXISTS runs (
+    id           INTEGER PRIMARY KEY,
+    file_id      INTEGER NOT NULL REFERENCES files(id),
+    tool         TEXT NOT NULL,
+    tool_version TEXT,
+    args         TEXT,
+    started      REAL NOT NULL,
+    duration     REAL,
+    status       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_file_tool ON runs(file_id, tool, id);
+CREATE INDEX IF NOT EXISTS runs_tool_started ON runs(tool, started);
+
+CREATE TABLE IF NOT EXISTS findings (
+    id       INTEGER PRIMARY KEY,
+    run_id   INTEGER NOT NULL REFERENCES runs(id),
+    file_id  INTEGER NOT NULL REFERENCES files(id),
+    tool     TEXT NOT NULL,
+    rule     TEXT NOT NULL,
+    category TEXT,
+    title    TEXT,
+    severity TEXT,
+    location TEXT
+);
+CREATE INDEX IF NOT EXISTS findings_run ON findings(run_id);
+CREATE INDEX IF NOT EXISTS findings_file ON findings(file_id, tool);
+CREATE INDEX IF NOT EXISTS findings_rule ON findings(tool, rule);
+
+CREATE TABLE IF NOT EXISTS rule_p (
+    tool TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    p    TEXT NOT NULL,
+    PRIMARY KEY (tool, rule, p)
+);
+CREATE INDEX IF NOT EXISTS rule_p_p ON rule_p(p);
+
+-- 汇总表（rollup_*）：record_run / record_runs 在写入发现的同一事务里增量维护，
+-- quick_stats / 看板直接读取，查询代价与文件数无关
+CREATE TABLE IF NOT EXISTS rollup_file (      -- 每个文件每个工具最近一次运行的发现数
+    file_id INTEGER NOT NULL,
+    tool    TEXT NOT NULL,
+    run_id  INTEGER NOT NULL,
+    n       INTEGER NOT NULL,
+    solc    TEXT NOT NULL,
+    PRIMARY KEY (file_id, tool)
+);
+CREATE INDEX IF NOT EXISTS rollup_file_top ON rollup_file(tool, n);
+
+CREATE TABLE IF NOT EXISTS rollup_tool (      -- 每个工具：文件数、命中文件数、发现总数（tool='any'：slither / mythril 合并到文件层）
+    tool      TEXT PRIMARY KEY,
+    files     INTEGER NOT NULL,
+    hit_files INTEGER NOT NULL,
+    issues    INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rollup_count (     -- 每个工具（含 'any'）、solc 版本下“发现数 = n”的文件数（均值 / 最值）
+    tool  TEXT NOT NULL,
+    solc  TEXT NOT NULL,
+    n     INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    PRIMARY KEY (tool, solc, n)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_rule (      -- 每个 rule、solc 版本：命中文件数与条数
+    tool  TEXT NOT NULL,
+    solc  TEXT NOT NULL,
+    rule  TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    hits  INTEGER NOT NULL,
+    PRIMARY KEY (tool, solc, rule)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_p (         -- 每个 P 类别的命中文件数（依赖 rule_p，set_rule_p 时重算）
+    p     TEXT PRIMARY KEY,
+    files INTEGER NOT NULL
+);
+
+CREATE VIEW IF NOT EXISTS latest_runs AS
+    SELECT r.* FROM runs r
+    WHERE r.id = (SELECT MAX(id) FROM runs r2 WHERE r2.file_id = r.file_id AND r2.tool = r.tool);
+
+CREATE VIEW IF NOT EXISTS current_findings AS
+    SELECT f.* FROM findings f JOIN latest_runs r ON r.id = f.run_id;
+"""
+
+# 一条发现：(rule, category, title, severity, location)
+Finding = Tuple[str, str, str, str, str]
+
+# 参与 rollup_tool 'any' 与 rollup_p 的工具（与报告一致）
+SCAN_TOOLS = ("slither", "mythril")
+
+def slither_rows(text: str) -> List[Finding]:
+    """Slither --json 输出 → 发现列表（只看 results.detectors[*]）"""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    rows = []
+    for det in ((data or {}).get("results") or {}).get("detectors") or []:
+        if not isinstance(det, dict) or not isinstance(det.get("check"), str):
+            continue
+        loc = ""
+        for el in det.get("elements") or []:
+            sm = el.get("source_mapping") or {}
+            if sm.get("lines"):
+                fname = sm.get("filename_short") or sm.get("filename_relative") or ""
+                loc = f"{fname}:{sm['lines'][0]}" if fname else str(sm["lines"][0])
+                break
+        rows.append((det["check"].strip(), "", str(det.get("description") or "").strip()[:200],
+                     str(det.get("impact") or ""), loc))
+    return rows
+
+def mythril_rows(text: str) -> List[Finding]:
+    """Mythril -o json / jsonv2 输出 → 发现列表"""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    reports = data if isinstance(data, list) else [data]
+    rows = []
+    for rep in reports:
+        if not isinstance(rep, dict):
+            continue
+        for it in rep.get("issues") or []:
+            swc = it.get("swcID") or it.get("swc-id") or ""
+            if swc and not str(swc).startswith("SWC-"):
+                swc = f"SWC-{swc}"
+            title = it.get("swcTitle") or it.get("title") or ""
+            loc = it.get("contract") or ""
+            if it.get("lineno"):
+                loc = f"{loc}:{it['lineno']}" if loc else str(it["lineno"])
+            elif it.get("locations"):
+                sm = (it["locations"][0] or {}).get("sourceMap") or ""
+                loc = f"{loc}@{sm}" if loc else sm
+            rows.append((str(swc), "", str(title), str(it.get("severity") or ""), loc))
+    return rows
+
+class FindingsDB:
+    def __init__(self, path: Path = DEFAULT_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self._ensure_rollups()
+
+    def _file_id(self, path: str, **info) -> int:
+        stem = Path(path).stem
+        cols = {k: v for k, v in info.items() if v}
+        self.conn.execute("INSERT OR IGNORE INTO files(path, stem, updated) VALUES (?,?,?)",
+                          (path, stem, time.time()))
+        if cols.get("solc"):
+            self._move_solc(path, cols["solc"])
+        if cols:
+            sets = ", ".join(f"{k}=?" for k in cols)
+            self.conn.execute(f"UPDATE files SET {sets}, updated=? WHERE path=?",
+                              (*cols.values(), time.time(), path))
+        return self.conn.execute("SELECT id FROM files WHERE path=?", (path,)).fetchone()[0]
+
+    def record_file(self, path, source: str = "", sha256: str = "", solc: str = "") -> int:
+        with self.lock, self.conn:
+            return self._file_id(str(path), source=source, sha256=sha256, solc=solc)
+
+    def record_compile(self, path, solc: str, ok: bool, reason: str = "", source: str = "") -> None:
+        with self.lock, self.conn:
+            fid = self._file_id(str(path), source=source, solc=solc)
+            self.conn.execute("INSERT INTO compilations(file_id, solc, ok, reason, ts) VALUES (?,?,?,?,?)",
+                              (fid, solc, int(ok), reason, time.time()))
+
+    def record_run(self, path, tool: str, tool_version: str, args: Sequence[str], started: float,
+                   duration: float, status: str, findings: Iterable[Finding] = (), solc: str = "") -> int:
+        """一次工具运行及其全部发现，在同一个事务里写入"""
+        with self.lock, self.conn:
+            fid = self._file_id(str(path), solc=solc)
+            cur = self.conn.execute(
+                "INSERT INTO runs(file_id, tool, tool_version, args, started, duration, status) VALUES (?,?,?,?,?,?,?)",
+                (fid, tool, tool_version, json.dumps(list(args)), started, duration, status))
+            run_id = cur.lastrowid
+            findings = list(findings)
+            self.conn.executemany(
+                "INSERT INTO findings(run_id, file_id, tool, rule, category, title, severity, location) VALUES (?,?,?,?,?,?,?,?)",
+                ((run_id, fid, tool, *row) for row in findings))
+            self._rollup(fid, tool, run_id, findings)
+            return run_id
+
+    def record_runs(self, tool: str, tool_version: str, args: Sequence[str], started: float,
+                    per_file: Iterable[Tuple[str, List[Finding]]]) -> int:
+        """批量写入（如快筛的整份 CSV）：每个文件一条 run，整体一个事务"""
+        n = 0
+        with self.lock, self.conn:
+            for path, rows in per_file:
+                fid = self._file_id(str(path))
+                cur = self.conn.execute(
+                    "INSERT INTO runs(file_id, tool, tool_version, args, started, duration, status) VALUES (?,?,?,?,?,?,?)",
+                    (fid, tool, tool_version, json.dumps(list(args)), started, None, "ok"))
+                rows = list(rows)
+                self.conn.executemany(
+                    "INSERT INTO findings(run_id, file_id, tool, rule, category, title, severity, location) VALUES (?,?,?,?,?,?,?,?)",
+                    ((cur.lastrowid, fid, tool, *row) for row in rows))
+                self._rollup(fid, tool, cur.lastrowid, rows)
+                n += 1
+        return n
+
+    def set_rule_p(self, pairs: Iterable[Tuple[str, str, str]]) -> None:
+        """(tool, rule, P)；整表重建，跟随当前映射文件"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM rule_p")
+            self.conn.executemany("INSERT OR IGNORE INTO rule_p(tool, rule, p) VALUES (?,?,?)", pairs)
+            self._rebuild_rollup_p()
+
+    # ---- 汇总表维护 ----
+
+    def _bump(self, table: str, key: dict, **delta) -> None:
+        """UPSERT 累加；计数归零的行删除（保证 MIN / MAX 只看现存文件）"""
+        cols = list(key) + list(delta)
+        sets = ", ".join(f"{k}={k}+excluded.{k}" for k in delta)
+        self.conn.execute(
+            f"INSERT INTO {table}({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+            f"ON CONFLICT({', '.join(key)}) DO UPDATE SET {sets}",
+            (*key.values(), *delta.values()))
+        if "files" in delta and delta["files"] < 0:
+            where = " AND ".join(f"{k}=?" for k in key)
+            self.conn.execute(f"DELETE FROM {table} WHERE {where} AND files<=0", tuple(key.values()))
+
+    def _file_ps(self, fid: int) -> set:
+        return {r[0] for r in self.conn.execute(
+            f"""SELECT DISTINCT p.p FROM rollup_file rf
+                JOIN findings x ON x.run_id = rf.run_id
+                JOIN rule_p p ON p.tool = x.tool AND p.rule = x.rule
+                WHERE rf.file_id = ? AND rf.tool IN {SCAN_TOOLS}""", (fid,))}
+
+    def _file_any(self, fid: int) -> Tuple[int, int, str]:
+        """(是否有 slither / mythril 结果, 两者发现数之和, 最近一次写入时的 solc)"""
+        r = self.conn.execute(
+            f"""SELECT COUNT(*), COALESCE(SUM(n), 0),
+                       (SELECT solc FROM rollup_file WHERE file_id=?1 AND tool IN {SCAN_TOOLS} ORDER BY run_id DESC LIMIT 1)
+                FROM rollup_file WHERE file_id=?1 AND tool IN {SCAN_TOOLS}""", (fid,)).fetchone()
+        return int(r[0] > 0), r[1], r[2] or ""
+
+    def _move_solc(self, path: str, solc: str) -> None:
+        """文件的 solc 版本变化时，把它已有的汇总计数移到新版本下（汇总表始终按文件当前的 solc 分组）"""
+        r = self.conn.execute("SELECT id FROM files WHERE path=? AND COALESCE(solc, '') != ?", (path, solc)).fetchone()
+        if not r:
+            return
+        fid = r[0]
+        had, n_any, any_solc = self._file_any(fid)
+        moved = self.conn.execute("SELECT tool, run_id, n, solc FROM rollup_file WHERE file_id=?", (fid,)).fetchall()
+        for tool, run_id, n, old in moved:
+            self._bump("rollup_count", {"tool": tool, "solc": old, "n": n}, files=-1)
+            self._bump("rollup_count", {"tool": tool, "solc": solc, "n": n}, files=1)
+            for rule, hits in self.conn.execute("SELECT rule, COUNT(*) FROM findings WHERE run_id=? GROUP BY rule", (run_id,)).fetchall():
+                self._bump("rollup_rule", {"tool": tool, "solc": old, "rule": rule}, files=-1, hits=-hits)
+                self._bump("rollup_rule", {"tool": tool, "solc": solc, "rule": rule}, files=1, hits=hits)
+        if had:
+            self._bump("rollup_count", {"tool": "any", "solc": any_solc, "n": n_any}, files=-1)
+            self._bump("rollup_count", {"tool": "any", "solc": solc, "n": n_any}, files=1)
+        self.conn.execute("UPDATE rollup_file SET solc=? WHERE file_id=?", (solc, fid))
+
+    def _rollup(self, fid: int, tool: str, run_id: int, rows: Sequence[Finding], track_p: bool = True) -> None:
+        """该文件该工具的上一次结果从汇总表中减去，本次结果加上（调用方持有锁和事务）"""
+        c = self.conn
+        solc = c.execute("SELECT COALESCE(solc, '') FROM files WHERE id=?", (fid,)).fetchone()[0]
+        scan = tool in SCAN_TOOLS
+        if scan:
+            any_before = self._file_any(fid)
+            ps_before = self._file_ps(fid) if track_p else set()
+        old = c.execute("SELECT run_id, n, solc FROM rollup_file WHERE file_id=? AND tool=?", (fid, tool)).fetchone()
+        if old:
+            o_run, o_n, o_solc = old
+            self._bump("rollup_tool", {"tool": tool}, files=-1, hit_files=-int(o_n > 0), issues=-o_n)
+            self._bump("rollup_count", {"tool": tool, "solc": o_solc, "n": o_n}, files=-1)
+            for rule, hits in c.execute("SELECT rule, COUNT(*) FROM findings WHERE run_id=? GROUP BY rule", (o_run,)).fetchall():
+                self._bump("rollup_rule", {"tool": tool, "solc": o_solc, "rule": rule}, files=-1, hits=-hits)
+        rules: dict = {}
+        for row in rows:
+            rules[row[0]] = rules.get(row[0], 0) + 1
+        n = len(rows)
+        c.execute("INSERT OR REPLACE INTO rollup_file(file_id, tool, run_id, n, solc) VALUES (?,?,?,?,?)",
+                  (fid, tool, run_id, n, solc))
+        self._bump("rollup_tool", {"tool": tool}, files=1, hit_files=int(n > 0), issues=n)
+        self._bump("rollup_count", {"tool": tool, "solc": solc, "n": n}, files=1)
+        for rule, hits in rules.items():
+            self._bump("rollup_rule", {"tool": tool, "solc": solc, "rule": rule}, files=1, hits=hits)
+        if not scan:
+            return
+        (had, n_before, solc_before), (has, n_after, _) = any_before, self._file_any(fid)
+        if (had, n_before, solc_before) != (has, n_after, solc):
+            self._bump("rollup_tool", {"tool": "any"}, files=has - had,
+                       hit_files=int(n_after > 0) - int(n_before > 0), issues=n_after - n_before)
+            if had:
+                self._bump("rollup_count", {"tool": "any", "solc": solc_before, "n": n_before}, files=-1)
+            self._bump("rollup_count", {"tool": "any", "solc": solc, "n": n_after}, files=1)
+        if track_p:
+            ps_after = self._file_ps(fid)
+            for P in ps_before - ps_after:
+                self._bump("rollup_p", {"p": P}, files=-1)
+            for P in ps_after - ps_before:
+                self._bump("rollup_p", {"p": P}, files=1)
+
+    def _rebuild_rollup_p(self) -> None:
+        self.conn.execute("DELETE FROM rollup_p")
+        self.conn.execute(f"""INSERT INTO rollup_p(p, files)
+            SELECT p.p, COUNT(DISTINCT rf.file_id) FROM rollup_file rf
+            JOIN findings x ON x.run_id = rf.run_id
+            JOIN rule_p p ON p.tool = x.tool AND p.rule = x.rule
+            WHERE rf.tool IN {SCAN_TOOLS}
+            GROUP BY p.p""")
+
+    def rebuild_rollups(self) -> None:
+        """从 latest_runs 重算全部汇总表（旧库首次打开时自动执行）"""
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._rebuild_rollups()
+
+    def _rebuild_rollups(self) -> None:
+        for t in ("rollup_file", "rollup_tool", "rollup_count", "rollup_rule"):
+            self.conn.execute(f"DELETE FROM {t}")
+        for run_id, fid, tool in self.conn.execute("SELECT id, file_id, tool FROM latest_runs").fetchall():
+            rows = self.conn.execute("SELECT rule FROM findings WHERE run_id=?", (run_id,)).fetchall()
+            self._rollup(fid, tool, run_id, rows, track_p=False)
+        self._rebuild_rollup_p()
+
+    def _ensure_rollups(self) -> None:
+        """汇总表为空而已有运行记录（升级前建的库）时补算一次；多进程同时打开时只有一个会真正执行"""
+        if self.conn.execute("SELECT 1 FROM rollup_file LIMIT 1").fetchone() \
+                or not self.conn.execute("SELECT 1 FROM runs LIMIT 1").fetchone():
+            return
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            if not self.conn.execute("SELECT 1 FROM rollup_file LIMIT 1").fetchone():
+                self._rebuild_rollups()
+
+    def query(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        with self.lock:
+            cur = self.conn.execute(sql, params)
+            cur.row_factory = sqlite3.Row
+            return cur.fetchall()
+
+    def iter_query(self, sql: str, params: Sequence = (), size: int = 1000) -> Iterator[sqlite3.Row]:
+        """
+        同 query，但每次只取 size 行（报告工具逐行处理，内存与结果行数无关）。
+        用单独的只读连接：WAL 下读的是一致的快照，迭代期间不占 self.lock，其他写入照常进行
+        """
+        conn = sqlite3.connect(self.path.resolve().as_uri() + "?mode=ro", uri=True, timeout=60,
+                               check_same_thread=False)
+        try:
+            cur = conn.execute(sql, params)
+            cur.row_factory = sqlite3.Row
+            while True:
+                batch = cur.fetchmany(size)
+                if not batch:
+                    return
+                yield from batch
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+def open_db(path, enabled: bool = True) -> Optional[FindingsDB]:
+    """数据库不可用时只告警，不影响扫描本身"""
+    if not enabled:
+        return None
+    try:
+        return FindingsDB(Path(path))
+    except sqlite3.Error as e:
+        print(f"[WARN] findings db unavailable ({path}): {e}")
+        return None
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单次 prepare 运行内共享的 import 图缓存
+Per-run cache of file contents and parsed imports shared by every entry.
+
+OpenZeppelin、SafeMath 之类被大量入口 import 的文件，每次运行只读盘、只做一次正则解析；
+simple_flatten 与依赖闭包计算都走这里。
+
+import 路径的解析顺序与 solc 相同：先按最近一级目录中 remappings.txt 的重映射（最长前缀优先，
+支持 context:prefix=target），"./" "../" 开头的相对于所在文件，其余依次试所在目录、各级上层目录
+（base path）及其 node_modules。
+"""
+import os, re
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+# import "x";  import "x" as y;  import * as y from "x";  import {A, B as C} from "x";（花括号可跨行）
+IMPORT_RE = re.compile(r'^\s*import\b\s*(?:["\']([^"\']+)["\'](?:\s+as\s+\w+)?'
+                       r'|(?:\*\s*as\s+\w+|\{[^}]*\}|\w+)\s*from\s*["\']([^"\']+)["\'])\s*;', re.MULTILINE)
+REMAPPINGS = "remappings.txt"
+# 拼接后只能保留一个 SPDX 标识（solc >= 0.6.8 遇到多个直接报错）；完全相同的 pragma 也只留第一条
+SPDX_RE = re.compile(r'^([ \t]*(?://|/\*)[ \t]*)SPDX-License-Identifier:', re.MULTILINE)
+PRAGMA_LINE_RE = re.compile(r'^[ \t]*pragma\s+[^;]+;[ \t]*$', re.MULTILINE)
+
+def read_file(p: Path) -> str:
+    try:
+        return p.read_text(encoding="utf-8")
+    except:
+        return p.read_text(errors="ignore")
+
+def dedupe_headers(text: str, seen: Set[str]) -> str:
+    """去掉 seen 中已出现过的 SPDX 标识与 pragma（原位改写成普通注释，行号不变），并把新出现的记入 seen"""
+    def spdx(m):
+        if "spdx" not in seen:
+            seen.add("spdx")
+            return m.group(0)
+        return m.group(1) + "[flatten] duplicate license:"
+    def pragma(m):
+        key = " ".join(m.group(0).split())
+        if key not in seen:
+            seen.add(key)
+            return m.group(0)
+        return f"// [flatten] duplicate {key[:-1]}"
+    return PRAGMA_LINE_RE.sub(pragma, SPDX_RE.sub(spdx, text))
+
+def parse_remappings(text: str, root: Path) -> List[Tuple[str, str, str]]:
+    """remappings.txt → [(context 绝对路径前缀, prefix, target 绝对路径)]，最长的 context / prefix 在前"""
+    res = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if "=" not in line:
+            continue
+        lhs, target = line.split("=", 1)
+        ctx, _, prefix = lhs.rpartition(":")
+        if not prefix:
+            continue
+        # 用 os.path.join 而不是 Path：保留末尾的 "/"，前缀拼接才对
+        res.append((os.path.join(str(root), ctx) if ctx else "", prefix, os.path.join(str(root), target)))
+    return sorted(res, key=lambda r: (-len(r[0]), -len(r[1])))
+
+# 一条 import：(起点, 终点, 原语句, 解析到的文件；解析不到为 None, 候选路径)
+Import = Tuple[int, int, str, Optional[Path], Path]
+
+class ImportGraph:
+    def __init__(self):
+        self._nodes: Dict[Path, Tuple[str, List[Import]]] = {}
+        self._remaps: Dict[Path, List[Tuple[str, str, str]]] = {}
+        self.files_read = 0
+
+    def remappings(self, d: Path) -> List[Tuple[str, str, str]]:
+        """d 及其上层目录中最近的 remappings.txt（按目录缓存）"""
+        r = self._remaps.get(d)
+        if r is None:
+            fp = d / REMAPPINGS
+            if fp.is_file():
+                r = parse_remappings(read_file(fp), d)
+            else:
+                r = self.remappings(d.parent) if d.parent != d else []
+            self._remaps[d] = r
+        return r
+
+    def resolve(self, fp: Path, spec: str) -> Tuple[Optional[Path], Path]:
+        """fp 中的 import 路径 spec → (存在的文件或 None, 首选候选路径)"""
+        for ctx, prefix, target in self.remappings(fp.parent):
+            if spec.startswith(prefix) and str(fp).startswith(ctx):
+                cands = [Path(target + spec[len(prefix):])]
+                break
+        else:
+            cands = [fp.parent / spec]
+            if not spec.startswith(("./", "../")):
+                for d in fp.parents:
+                    cands += [d / spec, d / "node_modules" / spec]
+        for cand in cands:
+            if cand.is_file():
+                return cand.resolve(), cand.resolve()
+        return None, cands[0].resolve()
+
+    def node(self, fp: Path) -> Tuple[str, List[Import]]:
+        """fp 需为 resolve() 之后的绝对路径"""
+        n = self._nodes.get(fp)
+        if n is None:
+            content = read_file(fp)
+            self.files_read += 1
+            imports: List[Import] = []
+            for m in IMPORT_RE.finditer(content):
+                dep, cand = self.resolve(fp, m.group(1) or m.group(2))
+                imports.append((m.start(), m.end(), m.group(0), dep, cand))
+            n = self._nodes[fp] = (content, imports)
+        return n
+
+    def closure(self, entry: Path) -> Tuple[Set[str], Set[str]]:
+        """→ (传递依赖闭包（含入口自身）, 无法解析的 import 候选路径)"""
+        deps: Set[str] = set()
+        missing: Set[str] = set()
+        stack = [entry.resolve()]
+        while stack:
+            fp = stack.pop()
+            if str(fp) in deps: continue
+            deps.add(str(fp))
+            for _, _, _, dep, cand in self.node(fp)[1]:
+                if dep is not None:
+                    stack.append(dep)
+                else:
+                    missing.add(str(cand))
+        return deps, missing
+
+    def flatten(self, entry: Path) -> str:
+        visited: Set[Path] = set()
+        parts: List[str] = []
+        seen: Set[str] = set()      # 已输出的 SPDX 标识（"spdx"）与 pragma 语句
+        def dfs(fp: Path):
+            if fp in visited: return
+            visited.add(fp)
+            content, imports = self.node(fp)
+            pos = 0
+            for s, e, stmt, dep, _ in imports:
+                parts.append(dedupe_headers(content[pos:s], seen))
+                pos = e
+                if dep is not None:
+                    dfs(dep)
+                else:
+                    parts.append(f"// [WARN] unresolved import kept: {stmt}\n")
+            parts.append(dedupe_headers(content[pos:], seen))
+        header = f"// Flattened simple\n// Entry: {entry}\n\n"
+        dfs(entry.resolve())
+        return header + "".join(parts)
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多机分布式任务队列（SQLite + 租约）
+A lease-based job queue in one SQLite file, so many worker processes on many
+machines can share a sweep and an interrupted batch resumes where it stopped.
+
+work/queue.db 中每个任务是（文件 × 工具 × 配置）：
+  pending  等待领取
+  leased   某个 worker 持有租约（lease_until 之前有效，运行中定期心跳续期）
+  done     已完成，永不重跑（重复 enqueue 也不会重置）
+  failed   工具报错，或租约过期次数达到 --max-attempts（requeue 可重置）
+
+worker 崩溃 / 断网后租约不再续期，过期后任务被其他 worker 重新领取；领取在
+BEGIN IMMEDIATE 事务内完成，同一任务同一时刻只会有一个有效租约。租约按各机器的
+time.time() 判断，各机器需要 NTP 同步（偏差远小于租约长度即可）。
+
+放在共享存储（NFS 等）上时使用默认的 rollback journal（WAL 依赖共享内存，
+不适用于网络文件系统）；所有 worker 在同一台机器上时可以加 --wal。
+扫描结果照常写到 out/ 与结果库；多机时结果库建议每台机器各自一份（--db），或 --no-db。
+
+用法 / Usage:
+  python3 scripts/job_queue.py enqueue --tools slither,mythril --timeout 120 --depth 64
+  python3 scripts/job_queue.py work -j 4                    # 每台机器启动任意多个
+  python3 scripts/job_queue.py status
+  python3 scripts/job_queue.py requeue --failed
+"""
+import argparse, importlib, json, os, socket, sqlite3, sys, threading, time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+from findings_db import DEFAULT_DB
+
+DEFAULT_QUEUE = ROOT / "work" / "queue.db"
+FLAT_DIR = ROOT / "work" / "flattened"
+QUICK_SCREEN = ROOT / "out" / "quick_screen.csv"
+
+DEFAULT_LEASE = 300         # 租约长度（秒）；心跳每 lease/3 续期一次
+DEFAULT_MAX_ATTEMPTS = 3    # 同一任务最多被领取几次（租约过期算一次）
+DB_RETRY = 1.0              # 队列库暂时不可写（database is locked 等）时的首次退避（秒），之后逐次翻倍
+DB_RETRY_MAX = 60.0
+TOOLS = ("slither", "mythril")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY,
+    file        TEXT NOT NULL,
+    tool        TEXT NOT NULL,
+    config      TEXT NOT NULL,
+    priority    REAL NOT NULL DEFAULT 0,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    owner       TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    result      TEXT,
+    created     REAL NOT NULL,
+    updated     REAL NOT NULL,
+    UNIQUE (file, tool, config)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs(state, priority DESC, id);
+CREATE INDEX IF NOT EXISTS jobs_lease ON jobs(state, lease_until);
+"""
+
+class Job(NamedTuple):
+    id: int
+    file: str           # 相对仓库根目录的路径，各机器挂载位置不同也能对上
+    tool: str
+    config: dict
+    attempts: int
+
+class JobQueue:
+    def __init__(self, path: Path = DEFAULT_QUEUE, wal: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None：事务由下面显式的 BEGIN IMMEDIATE 控制
+        self.conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def _tx(self, fn):
+        """写锁事务：BEGIN IMMEDIATE 在开始时就拿到库级写锁，多进程领取不会交错"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                res = fn(self.conn)
+                self.conn.execute("COMMIT")   # COMMIT 也可能 database is locked，失败时同样回滚
+            except BaseException:
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                raise
+            return res
+
+    def enqueue(self, jobs: Iterable[Tuple[str, str, dict, float]]) -> int:
+        """(file, tool, config, priority)；已存在的任务（包括 done）保持原状，返回新增数"""
+        now = time.time()
+        rows = [(f, tool, json.dumps(cfg, sort_keys=True), prio, now, now) for f, tool, cfg, prio in jobs]
+        def fn(c):
+            before = c.total_changes
+            c.executemany("INSERT OR IGNORE INTO jobs(file, tool, config, priority, created, updated) "
+                          "VALUES (?,?,?,?,?,?)", rows)
+            return c.total_changes - before
+        return self._tx(fn)
+
+    def claim(self, worker: str, lease: float = DEFAULT_LEASE, tools: Sequence[str] = (),
+              max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Optional[Job]:
+        """领取优先级最高的 pending 任务或租约已过期的任务；没有可领的返回 None"""
+        tool_sql = f" AND tool IN ({','.join('?' * len(tools))})" if tools else ""
+        def fn(c):
+            now = time.time()
+            c.execute("UPDATE jobs SET state='failed', owner=NULL, result='lease expired', updated=? "
+                      "WHERE state='leased' AND lease_until<? AND attempts>=?", (now, now, max_attempts))
+            row = c.execute("SELECT id, file, tool, config, attempts FROM jobs "
+                            "WHERE (state='pending' OR (state='leased' AND lease_until<?))" + tool_sql +
+                            " ORDER BY priority DESC, id LIMIT 1", (now, *tools)).fetchone()
+            if row is None:
+                return None
+            c.execute("UPDATE jobs SET state='leased', owner=?, lease_until=?, attempts=attempts+1, updated=? "
+                      "WHERE id=?", (worker, now + lease, now, row[0]))
+            return Job(row[0], row[1], row[2], json.loads(row[3]), row[4] + 1)
+        return self._tx(fn)
+
+    def heartbeat(self, job_id: int, worker: str, lease: float = DEFAULT_LEASE) -> bool:
+        """续租；租约已被他人接管（或任务已结束）时返回 False"""
+        def fn(c):
+            now = time.time()
+            return c.execute("UPDATE jobs SET lease_until=?, updated=? WHERE id=? AND owner=? AND state='leased'",
+                             (now + lease, now, job_id, worker)).rowcount == 1
+        return self._tx(fn)
+
+    def complete(self, job_id: int, worker: str, ok: bool, result: str = "") -> bool:
+        """
+        记录结果。只要任务仍处于 leased 就接受（先完成者生效，即使租约已过期被他人接管，
+        结果也是等价的）；任务已经 done / failed 时返回 False
+        """
+        def fn(c):
+            return c.execute("UPDATE jobs SET state=?, owner=?, lease_until=NULL, result=?, updated=? "
+                             "WHERE id=? AND state='leased'",
+                             ("done" if ok else "failed", worker, result, time.time(), job_id)).rowcount == 1
+        return self._tx(fn)
+
+    def release(self, job_id: int, worker: str) -> None:
+        """主动放弃（如被中断）：放回 pending，本次领取不计入 attempts"""
+        self._tx(lambda c: c.execute(
+            "UPDATE jobs SET state='pending', owner=NULL, lease_until=NULL, attempts=MAX(0, attempts-1), updated=? "
+            "WHERE id=? AND owner=? AND state='leased'", (time.time(), job_id, worker)))
+
+    def reclaim(self) -> int:
+        """把所有已过期的租约立即放回 pending（claim 本身也会接管过期任务，这里只是让 status 及时反映）"""
+        return self._tx(lambda c: c.execute(
+            "UPDATE jobs SET state='pending', owner=NULL, lease_until=NULL, updated=? "
+            "WHERE state='leased' AND lease_until<?", (time.time(), time.time())).rowcount)
+
+    def requeue(self, states: Sequence[str]) -> int:
+        marks = ",".join("?" * len(states))
+        return self._tx(lambda c: c.execute(
+            f"UPDATE jobs SET state='pending', owner=NULL, lease_until=NULL, attempts=0, result=NULL, updated=? "
+            f"WHERE state IN ({marks})", (time.time(), *states)).rowcount)
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """(tool, state) -> 任务数"""
+        with self.lock:
+            return {(t, s): n for t, s, n in
+                    self.conn.execute("SELECT tool, state, COUNT(*) FROM jobs GROUP BY tool, state")}
+
+    def active(self, tools: Sequence[str] = ()) -> int:
+        """尚未结束（pending / leased）的任务数"""
+        tool_sql = f" AND tool IN ({','.join('?' * len(tools))})" if tools else ""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('pending','leased')" + tool_sql,
+                                     tuple(tools)).fetchone()[0]
+
+    def leases(self) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute("SELECT owner, tool, file, lease_until - ? FROM jobs WHERE state='leased' "
+                                     "ORDER BY owner", (time.time(),)).fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
+
+def rel(p: Path) -> str:
+    try:
+        return p.resolve().relative_to(ROOT).as_posix()
+    except ValueError:
+        return str(p)
+
+# ---------------- enqueue ----------------
+
+def cmd_enqueue(args, q: JobQueue):
+    from artifacts import compile_failed_stems
+    from myth_schedule import load_scores
+
+    if args.list:
+        files = [Path(x.strip()) for x in Path(args.list).read_text(encoding="utf-8").splitlines() if x.strip()]
+        files = [p if p.is_absolute() else ROOT / p for p in files]
+    else:
+        files = sorted(FLAT_DIR.glob("*.sol"))
+    failed = compile_failed_stems()
+    files = [f for f in files if f.stem not in failed]
+    if not files:
+        raise SystemExit("No flattened files. Run 01_prepare.py first.")
+
+    scores = load_scores(Path(args.quick_screen))
+    configs = {"slither": {}, "mythril": {"timeout": args.timeout, "depth": args.depth}}
+    tools = [t for t in args.tools.split(",") if t]
+    bad = set(tools) - set(TOOLS)
+    if bad:
+        raise SystemExit(f"unknown tools: {', '.join(sorted(bad))}")
+    n = q.enqueue((rel(f), tool, configs[tool], scores.get(f.stem, 0)) for f in files for tool in tools)
+    print(f"[OK] enqueued {n} new jobs ({len(files)} files x {len(tools)} tools) -> {q.path}")
+
+# ---------------- work ----------------
+
+class Runner:
+    """在本进程内调用 03 / 04 的 scan_one；每个 worker 进程一份 resolver / cache / 结果库连接"""
+    def __init__(self, args):
+        from scan_pool import tool_version
+        from scan_cache import ScanCache, DEFAULT_MAX_MB
+        from solc_resolver import SolcResolver
+        from findings_db import open_db
+
+        self.slither = importlib.import_module("03_run_slither")
+        self.mythril = importlib.import_module("04_run_mythril")
+        self.resolver = SolcResolver(self.slither.RESOLVE_CACHE)
+        self.cache = None if args.no_cache else ScanCache(self.slither.CACHE_DIR, DEFAULT_MAX_MB * 1024 * 1024)
+        self.db = open_db(args.db, not args.no_db)
+        self.use_artifacts = not args.no_artifacts
+        self.mem_mb = self.mythril.DEFAULT_MEM_MB if args.mem_mb is None else args.mem_mb
+        self.retries = self.mythril.DEFAULT_RETRIES if args.retries is None else args.retries
+        self.versions = {"slither": tool_version(["slither", "--version"]),
+                         "mythril": tool_version(["myth", "version"])}
+
+    def __call__(self, job: Job):
+        """→ True / False（工具失败）/ None（文件不存在，记为失败）"""
+        f = ROOT / job.file
+        if not f.exists():
+            return None
+        if job.tool == "slither":
+            return self.slither.scan_one(f, self.resolver, self.cache, self.versions["slither"], self.use_artifacts,
+                                         self.db, self.slither.DEFAULT_HARD_TIMEOUT)
+        from myth_schedule import Slot
+        slot = Slot(int(job.config.get("timeout") or 60), int(job.config.get("depth") or 80), "normal")
+        return self.mythril.scan_one((f, slot), self.resolver, self.cache, self.versions["mythril"],
+                                     self.use_artifacts, 0.0, self.db, self.mem_mb, self.retries)
+
+    def close(self):
+        self.resolver.save()
+        if self.db:
+            self.db.close()
+
+def retry_locked(fn, *a):
+    """
+    共享存储上 connect timeout（60 秒）之后仍可能 database is locked（sqlite3.OperationalError）：
+    退避后重试，不让异常结束 worker 线程（否则它手上的租约只能等过期）
+    """
+    delay = DB_RETRY
+    while True:
+        try:
+            return fn(*a)
+        except sqlite3.OperationalError as e:
+            print(f"[WARN] queue db: {e}; retry in {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, DB_RETRY_MAX)
+
+def work_loop(q: JobQueue, run, worker: str, tools, args, stats: dict, held: dict, lock: threading.Lock):
+    while True:
+        job = retry_locked(q.claim, worker, args.lease, tools, args.max_attempts)
+        if job is None:
+            if retry_locked(q.active, tools) == 0:
+                return
+            time.sleep(args.poll)       # 其他 worker 持有租约：等它们完成或过期
+            continue
+        stop = threading.Event()
+        def beat():
+            while not stop.wait(args.lease / 3):
+                try:
+                    alive = q.heartbeat(job.id, worker, args.lease)
+                except sqlite3.OperationalError as e:
+                    print(f"[WARN] heartbeat failed ({e}), retrying: {job.tool} {job.file}")
+                    continue            # 下一次心跳再续；租约长度覆盖了几次失败
+                if not alive:
+                    print(f"[WARN] lease lost: {job.tool} {job.file}")
+                    return
+        hb = threading.Thread(target=beat, daemon=True)
+        hb.start()
+        with lock:
+            held[worker] = job.id
+        try:
+            res = run(job)
+        except Exception as e:
+            print(f"[ERR] {job.tool} {job.file}: {e!r}")
+            res = False
+        finally:
+            stop.set()
+            hb.join()
+        with lock:
+            held.pop(worker, None)
+        ok = bool(res)
+        if not retry_locked(q.complete, job.id, worker, ok, "ok" if ok else ("missing" if res is None else "fail")):
+            print(f"[INFO] {job.tool} {job.file} already finished elsewhere")
+        with lock:
+            stats["ok" if ok else "fail"] += 1
+
+def cmd_work(args, q: JobQueue):
+    from scan_pool import which
+    tools = [t for t in args.tools.split(",") if t] if args.tools else list(TOOLS)
+    missing = [t for t in tools if not which({"slither": "slither", "mythril": "myth"}[t])]
+    if missing:
+        # 本机没装的工具不领取，留给其他机器
+        print(f"[WARN] not installed here, skipping {', '.join(missing)} jobs")
+        tools = [t for t in tools if t not in missing]
+        if not tools:
+            raise SystemExit("no scanner available on this machine")
+
+    run = Runner(args)
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    stats = {"ok": 0, "fail": 0}
+    held: Dict[str, int] = {}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=work_loop, args=(q, run, f"{base}:{i}", tools, args, stats, held, lock),
+                                daemon=True)
+               for i in range(max(1, args.workers))]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(1)
+    except KeyboardInterrupt:
+        # 主动中断：手上的任务立即放回队列，不必等租约过期
+        with lock:
+            for worker, job_id in held.items():
+                q.release(job_id, worker)
+        print(f"[INFO] interrupted, released {len(held)} jobs")
+    finally:
+        run.close()
+    print(f"[DONE] worker {base} ok={stats['ok']}, fail={stats['fail']}")
+
+# ---------------- status / reclaim / requeue ----------------
+
+def cmd_status(args, q: JobQueue):
+    counts = q.counts()
+    states = ["pending", "leased", "done", "failed"]
+    print(f"{'tool':<10}" + "".join(f"{s:>10}" for s in states))
+    for tool in sorted({t for t, _ in counts}):
+        print(f"{tool:<10}" + "".join(f"{counts.get((tool, s), 0):>10}" for s in states))
+    if args.leases:
+        for owner, tool, f, left in q.leases():
+            print(f"  {owner:<30} {tool:<8} {f}  ({'expired' if left < 0 else f'{left:.0f}s left'})")
+
+def cmd_reclaim(args, q: JobQueue):
+    print(f"[OK] reclaimed {q.reclaim()} expired leases")
+
+def cmd_requeue(args, q: JobQueue):
+    states = (["failed"] if args.failed else []) + (["done"] if args.done else [])
+    if not states:
+        raise SystemExit("nothing to requeue: pass --failed and/or --done")
+    print(f"[OK] requeued {q.requeue(states)} jobs")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queue", default=str(DEFAULT_QUEUE), help="队列库路径（多机时放在共享存储上）")
+    ap.add_argument("--wal", action="store_true", help="WAL 模式（仅当所有 worker 在同一台机器上）")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("enqueue", help="把 work/flattened 下的文件加入队列")
+    p.add_argument("--tools", default="slither,mythril")
+    p.add_argument("--list", default="", help="文件清单（每行一个路径），默认 work/flattened/*.sol")
+    p.add_argument("--timeout", type=int, default=int(os.environ.get("MYTH_TIMEOUT") or 60), help="Mythril --execution-timeout")
+    p.add_argument("--depth", type=int, default=int(os.environ.get("MYTH_DEPTH") or 80), help="Mythril --max-depth")
+    p.add_argument("--quick-screen", default=str(QUICK_SCREEN), help="按快筛风险分设置优先级")
+    p.set_defaults(fn=cmd_enqueue)
+
+    p = sub.add_parser("work", help="领取并执行任务，直到队列中没有未完成的任务")
+    p.add_argument("-j", "--workers", type=int, default=int(os.environ.get("PARALLEL") or 4), help="本进程的并发任务数")
+    p.add_argument("--tools", default="", help="只领取这些工具的任务（逗号分隔）")
+    p.add_argument("--lease", type=float, default=DEFAULT_LEASE, help="租约长度（秒）")
+    p.add_argument("--poll", type=float, default=10, help="暂无可领任务时的轮询间隔（秒）")
+    p.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="租约过期多少次后记为 failed")
+    p.add_argument("--mem-mb", type=int, help="Mythril 内存上限（默认同 04_run_mythril.py）")
+    p.add_argument("--retries", type=int, help="Mythril 降级重试次数（默认同 04_run_mythril.py）")
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--no-artifacts", action="store_true")
+    p.add_argument("--db", default=str(DEFAULT_DB), help="结果库（多机时建议每台机器一份）")
+    p.add_argument("--no-db", action="store_true")
+    p.set_defaults(fn=cmd_work)
+
+    p = sub.add_parser("status", help="各工具各状态的任务数")
+    p.add_argument("--leases", action="store_true", help="列出当前租约")
+    p.set_defaults(fn=cmd_status)
+
+    p = sub.add_parser("reclaim", help="立即回收过期租约")
+    p.set_defaults(fn=cmd_reclaim)
+
+    p = sub.add_parser("requeue", help="把 failed / done 的任务重置为 pending")
+    p.add_argument("--failed", action="store_true")
+    p.add_argument("--done", action="store_true")
+    p.set_defaults(fn=cmd_requeue)
+
+    args = ap.parse_args()
+    q = JobQueue(Path(args.queue), wal=args.wal)
+    try:
+        args.fn(args, q)
+    finally:
+        q.close()
+
+if __name__ == "__main__":
+    main()
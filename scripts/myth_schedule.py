@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mythril 全局时间预算调度
+Allocate a total wall-clock budget across files, ranked by quick-screen hits.
+
+- 风险分：out/quick_screen.csv 中该文件的命中条数 + 每个命中类别额外加分
+- 分高的文件先跑、给更长的 --execution-timeout 和更深的 --max-depth
+- 零命中的文件只做浅扫，并排在最后；预算不够时直接顺延（deferred）
+- 按合约拆分的文件，时间片再按 bytecode 大小分给各合约（split）
+"""
+import csv, math
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+CATEGORY_BONUS = 5      # 每个不同类别的额外分
+MIN_TIMEOUT = 10        # 单文件最少给多少秒
+MAX_FACTOR = 4          # 最多给到基础超时的几倍
+SHALLOW_DEPTH = 32
+MAX_DEPTH = 256
+OVERHEAD = 5            # 每个 Mythril 进程启动/收尾的估计开销（秒）
+MIN_DEPTH = 16          # 超时 / 内存耗尽后降级重试时深度的下限
+
+class Slot(NamedTuple):
+    timeout: int
+    depth: int
+    tier: str           # deep / normal / shallow / deferred
+
+def flat_stem(entry: str) -> str:
+    # quick screen 记录的是 datasets/ 下的入口文件，对应 01_prepare 的 <stem>__flattened.sol
+    return f"{Path(entry).stem}__flattened"
+
+def load_scores(csv_path: Path) -> Dict[str, int]:
+    """→ {flattened stem: 风险分}；没有 quick_screen.csv 时返回空 dict"""
+    hits: Dict[str, int] = {}
+    cats: Dict[str, set] = {}
+    try:
+        f = open(csv_path, newline="", encoding="utf-8")
+    except OSError:
+        return {}
+    with f:
+        for r in csv.DictReader(f):
+            stem = flat_stem(r.get("file") or "")
+            hits[stem] = hits.get(stem, 0) + 1
+            cats.setdefault(stem, set()).add(r.get("category") or "")
+    return {k: hits[k] + CATEGORY_BONUS * len(cats[k]) for k in hits}
+
+def rank(files: List[Path], scores: Dict[str, int]) -> List[Path]:
+    # 分高的在前；同分按文件名，保证结果可复现
+    return sorted(files, key=lambda f: (-scores.get(f.stem, 0), f.name))
+
+def plan(files: List[Path], scores: Dict[str, int], budget: float, workers: int,
+         base_timeout: int, base_depth: int) -> List[Tuple[Path, Slot]]:
+    """
+    budget<=0：不限预算，所有文件使用基础参数（仅按风险排序）。
+    否则把 budget*workers 的总容量按 (1+score) 的平方根权重分给各文件，
+    每个文件限定在 [MIN_TIMEOUT, MAX_FACTOR*base_timeout]；容量不够时低分文件顺延。
+    """
+    ordered = rank(files, scores)
+    if budget <= 0:
+        return [(f, Slot(base_timeout, base_depth, "normal")) for f in ordered]
+
+    capacity = budget * max(1, workers)
+    risky = [f for f in ordered if scores.get(f.stem, 0) > 0]
+    quiet = [f for f in ordered if scores.get(f.stem, 0) <= 0]
+
+    # 先保证每个零命中文件一次浅扫的预留，再把剩余容量分给有命中的文件
+    shallow_cost = MIN_TIMEOUT + OVERHEAD
+    reserve = min(len(quiet) * shallow_cost, capacity * 0.2)
+    weights = {f: math.sqrt(1 + scores[f.stem]) for f in risky}
+    total_w = sum(weights.values()) or 1.0
+    pool = capacity - reserve
+
+    res: List[Tuple[Path, Slot]] = []
+    for f in risky:
+        t = pool * weights[f] / total_w - OVERHEAD
+        t = int(min(max(t, MIN_TIMEOUT), base_timeout * MAX_FACTOR))
+        if capacity < t + OVERHEAD:
+            res.append((f, Slot(0, 0, "deferred")))
+            continue
+        capacity -= t + OVERHEAD
+        depth = int(min(max(base_depth * math.sqrt(t / base_timeout), SHALLOW_DEPTH), MAX_DEPTH))
+        tier = "deep" if t > base_timeout else "normal"
+        res.append((f, Slot(t, depth, tier)))
+
+    for f in quiet:
+        if capacity < shallow_cost:
+            res.append((f, Slot(0, 0, "deferred")))
+            continue
+        capacity -= shallow_cost
+        res.append((f, Slot(MIN_TIMEOUT, SHALLOW_DEPTH, "shallow")))
+    return res
+
+def split(timeout: int, sizes: List[int]) -> List[int]:
+    """
+    一个文件的时间片按合约 bytecode 大小分给各合约，总和不超过 timeout（合约并行时也只用一个时间片的容量）。
+    每个合约先得到下限 min(MIN_TIMEOUT, timeout // 合约数)（至少 1 秒），剩余部分按大小比例分配
+    """
+    if not sizes:
+        return []
+    low = max(1, min(MIN_TIMEOUT, timeout // len(sizes)))
+    spare = max(0, timeout - low * len(sizes))
+    total = sum(sizes) or 1
+    return [low + spare * s // total for s in sizes]
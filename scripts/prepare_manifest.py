@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+01_prepare 的增量清单（依赖感知）
+Dependency-aware manifest that lets 01_prepare.py skip unchanged entries.
+
+work/prepare_manifest.json:
+  installed: 当时已安装的 solc 版本集合（变化则全部失效）
+  files:     path -> [size, mtime_ns, sha256]   （stat 未变就不重新读文件）
+  entries:   entry -> {deps: {path: sha256}, missing: [...], solc, flat, ok, reason}
+
+一个入口只有在其传递依赖闭包（自身 + 所有 import）内容不变、之前无法解析的 import
+仍然不存在、且产物文件还在时才会被跳过；改动一个公共库只会让 import 它的入口失效。
+"""
+import hashlib, json, os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+class FileHasher:
+    def __init__(self, table: Dict[str, list]):
+        self.table = table
+        self._seen: Dict[str, str] = {}
+
+    def sha(self, path: str) -> str:
+        """文件内容 sha256；文件不存在返回空串。同一次运行内每个文件最多 stat 一次"""
+        if path in self._seen:
+            return self._seen[path]
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.table.pop(path, None)
+            self._seen[path] = ""
+            return ""
+        rec = self.table.get(path)
+        if rec and rec[0] == st.st_size and rec[1] == st.st_mtime_ns:
+            h = rec[2]
+        else:
+            with open(path, "rb") as f:
+                h = hashlib.sha256(f.read()).hexdigest()
+            self.table[path] = [st.st_size, st.st_mtime_ns, h]
+        self._seen[path] = h
+        return h
+
+class Manifest:
+    VERSION = 1
+
+    def __init__(self, path: Path, installed: Iterable[str], force: bool = False):
+        self.path = Path(path)
+        self.installed = sorted(installed)
+        data = {}
+        if not force and self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+        if data.get("version") != self.VERSION or data.get("installed") != self.installed:
+            data = {}
+        self.files: Dict[str, list] = data.get("files", {})
+        self.entries: Dict[str, dict] = data.get("entries", {})
+        self.hasher = FileHasher(self.files)
+
+    def new_run(self) -> None:
+        """长驻进程每轮开始时调用：丢弃“同一次运行内每个文件最多 stat 一次”的记忆，重新检查磁盘"""
+        self.hasher = FileHasher(self.files)
+
+    def fresh(self, entry: str, outputs: List[Path]) -> Optional[dict]:
+        """入口可跳过时返回旧记录，否则 None"""
+        rec = self.entries.get(entry)
+        if not rec or not rec.get("deps"):
+            return None
+        for p, h in rec["deps"].items():
+            if self.hasher.sha(p) != h:
+                return None
+        if any(os.path.exists(m) for m in rec.get("missing", [])):
+            return None  # 之前解析不到的 import 现在有了
+        if not all(o.exists() for o in outputs):
+            return None
+        return rec
+
+    def record(self, entry: str, deps: Iterable[str], missing: Iterable[str], **info) -> None:
+        self.entries[entry] = dict(
+            deps={p: self.hasher.sha(p) for p in sorted(deps)},
+            missing=sorted(missing),
+            **info,
+        )
+
+    def prune(self, live: Iterable[str]) -> List[dict]:
+        """去掉已不在 datasets/ 中的入口，返回被删除的记录"""
+        live = set(live)
+        gone = [k for k in self.entries if k not in live]
+        removed = [self.entries.pop(k) for k in gone]
+        used = {p for rec in self.entries.values() for p in rec["deps"]}
+        for p in list(self.files):
+            if p not in used:
+                del self.files[p]
+        return removed
+
+    def save(self) -> None:
+        data = {"version": self.VERSION, "installed": self.installed,
+                "files": self.files, "entries": self.entries}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self.path)
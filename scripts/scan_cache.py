@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描结果的内容寻址缓存（Slither / Mythril 共用）
+Content-addressed on-disk cache of scanner JSON output.
+
+key = sha256(flattened 源码 + solc 版本 + 工具名/版本 + 分析参数)
+- 命中：直接返回缓存的 JSON，调用方写到 out/slither、out/mythril
+- 超过 max_bytes 时按最近使用时间（mtime，命中时刷新）淘汰
+- hits/misses 计数，累计值写入 <root>/stats.json
+- 结果 JSON 里带着扫描文件的路径（sourceList、filename_*），而同内容的文件共用一个键：
+  写入时把文件 stem 换成占位符，读出时换回调用方的 stem，命中不会带出别的文件的路径
+"""
+import hashlib, json, os, threading, time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+DEFAULT_MAX_MB = 2048
+KEY_VERSION = "2"           # 2：条目中的文件 stem 存为 STEM_MARK；旧条目带着写入者的路径，不再命中
+STEM_MARK = "@@SCAN_STEM@@"
+
+class ScanCache:
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._size = sum(p.stat().st_size for p in self._entries())
+
+    @staticmethod
+    def key(source: str, solc: str, tool: str, tool_version: str, args: List[str]) -> str:
+        h = hashlib.sha256()
+        for part in (KEY_VERSION, tool, tool_version, solc, "\x1f".join(args)):
+            h.update(part.encode("utf-8")); h.update(b"\x00")
+        h.update(source.encode("utf-8", errors="ignore"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _entries(self):
+        return self.root.glob("??/*.json")
+
+    def get(self, key: str, stem: str = "") -> Optional[str]:
+        return self.get_any([key], stem)[1]
+
+    def get_any(self, keys: List[str], stem: str = "") -> Tuple[str, Optional[str]]:
+        """
+        按顺序找第一个命中的键 → (键, JSON)；都不命中为 ("", None)。无论几个键，只计一次命中 / 未命中。
+        stem：本次扫描的文件 stem，替换条目中的占位符
+        """
+        for key in keys:
+            p = self._path(key)
+            try:
+                data = p.read_text(encoding="utf-8")
+                os.utime(p)  # 刷新 LRU 时间
+            except OSError:
+                continue
+            with self._lock:
+                self.hits += 1
+            return key, data.replace(STEM_MARK, stem) if stem else data
+        with self._lock:
+            self.misses += 1
+        return "", None
+
+    def put(self, key: str, data: str, stem: str = "") -> None:
+        if stem:
+            data = data.replace(stem, STEM_MARK)
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(data, encoding="utf-8")
+        old = p.stat().st_size if p.exists() else 0
+        os.replace(tmp, p)
+        with self._lock:
+            self._size += p.stat().st_size - old
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> None:
+        """按 mtime 从旧到新删除，直到回落到 max_bytes 的 90%"""
+        with self._lock:
+            target = int(self.max_bytes * 0.9)
+            entries = []
+            for p in self._entries():
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            self._size = sum(e[1] for e in entries)
+            entries.sort()
+            for _, size, p in entries:
+                if self._size <= target:
+                    break
+                try:
+                    p.unlink()
+                except OSError:
+                    continue
+                self._size -= size
+                self.evicted += 1
+
+    def save_stats(self, tool: str) -> dict:
+        """把本次计数累加进 stats.json，并返回本次计数"""
+        run = {"hits": self.hits, "misses": self.misses, "evicted": self.evicted}
+        fp = self.root / "stats.json"
+        try:
+            total = json.loads(fp.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            total = {}
+        t = total.setdefault(tool, {"hits": 0, "misses": 0, "evicted": 0})
+        for k, v in run.items():
+            t[k] = t.get(k, 0) + v
+        t["last_run"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        fp.write_text(json.dumps(total, indent=2), encoding="utf-8")
+        return run
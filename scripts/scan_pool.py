@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描器共用：并行 worker 池 + 每个任务独立固定 solc（不修改 solc-select 全局状态）
+Shared by 03_run_slither.py / 04_run_mythril.py: a worker pool where each job
+gets its own pinned compiler (see solc_resolver.py) via env/--solc instead of
+`solc-select use`.
+
+run(cmd, meta=...) 同时记录子进程开销（墙钟、user/sys CPU、峰值 RSS，来自 os.wait4 的
+rusage）到 out/metrics.jsonl，每次调用一行：
+  {"ts", "tool", "file", "contract", "solc", "attempt", "wall", "utime", "stime", "maxrss_kb", "rc", "killed"}
+常驻 Slither worker 中的任务（slither_worker.py）没有单独的进程：maxrss_kb 为 0，
+另有 rss_delta_kb（该任务前后 RSS 之差）与 worker_maxrss_kb（worker 整个生命周期的峰值）。
+
+run(cmd, timeout=..., mem_mb=...) 的硬限制：子进程在独立的进程组中启动，墙钟超时后整个进程组
+（含 myth 拉起的 solc、z3 等）被 SIGKILL，返回码为 RC_TIMEOUT；mem_mb 通过 RLIMIT_AS
+限制地址空间。failure_kind() 把失败区分为 timeout / oom / error，供调用方决定是否降级重试。
+"""
+import json, os, re, signal, subprocess, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+METRICS = Path(os.environ.get("METRICS_FILE") or ROOT / "out" / "metrics.jsonl")
+_metrics_lock = threading.Lock()
+
+RC_TIMEOUT = 124        # 与 coreutils timeout 一致
+_OOM_RE = re.compile(r'MemoryError|std::bad_alloc|out of memory|Cannot allocate memory', re.IGNORECASE)
+
+try:
+    import resource
+except ImportError:     # 非 POSIX 平台：没有内存上限
+    resource = None
+
+def which(cmd:str)->str:
+    from shutil import which as _which
+    return _which(cmd) or ""
+
+def record_metrics(rec: dict) -> None:
+    line = json.dumps(rec, ensure_ascii=False) + "\n"
+    with _metrics_lock:
+        METRICS.parent.mkdir(parents=True, exist_ok=True)
+        with open(METRICS, "a", encoding="utf-8") as f:
+            f.write(line)
+
+def _limit_as(mem_mb: int):
+    lim = mem_mb * 1024 * 1024
+    return lambda: resource.setrlimit(resource.RLIMIT_AS, (lim, lim))
+
+def _kill_group(p: subprocess.Popen, killed: list) -> None:
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+        killed.append(True)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _feed(p: subprocess.Popen, data: str) -> None:
+    try:
+        p.stdin.write(data)
+        p.stdin.close()
+    except (BrokenPipeError, OSError):    # 子进程提前退出 / 被看门狗杀掉
+        pass
+
+def failure_kind(code: int, err: str) -> str:
+    """失败类型：timeout（被看门狗杀掉）/ oom（内存上限或内核 OOM killer）/ error"""
+    if code == RC_TIMEOUT and "[watchdog]" in (err or ""):
+        return "timeout"
+    if code == -signal.SIGKILL or code == 128 + signal.SIGKILL or _OOM_RE.search(err or ""):
+        return "oom"
+    return "error"
+
+def run(cmd: List[str], env: Optional[Dict[str, str]] = None, meta: Optional[dict] = None,
+        timeout: float = 0, mem_mb: int = 0, input: Optional[str] = None) -> Tuple[int, str, str]:
+    """
+    meta 为 None 时等同 Popen().communicate()；给出 {"file": ..., "solc": ...} 时，
+    用 os.wait4 回收子进程并把 rusage 写入 metrics.jsonl。
+    timeout > 0：墙钟硬超时，到时杀掉整个进程组；mem_mb > 0：RLIMIT_AS 上限（MB）；
+    input：写入子进程 stdin 的内容（如 solc --standard-json 的输入）
+    """
+    t0 = time.monotonic()
+    kw = {}
+    if timeout or mem_mb:
+        kw["start_new_session"] = True   # 独立进程组，killpg 能连带杀掉孙进程
+    if mem_mb and resource is not None and not hasattr(resource, "prlimit"):
+        kw["preexec_fn"] = _limit_as(mem_mb)
+    if input is not None:
+        kw["stdin"] = subprocess.PIPE
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env, **kw)
+    if mem_mb and resource is not None and hasattr(resource, "prlimit"):
+        # Linux：启动后立即设置，避免在多线程进程里使用 preexec_fn
+        lim = mem_mb * 1024 * 1024
+        try:
+            resource.prlimit(p.pid, resource.RLIMIT_AS, (lim, lim))
+        except (ProcessLookupError, OSError):
+            pass
+    killed: list = []
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, _kill_group, (p, killed))
+        timer.daemon = True
+        timer.start()
+    try:
+        if meta is None:
+            out, err = p.communicate(input)
+            ru = None
+        else:
+            # 自己读管道 + wait4 回收，才能拿到该子进程（含其已回收的子孙）的 rusage
+            errbuf: List[str] = []
+            t = threading.Thread(target=lambda: errbuf.append(p.stderr.read()), daemon=True)
+            t.start()
+            if input is not None:
+                w = threading.Thread(target=_feed, args=(p, input), daemon=True)
+                w.start()
+            out = p.stdout.read()
+            t.join()
+            err = errbuf[0] if errbuf else ""
+            p.stdout.close(); p.stderr.close()
+            _, status, ru = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        if timer:
+            timer.cancel()
+    code = p.returncode
+    if killed:
+        code = RC_TIMEOUT
+        err = (err or "") + f"\n[watchdog] killed process group after {timeout:.0f}s"
+    if ru is None:
+        return code, out, err
+    record_metrics({
+        "ts": round(time.time(), 3),
+        "tool": meta.get("tool") or os.path.basename(cmd[0]),
+        "file": str(meta.get("file") or ""),
+        "contract": meta.get("contract") or "",
+        "solc": meta.get("solc") or "",
+        "attempt": meta.get("attempt") or 0,
+        "wall": round(time.monotonic() - t0, 3),
+        "utime": round(ru.ru_utime, 3),
+        "stime": round(ru.ru_stime, 3),
+        "maxrss_kb": ru.ru_maxrss,
+        "rc": code,
+        "killed": bool(killed),
+    })
+    return code, out, err
+
+def solc_env(ver: str, binary: str = "") -> Dict[str, str]:
+    """
+    每个子进程自己的环境：SOLC_VERSION 让 solc-select 的 solc shim 只对本进程生效，
+    SOLC 供 Mythril 直接使用该二进制。
+    """
+    env = dict(os.environ)
+    if ver:
+        env["SOLC_VERSION"] = ver
+    if binary:
+        env["SOLC"] = binary
+    return env
+
+def tool_version(cmd: List[str]) -> str:
+    """如 ["slither","--version"]；作为缓存 key 的一部分，失败返回空串"""
+    try:
+        code, out, err = run(cmd)
+    except OSError:
+        return ""
+    return (out or err).strip().splitlines()[0] if (out or err).strip() else ""
+
+def default_workers() -> int:
+    try:
+        return max(1, int(os.environ.get("PARALLEL") or 4))
+    except ValueError:
+        return 4
+
+def run_pool(items: Iterable, fn: Callable, workers: int) -> Iterator:
+    """
+    以 workers 个线程执行 fn(item)，按完成顺序产出结果。
+    真正的工作都在 solc/slither/myth 子进程里，线程只负责等待，所以不受 GIL 限制。
+    """
+    items = list(items)
+    if workers <= 1:
+        for it in items:
+            yield fn(it)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futs = [ex.submit(fn, it) for it in items]
+        for fut in as_completed(futs):
+            yield fut.result()
+
+class Subtasks(list):
+    """run_fanout 中 fn 的返回值：一组无参可调用对象，作为子任务放回同一个池"""
+
+def run_fanout(items: Iterable, fn: Callable, workers: int, window: int = 0) -> Iterator:
+    """
+    与 run_pool 相同，但 fn(item) 可以返回 Subtasks（如一个文件拆成多个合约任务），
+    子任务与其余文件共用 workers 个线程；子任务返回 None 时不产出（如文件尚未全部完成）。
+    同时在途的任务数不超过 window（默认 workers*2），items 按给定顺序逐步取用，不会一次全部展开。
+    """
+    workers = max(1, workers)
+    window = window or workers * 2
+    it = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        pending = set()
+        while True:
+            while len(pending) < window:
+                item = next(it, None)
+                if item is None:
+                    break
+                pending.add(ex.submit(fn, item))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                res = fut.result()
+                if isinstance(res, Subtasks):
+                    pending |= {ex.submit(task) for task in res}
+                elif res is not None:
+                    yield res
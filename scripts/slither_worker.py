@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻 Slither worker：只导入一次 slither / crytic-compile 和全部 detector，逐个分析文件
+Warm Slither workers for 03_run_slither.py.
+
+每次调用 slither CLI 都要付出解释器启动、导入 slither / crytic-compile、加载全部 detector 的固定开销，
+小合约上这部分比分析本身还慢。这里的 worker 进程启动时导入一次，之后通过 stdin / stdout 上的
+JSON 行协议接收任务：
+
+  → {"target": ..., "out": ..., "solc": ..., "env": {...}}
+  ← {"rc": 0|1, "err": ..., "wall": ..., "utime": ..., "stime": ..., "rss_kb": ..., "rss_delta_kb": ...,
+     "worker_maxrss_kb": ..., "recycle": bool}
+
+输出的 JSON 与 `slither <target> --json <out>` 相同（success / error / results.detectors）。
+每个任务期间的 stdout / stderr（slither 的日志）重定向到临时文件，末尾部分随结果返回。
+内存：ru_maxrss 是 worker 整个生命周期的峰值，不能算在某个任务头上。每个任务前后各读一次
+/proc/self/statm 的当前 RSS，差值记为该任务的 rss_delta_kb；生命周期峰值单独记为 worker_maxrss_kb。
+worker 处理 max_jobs 个任务或当前 RSS 超过 max_rss_mb 后回复完当前任务即退出（防止泄漏累积），
+WarmSlither 在下次取用时补一个新的。
+
+WarmSlither.run() 的返回值与 scan_pool.run() 相同 (code, out, err)：超时时杀掉 worker 的进程组
+（含其拉起的 solc），返回 RC_TIMEOUT；资源开销同样写入 metrics.jsonl。
+worker 无法导入 slither 库时（如 slither 只以 CLI 形式存在）start() 返回 False，调用方退回 CLI。
+"""
+import json, os, queue, subprocess, sys, tempfile, threading, time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import resource
+except ImportError:     # 非 POSIX 平台：不统计资源、不按内存回收
+    resource = None
+
+STARTUP_TIMEOUT = 300      # worker 导入 slither 的上限（秒）
+ERR_TAIL = 64 * 1024       # 每个任务随结果返回的日志末尾字节数
+
+def slither_python() -> str:
+    """slither 可执行文件的解释器（pipx / venv 安装时与当前 python 不同）；取不到时用当前解释器"""
+    from scan_pool import which
+    exe = which("slither")
+    try:
+        with open(exe, "rb") as f:
+            first = f.readline().decode("utf-8", errors="ignore").strip()
+    except OSError:
+        return sys.executable
+    if first.startswith("#!"):
+        parts = first[2:].split()
+        if parts and os.path.basename(parts[0]) == "env":
+            parts = parts[1:]
+        cand = which(parts[0]) if parts else ""
+        if cand and "python" in os.path.basename(cand):
+            return cand
+    return sys.executable
+
+# ---- worker 进程 ----
+
+def _usage() -> Tuple[float, float, int]:
+    if resource is None:
+        return 0.0, 0.0, 0
+    s, c = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return s.ru_utime + c.ru_utime, s.ru_stime + c.ru_stime, s.ru_maxrss
+
+def _rss_kb() -> int:
+    """当前常驻内存（/proc/self/statm 第二列 × 页大小）；没有 /proc 时为 0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _analyze(Slither, detectors, job: dict) -> int:
+    out = Path(job["out"])
+    kw = {"solc": job["solc"]} if job.get("solc") else {}
+    try:
+        sl = Slither(job["target"], **kw)
+        for d in detectors:
+            sl.register_detector(d)
+        results = [x for rs in sl.run_detectors() if rs for x in rs]
+        data, rc = {"success": True, "error": None, "results": {"detectors": results}}, 0
+    except Exception as e:                  # 编译失败、解析失败等，与 CLI 一样写出 error
+        data, rc = {"success": False, "error": f"{type(e).__name__}: {e}", "results": {}}, 1
+    out.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    return rc
+
+def worker_main(max_jobs: int, max_rss_mb: int) -> None:
+    # 协议只走原来的 stdout；之后 fd 1 指向 stderr，库里的 print 不会混进协议
+    proto = os.fdopen(os.dup(1), "w", buffering=1, encoding="utf-8")
+    os.dup2(2, 1)
+    try:
+        from slither import Slither
+        from slither.__main__ import get_detectors_and_printers
+        detectors = get_detectors_and_printers()[0]
+    except Exception as e:
+        proto.write(json.dumps({"ready": False, "error": f"{type(e).__name__}: {e}"}) + "\n")
+        return
+    proto.write(json.dumps({"ready": True, "detectors": len(detectors)}) + "\n")
+
+    base_env = dict(os.environ)
+    jobs = 0
+    for line in sys.stdin:
+        job = json.loads(line)
+        os.environ.clear()
+        os.environ.update(base_env)
+        os.environ.update(job.get("env") or {})
+        t0, (u0, s0, _), r0 = time.monotonic(), _usage(), _rss_kb()
+        saved = os.dup(1), os.dup(2)
+        with tempfile.TemporaryFile() as log:
+            sys.stdout.flush(); sys.stderr.flush()
+            os.dup2(log.fileno(), 1); os.dup2(log.fileno(), 2)
+            try:
+                rc = _analyze(Slither, detectors, job)
+            finally:
+                sys.stdout.flush(); sys.stderr.flush()
+                os.dup2(saved[0], 1); os.dup2(saved[1], 2)
+                os.close(saved[0]); os.close(saved[1])
+            log.seek(max(0, log.seek(0, os.SEEK_END) - ERR_TAIL))
+            err = log.read().decode("utf-8", errors="replace")
+        (u1, s1, peak), r1 = _usage(), _rss_kb()
+        jobs += 1
+        # 按当前 RSS 回收（没有 /proc 时退回生命周期峰值）
+        recycle = jobs >= max_jobs > 0 or (max_rss_mb > 0 and (r1 or peak) > max_rss_mb * 1024)
+        proto.write(json.dumps({"rc": rc, "err": err, "wall": round(time.monotonic() - t0, 3),
+                                "utime": round(u1 - u0, 3), "stime": round(s1 - s0, 3),
+                                "rss_kb": r1, "rss_delta_kb": r1 - r0 if r0 and r1 else 0,
+                                "worker_maxrss_kb": peak, "recycle": recycle}) + "\n")
+        if recycle:
+            return
+
+# ---- 调用方 ----
+
+class _Worker:
+    def __init__(self, python: str, max_jobs: int, max_rss_mb: int):
+        self.p = subprocess.Popen([python, __file__, "--max-jobs", str(max_jobs), "--max-rss-mb", str(max_rss_mb)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  text=True, start_new_session=True)
+        self.killed: list = []
+
+    def recv(self, timeout: float) -> Optional[dict]:
+        """读一行回复；超时杀掉整个进程组，worker 退出或超时返回 None"""
+        from scan_pool import _kill_group
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, _kill_group, (self.p, self.killed))
+            timer.daemon = True
+            timer.start()
+        try:
+            line = self.p.stdout.readline()
+        finally:
+            if timer:
+                timer.cancel()
+        try:
+            return json.loads(line) if line else None
+        except ValueError:
+            return None
+
+    def close(self) -> int:
+        for s in (self.p.stdin, self.p.stdout):
+            try:
+                s.close()
+            except OSError:
+                pass
+        return self.p.wait()
+
+class WarmSlither:
+    """
+    常驻 worker 池，线程安全：run_pool 的每个线程调用 run() 时取一个空闲 worker，没有就新起一个，
+    所以 worker 数不超过并发线程数
+    """
+    def __init__(self, max_jobs: int = 200, max_rss_mb: int = 2048):
+        self.max_jobs, self.max_rss_mb = max_jobs, max_rss_mb
+        self.python = slither_python()
+        self.idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        self.started = self.recycled = 0
+        self.lock = threading.Lock()
+
+    def _spawn(self) -> Tuple[Optional[_Worker], str]:
+        w = _Worker(self.python, self.max_jobs, self.max_rss_mb)
+        hello = w.recv(STARTUP_TIMEOUT)
+        if not hello or not hello.get("ready"):
+            w.close()
+            return None, (hello or {}).get("error") or "worker exited during startup"
+        with self.lock:
+            self.started += 1
+        return w, ""
+
+    def start(self) -> bool:
+        """试起一个 worker；导入 slither 库失败时告警并返回 False（调用方改用 CLI）"""
+        w, err = self._spawn()
+        if w is None:
+            print(f"[WARN] warm Slither workers unavailable ({self.python}): {err}; falling back to the slither CLI")
+            return False
+        self.idle.put(w)
+        return True
+
+    def run(self, target, out_json, solc: str = "", env: Optional[Dict[str, str]] = None,
+            meta: Optional[dict] = None, timeout: float = 0) -> Tuple[int, str, str]:
+        from scan_pool import RC_TIMEOUT, record_metrics
+        try:
+            w = self.idle.get_nowait()
+        except queue.Empty:
+            w, err = self._spawn()
+            if w is None:
+                return 1, "", err
+        t0 = time.monotonic()
+        job = {"target": str(target), "out": str(out_json), "solc": solc, "env": env or {}}
+        try:
+            w.p.stdin.write(json.dumps(job) + "\n")
+            w.p.stdin.flush()
+            res = w.recv(timeout)
+        except (BrokenPipeError, OSError):
+            res = None
+        if res is None:
+            rc = w.close()
+            code, err = (RC_TIMEOUT, f"[watchdog] killed warm slither worker after {timeout:.0f}s") if w.killed \
+                else (rc or 1, f"warm slither worker exited (rc={rc})")
+            res = {"rc": code, "err": err, "utime": 0, "stime": 0}
+        elif res.get("recycle"):
+            w.close()
+            with self.lock:
+                self.recycled += 1
+        else:
+            self.idle.put(w)
+        if meta is not None:
+            # 任务在共用的 worker 进程里跑，没有单独的峰值 RSS：maxrss_kb 记 0，
+            # 另记该任务的 RSS 增量与 worker 级的生命周期峰值
+            record_metrics({
+                "ts": round(time.time(), 3), "tool": meta.get("tool") or "slither",
+                "file": str(meta.get("file") or ""), "contract": meta.get("contract") or "",
+                "solc": meta.get("solc") or "", "attempt": meta.get("attempt") or 0,
+                "wall": round(time.monotonic() - t0, 3), "utime": res.get("utime", 0), "stime": res.get("stime", 0),
+                "maxrss_kb": 0, "rss_delta_kb": res.get("rss_delta_kb", 0),
+                "worker_maxrss_kb": res.get("worker_maxrss_kb", 0), "rc": res["rc"], "killed": bool(w.killed),
+            })
+        return res["rc"], "", res.get("err") or ""
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max-jobs", type=int, default=200)
+    ap.add_argument("--max-rss-mb", type=int, default=2048)
+    a = ap.parse_args()
+    worker_main(a.max_jobs, a.max_rss_mb)
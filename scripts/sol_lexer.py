@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+轻量 Solidity 词法处理（不依赖 solc）
+Lightweight Solidity lexing helpers for the quick screen.
+
+- blank_comments_strings：把注释（含 NatSpec）和字符串字面量替换成空格，保留换行，
+  因此偏移量与行号都不变；一次正则扫描，线性时间
+- SourceIndex：基于清洗后的文本建立 contract / function 区间索引和行首偏移表，
+  把任意偏移映射到 "Contract.function" 和行号
+- normalize：克隆检测用的规范化 token 流：去掉注释与空白，标识符按首次出现顺序改名，
+  数字 / 字符串字面量换成占位符，关键字、类型、全局变量与 pragma 原样保留
+"""
+import re
+from bisect import bisect_right
+from typing import List, NamedTuple, Optional, Tuple
+
+# 最左优先：字符串里的 // 或注释里的引号都会被先出现的那一项整体吞掉
+_NOISE_RE = re.compile(
+    rb'//[^\n]*'
+    rb'|/\*.*?(?:\*/|\Z)'
+    rb'|"(?:\\.|[^"\\\n])*"'
+    rb"|'(?:\\.|[^'\\\n])*'",
+    re.DOTALL,
+)
+_BLANK = bytes(b if b == 0x0A else 0x20 for b in range(256))
+
+_CONTRACT_RE = re.compile(rb'\b(?:contract|library|interface)\s+([A-Za-z_$][\w$]*)')
+_FUNC_RE = re.compile(
+    rb'\bfunction\s+([A-Za-z_$][\w$]*)'
+    rb'|\bfunction\s*(\()'
+    rb'|\b(constructor|fallback|receive)\s*\('
+    rb'|\bmodifier\s+([A-Za-z_$][\w$]*)'
+)
+
+def blank_comments_strings(buf: bytes) -> bytes:
+    """注释与字符串 → 等长空格（换行保留）"""
+    out = []
+    pos = 0
+    for m in _NOISE_RE.finditer(buf):
+        s, e = m.span()
+        out.append(buf[pos:s])
+        out.append(buf[s:e].translate(_BLANK))
+        pos = e
+    out.append(buf[pos:])
+    return b"".join(out)
+
+def _match_braces(clean: bytes) -> Tuple[List[int], List[int]]:
+    """→ (所有 '{' 的位置, 对应 '}' 的位置；不闭合时为文本末尾)"""
+    opens: List[int] = []
+    closes: List[int] = []
+    stack: List[int] = []
+    for m in re.finditer(rb'[{}]', clean):
+        if m.group() == b"{":
+            stack.append(len(opens))
+            opens.append(m.start())
+            closes.append(len(clean))
+        elif stack:
+            closes[stack.pop()] = m.start()
+    return opens, closes
+
+class SourceIndex:
+    def __init__(self, clean: bytes):
+        self.line_starts = [0] + [m.end() for m in re.finditer(rb'\n', clean)]
+        opens, closes = _match_braces(clean)
+
+        def body(start: int, stop_at_semicolon: bool) -> Optional[Tuple[int, int]]:
+            i = bisect_right(opens, start)
+            if i >= len(opens):
+                return None
+            if stop_at_semicolon:
+                semi = clean.find(b";", start, opens[i])
+                if semi != -1:
+                    return None  # 接口 / 抽象函数：没有函数体
+            return opens[i], closes[i]
+
+        self.contracts: List[Tuple[int, int, str]] = []
+        for m in _CONTRACT_RE.finditer(clean):
+            span = body(m.end(), False)
+            if span:
+                self.contracts.append((m.start(), span[1], m.group(1).decode("ascii", "ignore")))
+
+        self.functions: List[Tuple[int, int, str]] = []
+        for m in _FUNC_RE.finditer(clean):
+            name = m.group(1) or m.group(3) or m.group(4)
+            label = name.decode("ascii", "ignore") if name else "fallback"
+            span = body(m.end(), True)
+            if span:
+                self.functions.append((m.start(), span[1], label))
+        self._c_starts = [c[0] for c in self.contracts]
+        self._f_starts = [f[0] for f in self.functions]
+
+    def line_of(self, offset: int) -> int:
+        return bisect_right(self.line_starts, offset)
+
+    @staticmethod
+    def _enclosing(starts, spans, offset) -> str:
+        # 合约、函数都不嵌套：只需看起点不晚于 offset 的最后一个区间
+        i = bisect_right(starts, offset) - 1
+        if i >= 0:
+            s, e, name = spans[i]
+            if offset <= e:
+                return name
+        return ""
+
+    def locate(self, offset: int) -> Tuple[str, int]:
+        """→ ("Contract.function" / "Contract" / "", 行号)"""
+        c = self._enclosing(self._c_starts, self.contracts, offset)
+        f = self._enclosing(self._f_starts, self.functions, offset)
+        label = ".".join(x for x in (c, f) if x)
+        return label, self.line_of(offset)
+
+# ---------------- 克隆检测用的规范化 ----------------
+
+_TOKEN_RE = re.compile(
+    r'(?P<c>//[^\n]*|/\*.*?(?:\*/|\Z))'
+    r'|(?P<s>(?:hex|unicode)?"(?:\\.|[^"\\\n])*"|(?:hex|unicode)?\'(?:\\.|[^\'\\\n])*\')'
+    r'|(?P<n>0[xX][0-9a-fA-F_]+|\d[\d_]*(?:\.\d+)?(?:[eE]-?\d+)?)'
+    r'|(?P<i>[A-Za-z_$][\w$]*)'
+    r'|(?P<p>\S)',
+    re.DOTALL,
+)
+_TYPE_RE = re.compile(r'(?:u?int|bytes|u?fixed)\d*(?:x\d+)?$')
+
+# 改名后仍保留原样的标识符：语言关键字、内置类型、全局变量与成员、单位
+KEEP_IDENTS = frozenset("""
+pragma solidity experimental abicoder import as from contract interface library abstract is using for
+function modifier event error struct enum mapping returns return if else while do break continue throw
+emit new delete public private internal external pure view payable constant immutable override virtual
+memory storage calldata indexed anonymous constructor fallback receive true false assembly let switch
+case default leave try catch unchecked type var address bool string byte
+msg sender value data sig gas block timestamp number coinbase difficulty gaslimit basefee chainid
+prevrandao tx origin gasprice now this super selfdestruct suicide require assert revert keccak256 sha3
+sha256 ripemd160 ecrecover addmod mulmod blockhash gasleft abi encode encodePacked encodeWithSelector
+encodeWithSignature encodeCall decode call delegatecall staticcall callcode send transfer balance code
+codehash length push pop min max wei gwei szabo finney ether seconds minutes hours days weeks years
+""".split())
+
+class Tokens(NamedTuple):
+    norm: List[str]         # 规范化后的 token
+    raw: List[str]          # 原始 token 文本
+    offsets: List[int]      # 每个 token 在原文中的字符偏移
+    lines: List[int]        # 每个 token 所在行（从 1 开始）
+
+def normalize(text: str) -> Tokens:
+    """
+    规范化 token 流。两份源码只在命名、常量、注释与排版上不同时结果完全相同；
+    pragma 语句原样保留，使不同编译器版本的副本不会被视为同一份
+    """
+    norm: List[str] = []
+    raw: List[str] = []
+    offsets: List[int] = []
+    lines: List[int] = []
+    names = {}
+    line, last = 1, 0
+    in_pragma = False
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "c":
+            continue
+        tok = m.group()
+        start = m.start()
+        line += text.count("\n", last, start)
+        last = start
+        if in_pragma:
+            n = tok
+            in_pragma = tok != ";"
+        elif kind == "s":
+            n = "<s>"
+        elif kind == "n":
+            n = "<n>"
+        elif kind == "i":
+            if tok == "pragma":
+                in_pragma = True
+                n = tok
+            elif tok in KEEP_IDENTS or _TYPE_RE.match(tok):
+                n = tok
+            else:
+                n = names.get(tok)
+                if n is None:
+                    n = names[tok] = f"<{len(names)}>"
+        else:
+            n = tok
+        norm.append(n)
+        raw.append(tok)
+        offsets.append(start)
+        lines.append(line)
+    return Tokens(norm, raw, offsets, lines)
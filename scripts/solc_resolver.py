@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+solc 版本解析：完整解析 pragma 范围，直接返回已安装 solc 二进制的绝对路径
+Resolve `pragma solidity` ranges (^, ~, >=/<, a - b, ||) against the solc
+binaries installed by solc-select / py-solc-x, without `solc-select use`.
+
+- 多条 pragma 取交集；同一条内空格分隔的比较器取交集，`||` 取并集
+- 在满足条件的已安装版本中选最高的
+- 没有满足的已安装版本时退回 PIN_MAP 的代表版本（二进制为空，由调用方兜底）
+- 结果按源码内容 sha256 缓存，可持久化到 JSON（已安装版本集合变化时自动失效）
+"""
+import hashlib, json, os, re, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PRAGMA_RE = re.compile(r'pragma\s+solidity\s+([^;]+);', re.IGNORECASE)
+
+# 没有任何已安装版本满足时的“代表版本”（与 tools/01_prepare.sh 预装的版本一致）
+PIN_MAP = [
+    ("0.4", "0.4.25"),
+    ("0.5", "0.5.17"),
+    ("0.6", "0.6.12"),
+    ("0.7", "0.7.6"),
+    ("0.8", "0.8.20"),
+]
+
+Version = Tuple[int, int, int]
+# 一个比较器：(op, version)；一个范围：比较器列表（取交集）
+Comparator = Tuple[str, Version]
+
+VER_RE = re.compile(r'^v?(\d+)(?:\.(\d+|[xX*]))?(?:\.(\d+|[xX*]))?$')
+COMP_RE = re.compile(r'(\^|~|>=|<=|>|<|=)?\s*(v?[\dxX*]+(?:\.[\dxX*]+){0,2})')
+
+def parse_version(s: str) -> Optional[Version]:
+    m = VER_RE.match(s.strip())
+    if not m or any(p and not p.isdigit() for p in m.groups()):
+        return None
+    return tuple(int(p or 0) for p in m.groups())
+
+def fmt_version(v: Version) -> str:
+    return ".".join(str(x) for x in v)
+
+def _partial(s: str) -> Tuple[Version, int]:
+    """'0.8' / '0.8.x' → ((0,8,0), 2)：第二项为显式给出的段数"""
+    parts = s.lstrip("v").split(".")
+    nums = []
+    for p in parts:
+        if not p.isdigit():
+            break
+        nums.append(int(p))
+    n = len(nums)
+    nums += [0] * (3 - n)
+    return (nums[0], nums[1], nums[2]), n
+
+def _expand(op: str, raw: str) -> List[Comparator]:
+    v, n = _partial(raw)
+    if n == 0:
+        return []  # '*' / 'x'：不限
+    major, minor, patch = v
+    if op == "^":
+        if major > 0 or n == 1:
+            upper = (major + 1, 0, 0)
+        elif minor > 0 or n == 2:
+            upper = (0, minor + 1, 0)
+        else:
+            upper = (0, 0, patch + 1)
+        return [(">=", v), ("<", upper)]
+    if op == "~":
+        upper = (major + 1, 0, 0) if n == 1 else (major, minor + 1, 0)
+        return [(">=", v), ("<", upper)]
+    if op in ("", "="):
+        if n == 3:
+            return [("=", v)]
+        upper = (major + 1, 0, 0) if n == 1 else (major, minor + 1, 0)
+        return [(">=", v), ("<", upper)]
+    if op == ">" and n < 3:
+        return [(">=", (major + 1, 0, 0) if n == 1 else (major, minor + 1, 0))]
+    if op == "<=" and n < 3:
+        return [("<", (major + 1, 0, 0) if n == 1 else (major, minor + 1, 0))]
+    return [(op, v)]
+
+def parse_range(clause: str) -> List[List[Comparator]]:
+    """一条 pragma 子句 → 并集（||）中的若干交集范围"""
+    ranges = []
+    for alt in clause.split("||"):
+        alt = alt.strip()
+        comps: List[Comparator] = []
+        hy = re.match(r'^(\S+)\s+-\s+(\S+)$', alt)
+        if hy:
+            lo, _ = _partial(hy.group(1))
+            comps += [(">=", lo)] + _expand("<=", hy.group(2))
+        else:
+            for m in COMP_RE.finditer(alt):
+                comps += _expand(m.group(1) or "", m.group(2))
+        ranges.append(comps)
+    return ranges
+
+def _cmp_ok(v: Version, op: str, w: Version) -> bool:
+    return {"=": v == w, ">=": v >= w, ">": v > w, "<=": v <= w, "<": v < w}[op]
+
+def satisfies(v: Version, clauses: List[List[List[Comparator]]]) -> bool:
+    return all(any(all(_cmp_ok(v, op, w) for op, w in rng) for rng in ranges) for ranges in clauses)
+
+def parse_pragmas(text: str) -> List[List[List[Comparator]]]:
+    return [parse_range(m.group(1)) for m in PRAGMA_RE.finditer(text)]
+
+def solc_select_home() -> Path:
+    # solc-select 在 venv 内时把 artifacts 放在 $VIRTUAL_ENV/.solc-select
+    venv = os.environ.get("VIRTUAL_ENV")
+    if venv and (Path(venv) / ".solc-select").is_dir():
+        return Path(venv) / ".solc-select"
+    return Path.home() / ".solc-select"
+
+def installed_solcs() -> Dict[str, str]:
+    """已安装的 solc：版本 → 绝对路径（solc-select artifacts 与 ~/.solcx）"""
+    found: Dict[str, str] = {}
+    art = solc_select_home() / "artifacts"
+    if art.is_dir():
+        for d in art.iterdir():
+            m = re.match(r'^solc-(\d+\.\d+\.\d+)$', d.name)
+            if not m:
+                continue
+            ver = m.group(1)
+            for cand in (d / d.name, d):
+                if cand.is_file() and os.access(cand, os.X_OK):
+                    found[ver] = str(cand)
+                    break
+    solcx = Path(os.environ.get("SOLCX_BINARY_PATH") or Path.home() / ".solcx")
+    if solcx.is_dir():
+        for p in solcx.iterdir():
+            m = re.match(r'^solc-v(\d+\.\d+\.\d+)$', p.name)
+            if m and p.is_file() and os.access(p, os.X_OK):
+                found.setdefault(m.group(1), str(p))
+    return found
+
+def _pinned(clauses) -> str:
+    # 旧逻辑：按第一个 0.x 主版本映射到代表版本
+    for ranges in clauses:
+        for rng in ranges:
+            for _, w in rng:
+                mm = f"{w[0]}.{w[1]}"
+                for key, pinned in PIN_MAP:
+                    if mm == key:
+                        return pinned
+    return ""
+
+class SolcResolver:
+    def __init__(self, cache_path: Optional[Path] = None):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.installed = installed_solcs()
+        self._sorted = sorted((parse_version(v), v) for v in self.installed)
+        self._lock = threading.Lock()
+        self._memo: Dict[str, str] = {}
+        self._dirty = False
+        if self.cache_path and self.cache_path.exists():
+            try:
+                data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+                if data.get("installed") == sorted(self.installed):
+                    self._memo = data.get("by_hash", {})
+            except (OSError, ValueError):
+                pass
+
+    def pick(self, text: str) -> str:
+        """选满足所有 pragma 的最高已安装版本；无 pragma 返回空串"""
+        clauses = parse_pragmas(text)
+        if not clauses:
+            return ""
+        for v, s in reversed(self._sorted):
+            if satisfies(v, clauses):
+                return s
+        return _pinned(clauses)
+
+    def resolve_text(self, text: str) -> Tuple[str, str]:
+        """→ (版本, solc 绝对路径)；版本未安装时路径为空串"""
+        h = hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+        with self._lock:
+            ver = self._memo.get(h)
+        if ver is None:
+            ver = self.pick(text)
+            with self._lock:
+                self._memo[h] = ver
+                self._dirty = True
+        return ver, self.installed.get(ver, "")
+
+    def resolve_file(self, path: Path) -> Tuple[str, str]:
+        return self.resolve_text(Path(path).read_text(encoding="utf-8", errors="ignore"))
+
+    def save(self) -> None:
+        if not self.cache_path or not self._dirty:
+            return
+        with self._lock:
+            data = {"installed": sorted(self.installed), "by_hash": self._memo}
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.cache_path)
+            self._dirty = False
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+测试共用：用 bench/ 的合成语料与工具替身在临时目录里搭一棵完整的仓库树，
+不需要安装 solc / Slither / Mythril
+"""
+import argparse, importlib.util, subprocess, sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+_spec = importlib.util.spec_from_file_location("run_bench", ROOT / "bench" / "run_bench.py")
+run_bench = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(run_bench)
+
+@pytest.fixture
+def bench_tree(tmp_path):
+    """bench_tree(n) → (树根, env)；语料与 bench/run_bench.py 的默认参数相同"""
+    def make(n: int, **kw):
+        args = argparse.Namespace(pragmas="0.4.26:3,0.5.17:1,0.6.12:1,0.7.6:1,0.8.20:4", depth=3, seed=1,
+                                  broken=0.0, forge=False)
+        for k, v in kw.items():
+            setattr(args, k, v)
+        env = run_bench.setup_tree(tmp_path, n, args)
+        return tmp_path, env
+    return make
+
+def sh(cmd, cwd: Path, env: dict) -> str:
+    """运行一个阶段，失败时把输出带进断言信息"""
+    p = subprocess.run(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    assert p.returncode == 0, f"{' '.join(map(str, cmd))} -> rc={p.returncode}\n{p.stdout[-4000:]}"
+    return p.stdout
+
+def stage(name: str, tree: Path, env: dict, workers: int = 4) -> str:
+    return sh(run_bench.stage_cmd(name, tree, workers), tree, env)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""01_prepare 的编译产物：crytic-compile 能直接载入的导出文件，以及 03 按实际模式写缓存"""
+import json, os, sqlite3, sys
+
+import pytest
+
+from conftest import sh, stage
+import artifacts
+from scan_cache import ScanCache
+
+def test_prepare_export_loads_in_crytic_compile(bench_tree):
+    cc = pytest.importorskip("crytic_compile")
+    tree, env = bench_tree(10)
+    stage("prepare", tree, env)
+    exports = sorted((tree / "work" / "artifacts").glob("*" + artifacts.EXPORT_SUFFIX))
+    assert exports
+    for exp in exports:
+        combined = json.loads((exp.parent / (exp.name[:-len(artifacts.EXPORT_SUFFIX)] + ".json")).read_text())
+        loaded = cc.CryticCompile(str(exp))        # 真实的 crytic-compile，按 Standard 平台载入，不调用 solc
+        assert type(loaded.platform).__name__ == "Standard"
+        got = {}
+        for unit in loaded.compilation_units.values():
+            for su in unit.source_units.values():
+                for name in su.contracts_names:
+                    got[f"{su.filename.used}:{name}"] = su.bytecode_runtime(name)
+        assert got == {k: c["bin-runtime"] for k, c in combined["contracts"].items()}
+
+def test_export_of_legacy_combined_json(tmp_path):
+    """< 0.8.10 的 combined-json 中 abi 是字符串；导出里须是列表，版本号只留 x.y.z"""
+    cc = pytest.importorskip("crytic_compile")
+    src = str(tmp_path / "A__flattened.sol")
+    abi = [{"type": "function", "name": "f", "inputs": [], "outputs": [], "stateMutability": "nonpayable"}]
+    art = {"contracts": {f"{src}:A": {"abi": json.dumps(abi), "bin": "6080", "bin-runtime": "60806040",
+                                      "srcmap": "0:1:0:-", "srcmap-runtime": "0:1:0:-"},
+                         f"{src}:I": {"abi": "[]", "bin": "", "bin-runtime": "", "srcmap": "", "srcmap-runtime": ""}},
+           "sourceList": [src],
+           "sources": {src: {"AST": {"absolutePath": src, "id": 0, "name": "SourceUnit", "children": []}}},
+           "version": "0.5.17+commit.d19bba13.Linux.g++"}
+    exp = tmp_path / ("A__flattened" + artifacts.EXPORT_SUFFIX)
+    exp.write_text(json.dumps(artifacts.crytic_export(art)))
+    unit = next(iter(cc.CryticCompile(str(exp)).compilation_units.values()))
+    assert unit.compiler_version.version == "0.5.17"
+    su = unit.source_units[unit.filename_lookup(src)]
+    assert sorted(su.contracts_names) == ["A", "I"]
+    assert su.abi("A") == abi and su.bytecode_runtime("I") == ""
+    assert su.srcmaps_runtime["A"] == ["0:1:0:-"] and su.ast["absolutePath"] == src
+
+def runs_args(tree):
+    db = sqlite3.connect(tree / "out" / "findings.db")
+    rows = [(stem, status, json.loads(args)) for stem, status, args in db.execute(
+        "SELECT f.stem, r.status, r.args FROM runs r JOIN files f ON f.id = r.file_id WHERE r.tool='slither'")]
+    db.close()
+    return rows
+
+def test_slither_uses_export_and_caches_by_mode(bench_tree):
+    tree, env = bench_tree(10)
+    stage("prepare", tree, env)
+    slither = [sys.executable, "scripts/03_run_slither.py", "-j", "2", "--no-warm", "--no-clusters"]
+
+    # 替身与 crytic-compile 一样只认 *_export.json：产物模式全部成功，不退回源码编译
+    out = sh(slither + ["--cache-dir", "cache-a"], tree, env)
+    assert "Slither(artifact)" in out and "[OK] Slither =>" not in out
+    assert all(args == ["--artifact"] for _, status, args in runs_args(tree) if status == "ok")
+
+    # 导出载入失败 → 源码模式的结果，缓存键也是源码模式的
+    failbin = tree / "failbin"
+    failbin.mkdir()
+    (failbin / "slither").write_text(f'#!/bin/sh\ncase "$1" in *_export.json) exit 1;; esac\n'
+                                     f'exec {tree / "bin" / "slither"} "$@"\n')
+    (failbin / "slither").chmod(0o755)
+    fenv = dict(env, PATH=f"{failbin}{os.pathsep}{env['PATH']}")
+    out = sh(slither + ["--cache-dir", "cache-b"], tree, fenv)
+    assert "Slither(artifact)" not in out and "[OK] Slither =>" in out
+
+    flat = sorted((tree / "work" / "flattened").glob("*.sol"))[0]
+    text = flat.read_text(encoding="utf-8", errors="ignore")
+    db = sqlite3.connect(tree / "out" / "findings.db")
+    ver = db.execute("SELECT solc FROM files WHERE stem=?", (flat.stem,)).fetchone()[0] or ""
+    db.close()
+    entries = {p.stem for p in (tree / "cache-b").glob("??/*.json")}
+    src_key = ScanCache.key(text, ver, "slither", "0.10.0-stub", [])
+    art_key = ScanCache.key(text, ver, "slither", "0.10.0-stub", ["--artifact"])
+    assert src_key in entries and art_key not in entries
+
+    # 导出恢复可用后，源码模式的缓存仍然命中，不再调用 slither
+    out = sh(slither + ["--cache-dir", "cache-b"], tree, env)
+    assert "[OK] Slither" not in out and out.count("[CACHE] Slither") == len(list(tree.glob("work/flattened/*.sol")))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""克隆簇：代表扫描失败时，成员逐个单独扫描而不是跟着记失败"""
+import json, os, sys
+
+import pytest
+
+from conftest import sh, stage
+
+@pytest.mark.parametrize("tool,script,extra", [
+    ("slither", "scripts/03_run_slither.py", ["--no-warm"]),
+    ("myth", "scripts/04_run_mythril.py", ["--timeout", "10"]),
+])
+def test_members_scanned_when_representative_fails(bench_tree, tool, script, extra):
+    tree, env = bench_tree(30)
+    stage("prepare", tree, env)
+    sh([sys.executable, "scripts/clone_clusters.py"], tree, env)
+    clusters = json.loads((tree / "work" / "clusters.json").read_text(encoding="utf-8"))["clusters"]
+    rep, members = next((r, m) for r, m in sorted(clusters.items()) if m)
+
+    # 在替身前面套一层：分析代表时失败，其余照常
+    failbin = tree / "failbin"
+    failbin.mkdir()
+    wrapper = failbin / tool
+    wrapper.write_text(f'#!/bin/sh\ncase "$*" in *{rep[:-len(".sol")]}*) exit 1;; esac\n'
+                       f'exec {tree / "bin" / tool} "$@"\n')
+    wrapper.chmod(0o755)
+    env = dict(env, PATH=f"{failbin}{os.pathsep}{env['PATH']}")
+
+    out = sh([sys.executable, script, "-j", "4", "--no-cache", "--no-db", "--no-artifacts"] + extra, tree, env)
+    out_dir = tree / "out" / ("slither" if tool == "slither" else "mythril")
+    assert (out_dir / (rep[:-len(".sol")] + ".err.txt")).exists()
+    for m in members:
+        assert (out_dir / (m[:-len(".sol")] + ".json")).exists(), m
+    assert "fail=1" in out
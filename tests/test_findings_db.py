@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+findings_db：流式读取期间仍可写入（iter_query 不持有写锁）；运行历史与最新视图；
+各阶段写入的发现与其输出文件一致
+"""
+import csv, json, threading, time
+
+from conftest import stage
+from findings_db import FindingsDB, mythril_rows, slither_rows
+
+def test_iter_query_does_not_block_writes(tmp_path):
+    db = FindingsDB(tmp_path / "findings.db")
+    for i in range(50):
+        db.record_run(tmp_path / f"A{i}.sol", "slither", "v", [], time.time(), 0.1, "ok",
+                      [("reentrancy-eth", "High", "t", "Medium", "A.sol:1")], solc="0.8.20")
+
+    seen, errors = [], []
+    def consume():
+        try:
+            for row in db.iter_query("SELECT path FROM files ORDER BY path", size=10):
+                seen.append(row["path"])
+                if len(seen) == 5:
+                    # 同一线程、迭代中途写入：原来会在 self.lock 上死锁
+                    db.record_run(tmp_path / "B.sol", "mythril", "v", [], time.time(), 0.1, "ok", [])
+        except Exception as e:
+            errors.append(e)
+    t = threading.Thread(target=consume, daemon=True)
+    t.start()
+    t.join(10)
+    assert not t.is_alive(), "iter_query blocked a write"
+    assert not errors
+    assert len(seen) == 50                      # 快照：迭代开始之后写入的 B.sol 不出现
+    assert db.query("SELECT COUNT(*) FROM runs WHERE tool='mythril'")[0][0] == 1
+    db.close()
+
+def test_runs_keep_history_and_views_show_the_latest(tmp_path):
+    db = FindingsDB(tmp_path / "findings.db")
+    a = tmp_path / "A.sol"
+    db.record_compile(a, "0.4.26", False, "ParserError", source="datasets/A.sol")
+    db.record_compile(a, "0.4.26", True, source="datasets/A.sol")
+    db.record_run(a, "slither", "0.10.0", ["--solc", "/x/solc"], 100.0, 1.5, "ok",
+                  [("reentrancy-eth", "", "t1", "High", "A.sol:3"), ("tx-origin", "", "t2", "Medium", "A.sol:9")],
+                  solc="0.4.26")
+    db.record_run(a, "slither", "0.10.1", [], 200.0, 0.5, "cached", [("tx-origin", "", "t2", "Medium", "A.sol:9")])
+    db.record_run(a, "mythril", "0.24.8", ["--execution-timeout", "60"], 150.0, 30.0, "ok",
+                  [("SWC-107", "", "External Call", "Low", "A:12")])
+
+    f = db.query("SELECT * FROM files")
+    assert len(f) == 1 and (f[0]["path"], f[0]["stem"], f[0]["solc"], f[0]["source"]) == \
+        (str(a), "A", "0.4.26", "datasets/A.sol")
+    assert [(r["ok"], r["reason"]) for r in db.query("SELECT * FROM compilations ORDER BY id")] == \
+        [(0, "ParserError"), (1, "")]
+    # 历史全部保留；视图只看每个工具最近一次
+    assert db.query("SELECT COUNT(*) FROM runs")[0][0] == 3
+    assert db.query("SELECT COUNT(*) FROM findings")[0][0] == 4
+    latest = {r["tool"]: (r["tool_version"], r["status"], r["args"]) for r in db.query("SELECT * FROM latest_runs")}
+    assert latest == {"slither": ("0.10.1", "cached", "[]"),
+                      "mythril": ("0.24.8", "ok", '["--execution-timeout", "60"]')}
+    cur = sorted((r["tool"], r["rule"], r["location"]) for r in db.query("SELECT * FROM current_findings"))
+    assert cur == [("mythril", "SWC-107", "A:12"), ("slither", "tx-origin", "A.sol:9")]
+    db.close()
+
+    # 重新打开：已有的库原样可用
+    db = FindingsDB(tmp_path / "findings.db")
+    assert db.query("SELECT COUNT(*) FROM runs")[0][0] == 3
+    db.close()
+
+def test_tool_output_parsing():
+    sl = json.dumps({"results": {"detectors": [
+        {"check": "reentrancy-eth ", "impact": "High", "description": "d" * 300,
+         "elements": [{"source_mapping": {}}, {"source_mapping": {"filename_short": "A.sol", "lines": [7, 8]}}]},
+        {"check": "solc-version", "impact": "Informational", "elements": [{"source_mapping": {"lines": [1]}}]},
+        {"no_check": True}, "junk"]}})
+    assert slither_rows(sl) == [("reentrancy-eth", "", "d" * 200, "High", "A.sol:7"),
+                                ("solc-version", "", "", "Informational", "1")]
+    assert slither_rows("not json") == [] and slither_rows("null") == []
+
+    my = json.dumps([{"issues": [
+        {"swcID": "107", "swcTitle": "Reentrancy", "severity": "High", "contract": "C", "lineno": 12},
+        {"swc-id": "SWC-101", "title": "Overflow", "contract": "C", "locations": [{"sourceMap": "5:1:0"}]},
+        {"swcID": "", "title": "x"}]}])
+    assert mythril_rows(my) == [("SWC-107", "", "Reentrancy", "High", "C:12"),
+                                ("SWC-101", "", "Overflow", "", "C@5:1:0"),
+                                ("", "", "x", "", "")]
+    assert mythril_rows(json.dumps({"issues": []})) == [] and mythril_rows("") == []
+
+def test_every_stage_writes_the_store(bench_tree):
+    tree, env = bench_tree(10)
+    for s in ("prepare", "screen", "slither", "mythril"):
+        stage(s, tree, env)
+    db = FindingsDB(tree / "out" / "findings.db")
+    entries = sorted((tree / "datasets").rglob("*.sol"))
+    # 每个入口一行（带内容哈希与 solc），每个入口一次编译记录
+    rows = {r["path"]: r for r in db.query("SELECT * FROM files WHERE sha256 IS NOT NULL")}
+    assert sorted(rows) == [str(e) for e in entries] and all(r["solc"] for r in rows.values())
+    assert db.query("SELECT COUNT(*) FROM compilations WHERE ok=1")[0][0] == len(entries)
+
+    for tool, parse in (("slither", slither_rows), ("mythril", mythril_rows)):
+        reports = sorted((tree / "out" / tool).glob("*.json"))
+        assert reports
+        counts = {r["stem"]: r["n"] for r in db.query(
+            "SELECT f.stem, (SELECT COUNT(*) FROM current_findings x WHERE x.run_id = r.id) AS n "
+            "FROM latest_runs r JOIN files f ON f.id = r.file_id WHERE r.tool = ?", (tool,))}
+        assert counts == {p.stem: len(parse(p.read_text(encoding="utf-8"))) for p in reports}
+        assert sum(counts.values()) > 0
+
+    with open(tree / "out" / "quick_screen.csv", newline="", encoding="utf-8") as f:
+        hits = sum(1 for _ in csv.DictReader(f))
+    assert db.query("SELECT COUNT(*) FROM current_findings WHERE tool='quick_screen'")[0][0] == hits
+    db.close()
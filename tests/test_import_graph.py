@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""import_graph：simple_flatten 的拼接结果要能直接编译（SPDX / pragma 去重），依赖闭包要完整"""
+import json, os, re
+
+from conftest import sh, stage
+from import_graph import ImportGraph
+from solc_resolver import parse_pragmas
+
+def write(p, text):
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(text, encoding="utf-8")
+    return p
+
+def test_flatten_keeps_one_spdx_and_distinct_pragmas(tmp_path):
+    write(tmp_path / "lib" / "Math.sol", "// SPDX-License-Identifier: MIT\npragma solidity ^0.8.0;\n"
+                                         "library Math {}\n")
+    write(tmp_path / "lib" / "Ownable.sol", "/* SPDX-License-Identifier: Apache-2.0\n   multi-line header */\n"
+                                            "pragma solidity ^0.8.0;\npragma abicoder v2;\n"
+                                            'import "./Math.sol";\ncontract Ownable {}\n')
+    entry = write(tmp_path / "Token.sol", "// SPDX-License-Identifier: GPL-3.0\npragma solidity >=0.8.4 <0.9.0;\n"
+                                          'import "./lib/Ownable.sol";\nimport "./lib/Math.sol";\n'
+                                          "pragma abicoder v2;\ncontract Token is Ownable {}\n")
+    flat = ImportGraph().flatten(entry)
+
+    assert flat.count("SPDX-License-Identifier:") == 1
+    assert "SPDX-License-Identifier: GPL-3.0" in flat          # 保留的是入口自己的
+    assert "multi-line header */" in flat                        # 块注释的结构不被破坏
+    pragmas = re.findall(r"^\s*pragma\s+[^;]+;", flat, re.MULTILINE)
+    assert sorted(" ".join(p.split()) for p in pragmas) == \
+        ["pragma abicoder v2;", "pragma solidity >=0.8.4 <0.9.0;", "pragma solidity ^0.8.0;"]
+    assert len(parse_pragmas(flat)) == 2                         # 不同的版本约束都留给 solc 解析器取交集
+    assert flat.count("library Math") == 1 and flat.index("library Math") < flat.index("contract Ownable")
+
+def test_prepare_compiles_multi_file_spdx_projects(bench_tree):
+    """bench 的 solc 替身与真实 solc 一样（>= 0.6.8）拒绝多个 SPDX 标识；库链上每个文件都带 SPDX"""
+    tree, env = bench_tree(30)
+    stage("prepare", tree, env)
+    assert (tree / "out" / "compile_fail.txt").read_text(encoding="utf-8") == ""
+
+def test_closure_follows_every_import_form_and_remappings(tmp_path):
+    write(tmp_path / "remappings.txt", "@oz/=lib/openzeppelin/contracts/\nsrc/:@oz/=lib/oz-src/\n")
+    oz = write(tmp_path / "lib" / "openzeppelin" / "contracts" / "access" / "Ownable.sol", "contract Ownable {}\n")
+    ozsrc = write(tmp_path / "lib" / "oz-src" / "access" / "Ownable.sol", "contract Ownable {}\n")
+    deps = [write(tmp_path / "contracts" / f"{n}.sol", f"library {n} {{}}\n") for n in "ABCDE"]
+    npm = write(tmp_path / "node_modules" / "pkg" / "P.sol", "library P {}\n")
+    entry = write(tmp_path / "contracts" / "Token.sol",
+                  'import "./A.sol";\nimport "./B.sol" as B;\nimport * as C from "./C.sol";\n'
+                  "import {D,\n  D as DD} from './D.sol';\nimport{E}from\"contracts/E.sol\";\n"
+                  'import {Ownable} from "@oz/access/Ownable.sol";\nimport "pkg/P.sol";\n'
+                  'import "./Missing.sol";\ncontract Token is Ownable {}\n')
+    user = write(tmp_path / "src" / "User.sol", 'import "@oz/access/Ownable.sol";\ncontract User is Ownable {}\n')
+
+    g = ImportGraph()
+    got, missing = g.closure(entry)
+    assert got == {str(p.resolve()) for p in [entry, oz, npm] + deps}
+    assert missing == {str((tmp_path / "contracts" / "Missing.sol").resolve())}
+    # context 限定的重映射优先：src/ 下的文件解析到另一份
+    assert g.closure(user)[0] == {str(user.resolve()), str(ozsrc.resolve())}
+
+    flat = g.flatten(entry)
+    assert not re.search(r"^\s*import\b", flat, re.MULTILINE)      # 全部内联，解析不到的只留 WARN 注释
+    assert flat.count("contract Ownable") == 1 and flat.count("library D") == 1
+
+def test_forge_closure_tracks_the_files_forge_used(bench_tree):
+    """用 forge 时依赖闭包取 forge 输出中的文件标记：forge 按自己的规则解析到的文件改动后，入口要重新 prepare"""
+    tree, env = bench_tree(5, forge=True)
+    extra = write(tree / "datasets" / "lib" / "Extra.sol", "library Extra {}\n")
+    wrap = tree / "wrapbin"
+    wrap.mkdir()
+    # 在 forge 替身的输出之后多拼一个文件（如 foundry.toml 中的重映射解析到的），正文里看不到对应的 import
+    (wrap / "forge").write_text(f'#!/bin/sh\n{tree / "bin" / "forge"} "$@" || exit $?\n'
+                                '[ "$1" = flatten ] && printf "// datasets/lib/Extra.sol\\nlibrary Extra {}\\n"\n'
+                                "exit 0\n")
+    (wrap / "forge").chmod(0o755)
+    wenv = dict(env, PATH=f"{wrap}{os.pathsep}{env['PATH']}")
+
+    stage("prepare", tree, wenv)
+    entries = json.loads((tree / "work" / "prepare_manifest.json").read_text(encoding="utf-8"))["entries"]
+    tops = {e: rec for e, rec in entries.items() if "/lib/" not in e}      # 库文件本身也是入口
+    assert len(tops) == 5
+    for entry, rec in tops.items():
+        assert entry in rec["deps"] and str(extra.resolve()) in rec["deps"]
+        assert len(rec["deps"]) > 2 and not rec["missing"]       # forge 拼进去的库链也都在闭包里
+
+    assert f"unchanged (skipped): {len(entries)}" in stage("prepare", tree, wenv)
+    write(extra, "library Extra { }\n")
+    assert "unchanged (skipped): 0" in stage("prepare", tree, wenv)
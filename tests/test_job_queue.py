@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""job_queue 的租约：多个 worker 进程共用一个队列库，其中一个在持有租约时被杀"""
+import argparse, os, signal, sqlite3, subprocess, sys, textwrap, threading, time
+from collections import Counter
+from pathlib import Path
+
+import job_queue as jq
+
+ROOT = Path(__file__).resolve().parents[1]
+LEASE = 1.0
+N_JOBS = 30
+
+# 每个 worker 进程运行真实的 work_loop；run() 只在日志里记一行（O_APPEND，短行不会交错），
+# STUCK=1 的 worker 领到任务后一直不返回（心跳照常），用来在租约期内被杀
+WORKER = textwrap.dedent(f"""
+    import argparse, os, sys, threading, time
+    from pathlib import Path
+    sys.path.insert(0, {str(ROOT / "scripts")!r})
+    import job_queue as jq
+    db, log = sys.argv[1], sys.argv[2]
+    q = jq.JobQueue(Path(db))
+    def run(job):
+        with open(log, "a") as f:
+            f.write(f"{{os.getpid()}} {{job.id}}\\n")
+        if os.environ.get("STUCK"):
+            time.sleep(3600)
+        time.sleep(0.02)
+        return True
+    args = argparse.Namespace(lease={LEASE}, poll=0.1, max_attempts=3)
+    jq.work_loop(q, run, f"w{{os.getpid()}}", [], args, {{"ok": 0, "fail": 0}}, {{}}, threading.Lock())
+""")
+
+def runs(log: Path):
+    if not log.exists():
+        return []
+    return [tuple(map(int, line.split())) for line in log.read_text().splitlines()]
+
+def spawn(db, log, **env):
+    return subprocess.Popen([sys.executable, "-c", WORKER, str(db), str(log)], env=dict(os.environ, **env),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+def wait_until(cond, timeout=30.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_killed_worker_lease_is_reclaimed(tmp_path):
+    db, log = tmp_path / "queue.db", tmp_path / "runs.log"
+    q = jq.JobQueue(db)
+    assert q.enqueue((f"f{i:03d}.sol", "slither", {}, 0) for i in range(N_JOBS)) == N_JOBS
+
+    victim = spawn(db, log, STUCK="1")
+    assert wait_until(lambda: any(pid == victim.pid for pid, _ in runs(log)))
+    stuck_job = next(job for pid, job in runs(log) if pid == victim.pid)
+    workers = [spawn(db, log) for _ in range(3)]
+    time.sleep(LEASE / 2)
+    os.kill(victim.pid, signal.SIGKILL)     # 租约期内（仍在心跳）被杀
+    victim.wait()
+    for w in workers:
+        out, _ = w.communicate(timeout=60)
+        assert w.returncode == 0, out
+        assert "already finished elsewhere" not in out
+
+    # 每个任务恰好完成一次；被杀 worker 的任务在租约过期后由别人接管
+    rows = {r[0]: r[1:] for r in q.conn.execute("SELECT id, state, owner, attempts FROM jobs")}
+    assert all(state == "done" for state, _, _ in rows.values())
+    state, owner, attempts = rows[stuck_job]
+    assert owner != f"w{victim.pid}" and attempts == 2
+    per_job = Counter(job for _, job in runs(log))
+    assert per_job[stuck_job] == 2
+    assert all(n == 1 for job, n in per_job.items() if job != stuck_job)
+    assert len(per_job) == N_JOBS
+
+    # 已完成的任务永不重跑：重复 enqueue 不新增，新 worker 立即退出
+    assert q.enqueue((f"f{i:03d}.sol", "slither", {}, 0) for i in range(N_JOBS)) == 0
+    before = len(runs(log))
+    late = spawn(db, log)
+    late.communicate(timeout=30)
+    assert late.returncode == 0 and len(runs(log)) == before
+    q.close()
+
+class FlakyQueue(jq.JobQueue):
+    """claim / heartbeat / complete / active 的第一次调用各抛一次 database is locked"""
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.failed = set()
+
+    def _flaky(self, name):
+        if name not in self.failed:
+            self.failed.add(name)
+            raise sqlite3.OperationalError("database is locked")
+
+    def claim(self, *a, **kw):
+        self._flaky("claim")
+        return super().claim(*a, **kw)
+
+    def heartbeat(self, *a, **kw):
+        self._flaky("heartbeat")
+        return super().heartbeat(*a, **kw)
+
+    def complete(self, *a, **kw):
+        self._flaky("complete")
+        return super().complete(*a, **kw)
+
+    def active(self, *a, **kw):
+        self._flaky("active")
+        return super().active(*a, **kw)
+
+def test_work_loop_retries_locked_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(jq, "DB_RETRY", 0.01, raising=False)
+    q = FlakyQueue(tmp_path / "queue.db")
+    q.enqueue((f"f{i}.sol", "slither", {}, 0) for i in range(3))
+    ran = []
+    def run(job):
+        ran.append(job.id)
+        time.sleep(0.15)            # 让心跳（lease/3）至少触发一次
+        return True
+    args = argparse.Namespace(lease=0.3, poll=0.01, max_attempts=3)
+    stats = {"ok": 0, "fail": 0}
+    t = threading.Thread(target=jq.work_loop, args=(q, run, "w", [], args, stats, {}, threading.Lock()))
+    t.start()
+    t.join(30)
+    assert not t.is_alive()
+    assert q.failed == {"claim", "heartbeat", "complete", "active"}
+    assert sorted(ran) == [1, 2, 3] and stats == {"ok": 3, "fail": 0}
+    assert {s for (s,) in q.conn.execute("SELECT state FROM jobs")} == {"done"}
+    q.close()
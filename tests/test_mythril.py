@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+04_run_mythril：按合约跑 bytecode 后，issue 经 srcmap-runtime 映射回 flattened 源码的行号；
+各合约分用文件的时间片，而不是每个合约一个完整时间片
+"""
+import json, os, re, sqlite3, sys
+
+from conftest import sh, stage
+import artifacts
+from artifacts import pc_sources
+from myth_schedule import split
+
+def test_pc_sources_skips_push_data_and_inherits_fields():
+    # PUSH1 80 | PUSH2 0102 | JUMPDEST | STOP；空字段沿用上一条
+    m = pc_sources("6080610102" + "5b" + "00", "10:5:0:-;;20::1;:3")
+    assert m == {0: (10, 5, 0), 2: (10, 5, 0), 5: (20, 5, 1), 6: (20, 3, 1)}
+    assert pc_sources("zz", "0:1:0") == {}
+
+def test_mythril_issues_carry_source_lines(bench_tree):
+    tree, env = bench_tree(10)
+    stage("prepare", tree, env)
+    stage("mythril", tree, env)
+
+    reports = sorted((tree / "out" / "mythril").glob("*.json"))
+    assert reports
+    for p in reports:
+        rep = json.loads(p.read_text(encoding="utf-8"))[0]
+        flat = tree / "work" / "flattened" / (p.stem + ".sol")
+        raw = flat.read_bytes()
+        assert rep["sourceType"] == "solidity-file" and rep["sourceList"] == [str(flat)]
+        assert rep["issues"]
+        for it in rep["issues"]:
+            start, length, idx = map(int, it["locations"][0]["sourceMap"].split(":"))
+            assert idx == 0 and it["filename"] == str(flat)
+            # 替身把指令映射到合约定义：偏移处正是该合约，行号与偏移一致
+            assert re.match(rb"(contract|library)\s+" + it["contract"].encode(), raw[start:start + length])
+            assert it["lineno"] == raw.count(b"\n", 0, start) + 1
+
+    db = sqlite3.connect(tree / "out" / "findings.db")
+    locs = [r[0] for r in db.execute("SELECT location FROM findings WHERE tool='mythril'")]
+    db.close()
+    assert locs and all(re.fullmatch(r"\w+:\d+", loc) for loc in locs)
+
+def test_split_stays_within_the_file_slot():
+    assert split(60, [100, 100, 200]) == [17, 17, 25]     # 各 10 秒下限 + 剩余 30 秒按大小
+    assert split(60, [4000]) == [60]
+    assert split(60, []) == []
+    shares = split(60, [10] * 8)                 # 下限 min(MIN_TIMEOUT, 60 // 8) = 7
+    assert min(shares) >= 7 and sum(shares) <= 60
+    assert sum(split(25, [1, 1000, 1000])) <= 25
+
+def test_contracts_share_the_file_timeout(bench_tree):
+    tree, env = bench_tree(10)
+    stage("prepare", tree, env)
+    # 记录每次 myth 调用的 --execution-timeout
+    logbin = tree / "logbin"
+    logbin.mkdir()
+    (logbin / "myth").write_text('#!/bin/sh\nprev=""\nfor a in "$@"; do\n'
+                                 f'  [ "$prev" = "--execution-timeout" ] && echo "$a" >> {tree / "timeouts.log"}\n'
+                                 f'  prev="$a"\ndone\nexec {tree / "bin" / "myth"} "$@"\n')
+    (logbin / "myth").chmod(0o755)
+    lenv = dict(env, PATH=f"{logbin}{os.pathsep}{env['PATH']}")
+    sh([sys.executable, "scripts/04_run_mythril.py", "-j", "4", "--no-cache", "--no-clusters", "--timeout", "60"],
+       tree, lenv)
+
+    expected = []
+    for flat in (tree / "work" / "flattened").glob("*.sol"):
+        art = json.loads((tree / "work" / "artifacts" / (flat.stem + ".json")).read_text(encoding="utf-8"))
+        expected += split(60, [len(code) for _, code, _ in artifacts.deployable_contracts(art)])
+    got = [int(x) for x in (tree / "timeouts.log").read_text().split()]
+    assert expected and sorted(got) == sorted(expected)
+    files = len(list((tree / "work" / "flattened").glob("*.sol")))
+    assert len(got) > files and sum(got) <= 60 * files     # 多合约文件不再每个合约都给满 60 秒
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""make_report.PIndex：SWC 哈希表 + detector 前缀树的结果与原来逐 P、逐模式 startswith 的 map_to_p 完全一致"""
+import importlib.util, random
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+_spec = importlib.util.spec_from_file_location("make_report", ROOT / "tools" / "make_report.py")
+mr = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(mr)
+
+def old_map_to_p(swcs, dets, pmap):
+    # 改造前的实现（每个文件对每个 P 做一遍模式 × detector 的嵌套循环）
+    ps_hit, detail = set(), {}
+    for P, rule in pmap.items():
+        s_hit = swcs & rule["mythril_swc"] if rule["mythril_swc"] else set()
+        d_hit = set()
+        for pat in rule["slither"]:
+            for d in dets:
+                if d == pat or d.startswith(pat):
+                    d_hit.add(d)
+        if s_hit or d_hit:
+            ps_hit.add(P)
+            detail[P] = {"swc": s_hit, "det": d_hit}
+    return ps_hit, detail
+
+def vocabulary(pmap):
+    swcs = {s for r in pmap.values() for s in r["mythril_swc"]} | {"SWC-999", "SWC-10", "SWC-1070"}
+    dets = {d for r in pmap.values() for d in r["slither"]}
+    # 前缀的延伸、截断与无关 detector
+    dets |= {d + suf for d in list(dets) for suf in ("-x", "s", "-eth-2")} | {d[:-1] for d in dets if len(d) > 1}
+    dets |= {"naming-convention", "solc-version", "reentrancy", "reentrancy-benign", "tx", "tx-origins", ""}
+    return sorted(swcs), sorted(dets)
+
+def check_equivalent(pmap, rounds=400):
+    idx = mr.PIndex(pmap)
+    swcs, dets = vocabulary(pmap)
+    rnd = random.Random(7)
+    hit = 0
+    for _ in range(rounds):
+        s = set(rnd.sample(swcs, rnd.randint(0, 4)))
+        d = set(rnd.sample(dets, rnd.randint(0, 6)))
+        want = old_map_to_p(s, d, pmap)
+        assert mr.map_to_p(s, d, idx) == want, (s, d)
+        hit += bool(want[0])
+    assert hit > rounds // 2
+
+def test_matches_old_map_to_p_on_repo_config():
+    pmap = mr.load_pmap(ROOT / "config" / "p_mapping.yaml")
+    assert len(pmap) >= 11
+    check_equivalent(pmap)
+    # 同一 SWC 属于多个 P；前缀命中带出完整 detector 名
+    ps, detail = mr.map_to_p({"SWC-107"}, {"reentrancy-events"}, mr.PIndex(pmap))
+    assert {"P1", "P10"} <= ps and detail["P1"]["det"] == {"reentrancy-events"}
+
+def test_matches_old_map_to_p_on_overlapping_prefixes():
+    pmap = {
+        "A": {"name": "A", "mythril_swc": {"SWC-101"}, "slither": {"re", "reentrancy-eth"}},
+        "B": {"name": "B", "mythril_swc": set(), "slither": {"reentrancy"}},
+        "C": {"name": "C", "mythril_swc": {"SWC-101", "SWC-107"}, "slither": set()},
+        "D": {"name": "D", "mythril_swc": set(), "slither": {""}},         # 空模式：old 逻辑下匹配一切
+        "E": {"name": "E", "mythril_swc": set(), "slither": set()},
+    }
+    check_equivalent(pmap)
+    idx = mr.PIndex(pmap)
+    assert idx.det_ps("reentrancy-eth") == {"A", "B", "D"}
+    assert idx.det_ps("rent") == {"A", "D"}
+    assert mr.map_to_p(set(), set(), idx) == (set(), {})
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""tools/pipeline.py：部分运行不覆盖 quick_screen.csv；批量编译；编译抛异常的入口记入 compile_fail"""
+import csv, os, sys
+
+from conftest import sh
+
+def pipeline(tree, env, *extra, **envs):
+    return sh([sys.executable, "tools/pipeline.py", "-j", "2", "--no-report", "--no-cache", "--timeout", "10", *extra],
+              tree, dict(env, **envs))
+
+def screen_rows(tree):
+    with open(tree / "out" / "quick_screen.csv", newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+def test_subset_run_merges_quick_screen_by_file(bench_tree):
+    tree, env = bench_tree(10)
+    pipeline(tree, env)
+    full = screen_rows(tree)
+    assert full[0][0] == "file" and len({r[0] for r in full[1:]}) > 2
+
+    one = sorted((tree / "datasets").rglob("C000003.sol"))[0]
+    pipeline(tree, env, FILE=str(one))
+    rows = screen_rows(tree)
+    assert rows[0] == full[0]
+    assert sorted(rows[1:]) == sorted(full[1:])                 # 其他文件的行保留，该文件的行不重复
+    assert not (tree / "out" / "quick_screen.pipeline.csv").exists()
+
+    # 该文件这次零命中：旧行要被清掉，而不是留着
+    one.write_text("pragma solidity 0.8.20;\ncontract C3 {}\n", encoding="utf-8")
+    pipeline(tree, env, FILE=str(one))
+    rows = screen_rows(tree)
+    assert not [r for r in rows[1:] if r[0] == str(one)]
+    assert sorted(rows[1:]) == sorted(r for r in full[1:] if r[0] != str(one))
+
+def test_batches_compiles_and_records_compile_errors(bench_tree):
+    tree, env = bench_tree(12)
+    # 0.6.12 的 solc 无法启动（解释器不存在）：Popen 直接抛异常
+    solc = tree / "home" / ".solc-select" / "artifacts" / "solc-0.6.12" / "solc-0.6.12"
+    solc.unlink()
+    solc.write_text("#!/nonexistent/interpreter\n")
+    solc.chmod(0o755)
+    out = pipeline(tree, env, "--only", "slither", "--batch", "50", METRICS_FILE=str(tree / "metrics.jsonl"))
+
+    fail = (tree / "out" / "compile_fail.txt").read_text(encoding="utf-8").splitlines()
+    assert fail and all("compile error" in line for line in fail)
+    passed = (tree / "out" / "compile_pass.txt").read_text(encoding="utf-8").splitlines()
+    entries = [p for p in (tree / "datasets").rglob("*.sol")]
+    assert len(passed) + len(fail) == len(entries)              # 没有条目被丢掉
+    assert f"fail={len(fail)}" in out.split("compile pass=")[1].split("\n")[0]
+
+    # 同一 solc 版本的文件合并成 --standard-json 批次：solc 调用次数远少于编译的文件数
+    calls = sum(1 for line in open(tree / "metrics.jsonl", encoding="utf-8") if '"tool": "solc' in line)
+    assert 0 < calls < len(passed)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""01_prepare 的正文去重：别名入口不重复编译 / 扫描，但在结果与报告里一个都不能少"""
+import csv, json, sqlite3, sys
+from pathlib import Path
+
+from conftest import run_bench, sh, stage
+
+def manifest(tree):
+    return json.loads((tree / "work" / "prepare_manifest.json").read_text(encoding="utf-8"))["entries"]
+
+def reported(csv_path):
+    """报告 CSV 中的文件 → flattened stem（JSON 模式是 stem，结果库模式是文件名）"""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return {Path(row["file"]).name[:-len(".sol")] if row["file"].endswith(".sol") else row["file"]
+                for row in csv.DictReader(f)}
+
+def test_aliased_entries_appear_in_report(bench_tree):
+    tree, env = bench_tree(30)
+    for name in ("prepare", "slither", "mythril"):
+        stage(name, tree, env)
+
+    entries = manifest(tree)
+    aliases = {rec["flat"][:-len(".sol")] for rec in entries.values() if rec.get("alias_of")}
+    flats = {rec["flat"][:-len(".sol")] for rec in entries.values() if rec["ok"]}
+    assert aliases, "corpus should contain byte-identical entries"
+    for stem in aliases:
+        assert (tree / "out" / "slither" / f"{stem}.json").exists()
+        assert (tree / "out" / "mythril" / f"{stem}.json").exists()
+
+    # JSON 目录模式（bench 的 out/bench）
+    run_bench.link_reports(tree)
+    stage("summarize", tree, env)
+    stage("report", tree, env)
+    assert flats <= reported(tree / "out" / "bench" / "findings.csv")
+
+    # 结果库模式：别名也有 Slither / Mythril 的 run
+    db = sqlite3.connect(tree / "out" / "findings.db")
+    scanned = {(stem, tool) for stem, tool in db.execute(
+        "SELECT f.stem, r.tool FROM runs r JOIN files f ON f.id = r.file_id")}
+    db.close()
+    for stem in aliases:
+        assert (stem, "slither") in scanned and (stem, "mythril") in scanned
+    sh([sys.executable, "tools/make_report.py", "out", "--db", "out/findings.db",
+        "--emit-md", "out/db_report.md", "--emit-csv", "out/db_findings.csv"], tree, env)
+    assert flats <= reported(tree / "out" / "db_findings.csv")
+
+def test_pipeline_scans_aliases(bench_tree):
+    tree, env = bench_tree(30)
+    sh([sys.executable, "tools/pipeline.py", "--no-report", "-j", "4", "--timeout", "10"], tree, env)
+    aliases = [rec["flat"][:-len(".sol")] for rec in manifest(tree).values() if rec.get("alias_of")]
+    assert aliases
+    for stem in aliases:
+        assert (tree / "out" / "slither" / f"{stem}.json").exists()
+        assert (tree / "out" / "mythril" / f"{stem}.json").exists()
+
+def test_alias_survives_canonical_edit(bench_tree):
+    """别名是规范文件的硬链接：规范文件改动后重新 prepare，别名的内容不能跟着变"""
+    tree, env = bench_tree(30)
+    stage("prepare", tree, env)
+    entries = manifest(tree)
+    entry, rec = next((e, r) for e, r in entries.items() if r.get("alias_of"))
+    canon = next(e for e, r in entries.items() if r["flat"] == rec["alias_of"] and not r.get("alias_of"))
+    alias_flat = tree / "work" / "flattened" / rec["flat"]
+    before = alias_flat.read_text(encoding="utf-8")
+
+    with open(canon, "a", encoding="utf-8") as f:
+        f.write("\ncontract Extra {}\n")
+    stage("prepare", tree, env)
+    assert "Extra" not in alias_flat.read_text(encoding="utf-8")
+    assert alias_flat.read_text(encoding="utf-8").split("\n\n", 1)[1] == before.split("\n\n", 1)[1]
+    assert "Extra" in (tree / "work" / "flattened" / rec["alias_of"]).read_text(encoding="utf-8")
+    assert manifest(tree)[entry]["ok"]
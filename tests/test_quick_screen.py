@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""02_quick_screen：单遍 Matcher 与原来逐类别、逐模式 re.finditer(IGNORECASE) 的命中完全一致"""
+import importlib.util, re
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+_spec = importlib.util.spec_from_file_location("quick_screen", ROOT / "scripts" / "02_quick_screen.py")
+qs = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(qs)
+
+TRICKY = """
+pragma solidity ^0.8.0;
+contract Wallet is AccessControl, ACCESSCONTROL {
+    uint Threshold; uint requiredsigners; uint CONFIRMATIONS; // MultiSig
+    function f(address a) external onlyOwner onlyRole(ADMIN) {
+        require(tx.origin == OWNER());
+        a.call(""); a.delegatecall(""); a.call.value(1)(""); a.CALL.VALUE(1)("");
+        payable(a).send(1); payable(a).Transfer(1); payable(a).transferFrom(1);
+        unchecked{ x = add(1, 2); } UNCHECKED   { y = SUB (3, 4) * mul( 5, 6); }
+        readd(1); subtract(2); sub_(3); _add(4); SafeMath.add(1, 2); safemath;
+        reentrancy; checks-effects-interactions; Checks-Effects-Interactions;
+    }
+}
+"""
+
+def old_hits(text: str, patterns):
+    # 改造前 scan_file 的做法
+    return sorted((m.start(), m.end(), cat, pat)
+                  for cat, pats in patterns.items() for pat in pats
+                  for m in re.finditer(pat, text, re.IGNORECASE))
+
+def new_hits(text: str, matcher):
+    return sorted((s, e, *matcher.entries[j]) for s, e, j in matcher.finditer(text.lower().encode("utf-8")))
+
+def test_matches_old_loop_on_default_patterns(bench_tree):
+    tree, _ = bench_tree(20)
+    texts = [TRICKY] + [p.read_text(encoding="utf-8") for p in sorted((tree / "datasets").rglob("*.sol"))]
+    total = 0
+    for text in texts:
+        want = old_hits(text, qs.PATTERNS)
+        assert new_hits(text, qs.MATCHER) == want
+        total += len(want)
+    assert total > 50
+    got = {pat for _, _, _, pat in new_hits(TRICKY, qs.MATCHER)}
+    assert got == {pat for pats in qs.PATTERNS.values() for pat in pats}     # 每个默认模式都覆盖到
+
+def test_matches_old_loop_on_extended_patterns():
+    # 扩展 PATTERNS 的常见写法：大写转义、量词前缀、交替与无字面前缀的模式（走 fallback）
+    patterns = {
+        "X": [r"\bselfdestruct\s*\(", r"block\.timestamp", r"ecrecover\(", r"\Bcall\b", r"(foo|bar)\(",
+              r"[A-Z]\w*Token\b", r"ab?c", r"assembly\s*\{", r"Ownable"],
+        "Y": [r"ownable", r"\.call\("],
+    }
+    m = qs.Matcher(patterns)
+    assert {patterns["X"][i] for i in (4, 5)} <= {m.entries[j][1] for j in m.fallback}
+    text = TRICKY + """
+    SELFDESTRUCT (x); Block.Timestamp; ECRECOVER(h); recall; foo(1) BAR(2) MyToken erc20token
+    ac abc abbc ASSEMBLY { } contract O is Ownable {} x.Call("")
+    """
+    assert new_hits(text, m) == old_hits(text, patterns)
+    assert list(qs.Matcher({}).finditer(b"anything")) == []
+
+def test_literal_prefix():
+    assert qs._literal_prefix(r"\.call\(") == ".call("
+    assert qs._literal_prefix(r"\badd\s*\(") == "add"
+    assert qs._literal_prefix(r"unchecked\s*\{") == "unchecked"
+    assert qs._literal_prefix(r"Checks-Effects-Interactions") == "checks-effects-interactions"
+    assert qs._literal_prefix(r"ab?c") == "a"
+    assert qs._literal_prefix(r"(foo|bar)\(") == ""
+    assert qs._literal_prefix(r"\w+Token") == ""
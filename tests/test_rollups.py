@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+findings_db 的汇总表（rollup_*）：任意顺序的重跑、solc 变化、rule_p 重建之后，
+都与从 latest_runs / current_findings 直接重算的结果一致；quick_stats --db 的回答也一致
+"""
+import importlib.util, random
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from findings_db import FindingsDB, SCAN_TOOLS
+
+ROOT = Path(__file__).resolve().parents[1]
+_spec = importlib.util.spec_from_file_location("quick_stats", ROOT / "tools" / "quick_stats.py")
+qs = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(qs)
+
+RULES = {"slither": ["reentrancy-eth", "tx-origin", "solc-version"], "mythril": ["SWC-107", "SWC-101"],
+         "quick_screen": [r"\.call\(", r"tx\.origin"]}
+SOLCS = ["0.4.26", "0.5.17", "0.8.20"]
+
+def recomputed(db):
+    """从明细表直接重算各汇总表（计数为 0 的行不存在）"""
+    solc = {r[0]: r[1] or "" for r in db.query("SELECT id, solc FROM files")}
+    latest = db.query("SELECT id, file_id, tool FROM latest_runs")
+    found = defaultdict(list)
+    for r in db.query("SELECT run_id, rule FROM current_findings"):
+        found[r[0]].append(r[1])
+    rule_p = defaultdict(set)
+    for r in db.query("SELECT tool, rule, p FROM rule_p"):
+        rule_p[(r[0], r[1])].add(r[2])
+
+    rfile = {(fid, tool): (run, len(found[run]), solc[fid]) for run, fid, tool in latest}
+    tools, counts, rules, ps = Counter(), Counter(), Counter(), defaultdict(set)
+    any_n = {}
+    for (fid, tool), (run, n, s) in rfile.items():
+        tools[(tool, "files")] += 1; tools[(tool, "hit_files")] += n > 0; tools[(tool, "issues")] += n
+        counts[(tool, s, n)] += 1
+        for rule, k in Counter(found[run]).items():
+            rules[(tool, s, rule, "files")] += 1; rules[(tool, s, rule, "hits")] += k
+        if tool in SCAN_TOOLS:                 # 快筛不计入 'any' 与 P 类别
+            any_n[fid] = any_n.get(fid, 0) + n
+            for rule in found[run]:
+                for P in rule_p[(tool, rule)]:
+                    ps[P].add(fid)
+    for fid, n in any_n.items():
+        tools[("any", "files")] += 1; tools[("any", "hit_files")] += n > 0; tools[("any", "issues")] += n
+        counts[("any", solc[fid], n)] += 1
+    return {
+        "file": rfile,
+        "tool": {t: (tools[(t, "files")], tools[(t, "hit_files")], tools[(t, "issues")])
+                 for t, c in tools if c == "files" and tools[(t, "files")]},
+        "count": {k: v for k, v in counts.items() if v},
+        "rule": {(t, s, r): (rules[(t, s, r, "files")], rules[(t, s, r, "hits")])
+                 for t, s, r, c in rules if c == "files"},
+        "p": {P: len(f) for P, f in ps.items() if f},
+    }
+
+def stored(db):
+    return {
+        "file": {(r[0], r[1]): (r[2], r[3], r[4]) for r in db.query("SELECT file_id, tool, run_id, n, solc FROM rollup_file")},
+        "tool": {r[0]: (r[1], r[2], r[3]) for r in db.query("SELECT tool, files, hit_files, issues FROM rollup_tool")},
+        "count": {(r[0], r[1], r[2]): r[3] for r in db.query("SELECT tool, solc, n, files FROM rollup_count")},
+        "rule": {(r[0], r[1], r[2]): (r[3], r[4]) for r in db.query("SELECT tool, solc, rule, files, hits FROM rollup_rule")},
+        "p": {r[0]: r[1] for r in db.query("SELECT p, files FROM rollup_p WHERE files > 0")},
+    }
+
+def random_findings(rnd, tool):
+    return [(rnd.choice(RULES[tool]), "", "t", "High", f"L{rnd.randint(1, 99)}") for _ in range(rnd.choice([0, 0, 1, 2, 5]))]
+
+def test_rollups_match_the_findings_table(tmp_path):
+    db = FindingsDB(tmp_path / "findings.db")
+    rnd = random.Random(3)
+    paths = [tmp_path / f"F{i}.sol" for i in range(8)]
+    for step in range(300):
+        op = rnd.random()
+        p = rnd.choice(paths)
+        if op < 0.6:
+            tool = rnd.choice(["slither", "slither", "mythril", "quick_screen"])
+            db.record_run(p, tool, "v", [], step, 0.1, "ok", random_findings(rnd, tool),
+                          solc=rnd.choice(SOLCS) if rnd.random() < 0.3 else "")
+        elif op < 0.75:
+            db.record_runs("quick_screen", "", [], step,
+                           [(q, random_findings(rnd, "quick_screen")) for q in rnd.sample(paths, 3)])
+        elif op < 0.85:
+            db.record_file(p, solc=rnd.choice(SOLCS))                  # 只改 solc：计数整体移到新版本下
+        elif op < 0.9:
+            db.record_compile(p, rnd.choice(SOLCS), True)
+        else:
+            db.set_rule_p((t, r, rnd.choice(["P1", "P2", "P3"])) for t in RULES for r in RULES[t] if rnd.random() < 0.6)
+        assert stored(db) == recomputed(db), step
+    want = recomputed(db)
+    assert want["p"] and want["count"] and len(want["tool"]) == 4
+
+    db.rebuild_rollups()
+    assert stored(db) == want
+    # 升级前的库（没有汇总表）：重新打开时自动补算
+    for t in ("rollup_file", "rollup_tool", "rollup_count", "rollup_rule", "rollup_p"):
+        db.conn.execute(f"DELETE FROM {t}")
+    db.conn.commit()
+    db.close()
+    db = FindingsDB(tmp_path / "findings.db")
+    assert stored(db) == want
+    db.close()
+
+def test_quick_stats_answers_from_rollups(tmp_path):
+    db = FindingsDB(tmp_path / "findings.db")
+    rnd = random.Random(5)
+    for i in range(40):
+        p = tmp_path / f"F{i:02d}.sol"
+        s = SOLCS[i % 3]
+        for tool in ("slither", "mythril"):
+            if rnd.random() < 0.8:
+                for _ in range(rnd.randint(1, 2)):                     # 重跑：只算最近一次
+                    db.record_run(p, tool, "v", [], i, 0.1, "ok", random_findings(rnd, tool), solc=s)
+
+    latest = defaultdict(dict)
+    for r in db.query("""SELECT f.stem, f.solc, r.tool, (SELECT COUNT(*) FROM findings x WHERE x.run_id = r.id)
+                         FROM latest_runs r JOIN files f ON f.id = r.file_id"""):
+        latest[(r[0], r[1])][r[2]] = r[3]
+    for prefix in (None, "0.4", "0.8"):
+        rows = {k: v for k, v in latest.items() if prefix is None or k[1].startswith(prefix + ".")}
+        agg = qs.db_summary(db, prefix)
+        assert agg["files"] == len(rows)
+        for tool, k in (("slither", "s"), ("mythril", "m")):
+            vals = [v[tool] for v in rows.values() if tool in v]
+            assert (agg[f"{k}_files"], agg[f"{k}_min"], agg[f"{k}_max"]) == (len(vals), min(vals), max(vals))
+            assert abs(agg[f"{k}_mean"] - sum(vals) / len(vals)) < 1e-9
+
+        per_rule = defaultdict(lambda: [0, 0])
+        for r in db.query("""SELECT x.rule, COUNT(*) FROM current_findings x JOIN files f ON f.id = x.file_id
+                             WHERE x.tool = 'slither' AND (? IS NULL OR f.solc LIKE ?) GROUP BY x.file_id, x.rule""",
+                          (prefix, f"{prefix}.%")):
+            per_rule[r[0]][0] += 1
+            per_rule[r[0]][1] += r[1]
+        top = qs.db_top_rules(db, "slither", prefix, 10)
+        assert {r["rule"]: [r["files"], r["hits"]] for r in top} == dict(per_rule)
+        assert [r["files"] for r in top] == sorted((r["files"] for r in top), reverse=True)
+
+    ns = sorted((v["slither"] for v in latest.values() if "slither" in v), reverse=True)
+    assert [r["slither_issues"] for r in qs.db_rows(db, "slither", limit=5)] == ns[:5]
+    ge = qs.db_rows(db, "slither", ge=2, ge_tool="mythril")
+    assert len(ge) == sum(1 for v in latest.values() if v.get("mythril", -1) >= 2)
+    db.close()
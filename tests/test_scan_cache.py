@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""scan_cache：键覆盖源码 / solc / 工具 / 参数；按最近使用淘汰；命中直接写出与原扫描相同的结果"""
+import json, os, re, sys
+
+from conftest import sh, stage
+from scan_cache import ScanCache
+
+BASE = ("contract A {}", "0.8.20", "mythril", "0.24.8", ["--execution-timeout", "60"])
+
+def test_key_covers_every_component():
+    k = ScanCache.key(*BASE)
+    assert k == ScanCache.key(*BASE)
+    for i, other in enumerate(["contract B {}", "0.8.19", "slither", "0.24.9", ["--execution-timeout", "90"]]):
+        changed = list(BASE)
+        changed[i] = other
+        assert ScanCache.key(*changed) != k, i
+    # 参数边界不能被拼接抹掉
+    assert ScanCache.key("", "", "t", "v", ["ab", "c"]) != ScanCache.key("", "", "t", "v", ["a", "bc"])
+
+def test_get_put_and_counters(tmp_path):
+    c = ScanCache(tmp_path)
+    k1, k2 = ScanCache.key(*BASE), ScanCache.key("x", *BASE[1:])
+    assert c.get(k1) is None
+    c.put(k1, '{"a": 1}')
+    assert c.get(k1) == '{"a": 1}'
+    # get_any 多个键只计一次
+    assert c.get_any([k2, k1]) == (k1, '{"a": 1}')
+    assert c.get_any([k2, "0" * 64]) == ("", None)
+    assert (c.hits, c.misses) == (2, 2)
+
+    assert c.save_stats("mythril") == {"hits": 2, "misses": 2, "evicted": 0}
+    ScanCache(tmp_path).save_stats("mythril")
+    total = json.loads((tmp_path / "stats.json").read_text(encoding="utf-8"))
+    assert (total["mythril"]["hits"], total["mythril"]["misses"]) == (2, 2)
+
+def test_hits_carry_the_callers_path(tmp_path):
+    # 同内容的两个文件共用一个键：结果中的路径要换成本次扫描的文件
+    c = ScanCache(tmp_path)
+    k = ScanCache.key(*BASE)
+    c.put(k, '{"sourceList": ["/w/flattened/A__flattened.sol"]}', "A__flattened")
+    assert c.get(k, "B__flattened") == '{"sourceList": ["/w/flattened/B__flattened.sol"]}'
+    assert c.get(k, "A__flattened") == '{"sourceList": ["/w/flattened/A__flattened.sol"]}'
+
+def test_evicts_least_recently_used(tmp_path):
+    c = ScanCache(tmp_path, max_bytes=1000)
+    keys = [ScanCache.key(str(i), *BASE[1:]) for i in range(4)]
+    for i, k in enumerate(keys):
+        c.put(k, "x" * 200)
+        os.utime(c._path(k), (1000 + i, 1000 + i))
+    c.get(keys[0])                               # 命中刷新 mtime：最旧的变成 keys[1]
+    c.put(ScanCache.key("new", *BASE[1:]), "x" * 300)     # 1100 > 1000 → 淘汰到 900 以下
+    assert c.evicted == 1
+    assert c.get(keys[1]) is None
+    assert all(c.get(k) is not None for k in (keys[0], keys[2], keys[3]))
+    assert sum(p.stat().st_size for p in tmp_path.glob("??/*.json")) <= 900
+    # 重新打开时按磁盘上的实际大小计
+    assert ScanCache(tmp_path, max_bytes=1000)._size == 900
+
+def test_second_run_is_served_from_cache(bench_tree):
+    tree, env = bench_tree(8)
+    stage("prepare", tree, env)
+    cmd = [sys.executable, "scripts/04_run_mythril.py", "-j", "4", "--no-clusters", "--timeout", "10"]
+    first = sh(cmd, tree, env)
+    reports = {p.name: p.read_bytes() for p in (tree / "out" / "mythril").glob("*.json")}
+    assert reports and "hits=0 " in first
+
+    second = sh(cmd, tree, env)
+    assert re.search(rf"\[CACHE\] hits={len(reports)} misses=0 ", second)
+    assert {p.name: p.read_bytes() for p in (tree / "out" / "mythril").glob("*.json")} == reports
+
+    # 分析参数变了：不能复用
+    third = sh(cmd[:-1] + ["20"], tree, env)
+    assert re.search(rf"\[CACHE\] hits=0 misses={len(reports)} ", third)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""常驻 Slither worker：内存按任务记录增量、按当前 RSS 回收，生命周期峰值单独标为 worker 级"""
+import json, re, sys
+
+from conftest import sh
+
+def test_warm_worker_records_per_job_rss_and_recycles_on_current_rss(bench_tree):
+    tree, env = bench_tree(10)
+    sh([sys.executable, "scripts/01_prepare.py", "-j", "2"], tree, env)
+    metrics = tree / "metrics.jsonl"
+    metrics.unlink(missing_ok=True)
+    # 每个任务留下 20MB 不释放；当前 RSS 超过 120MB 就回收
+    lenv = dict(env, BENCH_LEAK_SLITHER="20000", METRICS_FILE=str(metrics))
+    out = sh([sys.executable, "scripts/03_run_slither.py", "-j", "1", "--no-cache", "--no-clusters",
+              "--recycle-jobs", "0", "--recycle-mb", "120"], tree, lenv)
+
+    jobs = [m for m in map(json.loads, metrics.read_text(encoding="utf-8").splitlines()) if m["tool"] == "slither"]
+    assert len(jobs) > 8
+    for m in jobs:
+        assert m["maxrss_kb"] == 0                              # 不再把生命周期峰值算在单个任务头上
+        assert 15000 <= m["rss_delta_kb"] <= 40000              # 该任务自己增长的部分
+        assert m["worker_maxrss_kb"] >= m["rss_delta_kb"]
+    started, recycled = map(int, re.search(r"started (\d+), recycled (\d+)", out).groups())
+    assert recycled >= 1 and started == recycled + 1
+    assert recycled < len(jobs)                                 # 不是每个任务之后都重启
+
+    sh([sys.executable, "tools/make_report.py", "out", "--db", "out/findings.db", "--metrics", str(metrics),
+        "--emit-md", "out/report.md"], tree, env)
+    md = (tree / "out" / "report.md").read_text(encoding="utf-8")
+    row = re.search(r"^\| slither \| (\d+) \| [^|]+ \| (\d+) \|$", md, re.MULTILINE)
+    assert "worker peak RSS (MB)" in md and row and 15 <= int(row.group(1)) <= 40
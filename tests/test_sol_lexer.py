@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""sol_lexer：注释 / 字符串清洗不改变偏移与行号；命中归到所在的 Contract.function；快筛不再数注释里的关键词"""
+import csv
+
+from conftest import stage
+from sol_lexer import blank_comments_strings, SourceIndex
+
+SRC = b'''// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+/// @notice guards against reentrancy, see Checks-Effects-Interactions
+interface IVault {
+    function withdraw(uint amount) external;    // tx.origin
+}
+contract Vault is IVault {
+    string constant NOTE = "call .call( here // not a comment";
+    bytes1 constant Q = '"';
+    modifier onlyOwner() { require(msg.sender == owner, "owner only: don't"); _; }
+    constructor() { owner = msg.sender; }
+    /* block comment with a "quote
+       and reentrancy */
+    function withdraw(uint amount) external onlyOwner {
+        (bool ok, ) = msg.sender.call{value: amount}("");
+        if (ok) { emit Done("}"); }
+    }
+    receive() external payable { tx.origin; }
+    function () external { }
+}
+library L { function f() internal pure returns (uint) { return 1; } }
+/* unterminated reentrancy'''
+
+def test_blanking_keeps_offsets_and_lines():
+    clean = blank_comments_strings(SRC)
+    assert len(clean) == len(SRC) and clean.count(b"\n") == SRC.count(b"\n")
+    for i, (a, b) in enumerate(zip(SRC, clean)):
+        assert b == a or b == 0x20, i               # 只会变成空格，换行保留
+    low = clean.lower()
+    for gone in (b"reentrancy", b"checks-effects", b"spdx", b"call .call(", b"owner only", b"don't", b"quote"):
+        assert gone not in low, gone
+    assert low.count(b"tx.origin") == 1             # 注释里的那个被清掉，receive 里的保留
+    # 字符串里的 // 和引号不会把后面的代码吞掉
+    for kept in (b"bytes1 constant Q =", b"modifier onlyOwner()", b"msg.sender.call{value: amount}",
+                 b"emit Done(", b"library L"):
+        assert kept in clean, kept
+    assert blank_comments_strings(b"") == b""
+
+def test_functions_are_attributed_to_their_contract():
+    clean = blank_comments_strings(SRC)
+    idx = SourceIndex(clean)
+
+    def at(needle: bytes, nth: int = 0):
+        pos = -1
+        for _ in range(nth + 1):
+            pos = clean.index(needle, pos + 1)
+        return idx.locate(pos)
+
+    # 接口函数没有函数体：落在接口本身
+    assert at(b"function withdraw") == ("IVault", 5)
+    assert at(b"require(msg.sender == owner") == ("Vault.onlyOwner", 10)
+    assert at(b"owner = msg.sender") == ("Vault.constructor", 11)
+    assert at(b".call{value") == ("Vault.withdraw", 15)
+    assert at(b"emit Done") == ("Vault.withdraw", 16)         # 字符串里的 } 不会提前结束函数
+    assert at(b"tx.origin") == ("Vault.receive", 18)
+    assert at(b"function () external { }")[0] == "Vault.fallback"
+    assert at(b"return 1") == ("L.f", 21)
+    assert at(b"pragma solidity") == ("", 2)
+    assert at(b"bytes1 constant Q") == ("Vault", 9)           # 状态变量：在合约内、不在函数内
+    assert idx.line_of(0) == 1 and idx.line_of(len(clean)) == SRC.count(b"\n") + 1
+
+def test_quick_screen_skips_comments_and_reports_functions(bench_tree):
+    tree, env = bench_tree(4)
+    f = tree / "datasets" / "Doc.sol"
+    f.write_bytes(SRC)
+    stage("screen", tree, env)
+    with open(tree / "out" / "quick_screen.csv", newline="", encoding="utf-8") as fp:
+        rows = [r for r in csv.DictReader(fp) if r["file"] == str(f)]
+    got = sorted((r["pattern"], r["function"], int(r["line"])) for r in rows)
+    assert got == sorted([
+        (r"onlyOwner", "Vault.onlyOwner", 10),
+        (r"owner\(", "Vault.onlyOwner", 10),
+        (r"onlyOwner", "Vault.withdraw", 14),
+        (r"tx\.origin", "Vault.receive", 18),
+    ])
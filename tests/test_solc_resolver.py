@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""solc_resolver：pragma 范围（^ ~ >=,< a - b ||、多条取交集）与已安装版本的选择、缓存失效"""
+import json
+
+import pytest
+
+import solc_resolver as sr
+
+VERSIONS = ["0.4.11", "0.4.24", "0.4.26", "0.5.0", "0.5.17", "0.6.12", "0.7.0", "0.7.6",
+            "0.8.0", "0.8.19", "0.8.20", "0.9.0", "1.0.0"]
+
+@pytest.mark.parametrize("pragma, allowed", [
+    ("^0.4.24",                   ["0.4.24", "0.4.26"]),
+    ("^0.0.3",                    []),                          # 0.0.x 的 ^ 只放开 patch
+    ("~0.5.2",                    ["0.5.17"]),
+    ("~1",                        ["1.0.0"]),
+    (">=0.6.0 <0.8.0",            ["0.6.12", "0.7.0", "0.7.6"]),
+    (">=0.4.0<0.6.0",             ["0.4.11", "0.4.24", "0.4.26", "0.5.0", "0.5.17"]),
+    (">= 0.7.0",                  ["0.7.0", "0.7.6", "0.8.0", "0.8.19", "0.8.20", "0.9.0", "1.0.0"]),
+    (">=0.4.22 <0.6.0 || ^0.8.0", ["0.4.24", "0.4.26", "0.5.0", "0.5.17", "0.8.0", "0.8.19", "0.8.20"]),
+    ("0.5.0 - 0.6.12",            ["0.5.0", "0.5.17", "0.6.12"]),
+    ("0.5 - 0.6",                 ["0.5.0", "0.5.17", "0.6.12"]),   # 部分版本的上界包含整个 0.6.x
+    ("0.7",                       ["0.7.0", "0.7.6"]),
+    ("0.8.x",                     ["0.8.0", "0.8.19", "0.8.20"]),
+    (">0.7",                      ["0.8.0", "0.8.19", "0.8.20", "0.9.0", "1.0.0"]),
+    ("<=0.6",                     ["0.4.11", "0.4.24", "0.4.26", "0.5.0", "0.5.17", "0.6.12"]),
+    ("=0.8.19",                   ["0.8.19"]),
+    ("*",                         VERSIONS),
+])
+def test_range_semantics(pragma, allowed):
+    clauses = sr.parse_pragmas(f"pragma solidity {pragma};")
+    assert [v for v in VERSIONS if sr.satisfies(sr.parse_version(v), clauses)] == allowed
+
+def test_multiple_pragmas_intersect():
+    clauses = sr.parse_pragmas("pragma solidity ^0.8.0;\ncontract A {}\npragma solidity <0.8.20;\n")
+    assert [v for v in VERSIONS if sr.satisfies(sr.parse_version(v), clauses)] == ["0.8.0", "0.8.19"]
+
+def install(home, *versions):
+    for v in versions:
+        d = home / ".solc-select" / "artifacts" / f"solc-{v}"
+        d.mkdir(parents=True, exist_ok=True)
+        (d / d.name).write_text("#!/bin/sh\n")
+        (d / d.name).chmod(0o755)
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("VIRTUAL_ENV", raising=False)
+    monkeypatch.setenv("SOLCX_BINARY_PATH", str(tmp_path / "solcx"))
+    return tmp_path
+
+def test_picks_highest_installed_and_returns_its_path(home):
+    install(home, "0.4.24", "0.4.26", "0.8.19", "0.8.20")
+    (home / "solcx").mkdir()
+    (home / "solcx" / "solc-v0.7.6").write_text("#!/bin/sh\n")
+    (home / "solcx" / "solc-v0.7.6").chmod(0o755)
+    r = sr.SolcResolver()
+    bin_dir = home / ".solc-select" / "artifacts"
+    assert r.resolve_text("pragma solidity ^0.4.0;") == ("0.4.26", str(bin_dir / "solc-0.4.26" / "solc-0.4.26"))
+    assert r.resolve_text("pragma solidity >=0.8.0 <0.8.20;")[0] == "0.8.19"
+    assert r.resolve_text("pragma solidity >=0.6.0 <0.8.0;") == ("0.7.6", str(home / "solcx" / "solc-v0.7.6"))
+    # 没有满足的已安装版本：退回代表版本，路径为空由调用方兜底
+    assert r.resolve_text("pragma solidity ^0.5.0;") == ("0.5.17", "")
+    assert r.resolve_text("contract NoPragma {}") == ("", "")
+
+def test_cache_is_dropped_when_installed_set_changes(home):
+    install(home, "0.8.19")
+    cache = home / "resolve.json"
+    text = "pragma solidity ^0.8.0;"
+    r = sr.SolcResolver(cache)
+    assert r.resolve_text(text)[0] == "0.8.19"
+    r.save()
+    assert json.loads(cache.read_text(encoding="utf-8"))["installed"] == ["0.8.19"]
+
+    r2 = sr.SolcResolver(cache)
+    r2.pick = None                      # 命中缓存时不再解析
+    assert r2.resolve_text(text)[0] == "0.8.19"
+
+    install(home, "0.8.20")
+    assert sr.SolcResolver(cache).resolve_text(text) == ("0.8.20", str(
+        home / ".solc-select" / "artifacts" / "solc-0.8.20" / "solc-0.8.20"))
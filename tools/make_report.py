@@ -6,9 +6,25 @@ make_report.py
 - 解析每个文件的 Mythril/Slither 结果，列出命中的 SWC、detector、标题
 - 计算工具命中率
 - （新增）加载 config/p_mapping.yaml，将 SWC / detector 映射到 P1..P15
-  输出每个文件命中的 P 类别 & 各 P 的命中率
+  输出每个文件命中的 P 类别 & 各 P 的命中率；映射在加载时编译成 PIndex（SWC 哈希表 + detector 前缀树）
+- --db out/findings.db：直接查询 SQLite 结果库（findings_db.py）而不是 summary.csv + 每个文件的 JSON；
+  启用 --pmap 时把各 rule 的 P 类别写回库中 rule_p 表，供后续 SQL 查询
+- （新增）Performance：读取 out/metrics.jsonl（scan_pool.run 记录的每次 solc/forge/slither/myth
+  子进程开销），输出最慢文件、各工具耗时 p50/p95/p99、内存峰值、各 solc 版本的耗时
+- Slither JSON 只读取 results.detectors[*]（check / impact / confidence / 首个源码位置）；
+  用 ijson（requirements.txt）流式解析，内存与 JSON 大小无关（未安装时告警并退回 json.load）；
+  各文件的解析在进程池中并行
 """
-import json, csv, argparse, pathlib, collections, sys
+import json, csv, argparse, pathlib, collections, itertools, sys, os, math
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+try:
+    import ijson  # 可选：流式解析大 JSON（pip install ijson）
+except Exception:
+    ijson = None
 
 def read_json(p):
     try:
@@ -29,28 +45,91 @@ def mythril_findings(myth):
         if title: titles.add(str(title).strip())
     return len(issues), swcs, titles
 
+def _first_location(det):
+    """首个 element 的源码位置 → "file:line"（没有则空串）"""
+    for el in det.get("elements") or []:
+        sm = el.get("source_mapping") or {}
+        lines = sm.get("lines") or []
+        fname = sm.get("filename_short") or sm.get("filename_relative") or ""
+        if lines:
+            return f"{fname}:{lines[0]}" if fname else str(lines[0])
+    return ""
+
+def _finding(det):
+    if not isinstance(det, dict):
+        return None
+    check = det.get("check")
+    if not isinstance(check, str):
+        return None
+    return (check.strip(), str(det.get("impact") or ""), str(det.get("confidence") or ""), _first_location(det))
+
 def slither_findings(sli):
-    if not sli: 
-        return 0, set()
-    detectors, count = set(), 0
-
-    def try_collect(obj):
-        nonlocal count
-        if isinstance(obj, dict):
-            if "check" in obj and isinstance(obj["check"], str):
-                detectors.add(obj["check"].strip()); count += 1
-            if "description" in obj and isinstance(obj["description"], dict):
-                c = obj["description"].get("check")
-                if isinstance(c, str):
-                    detectors.add(c.strip()); count += 1
-            for v in obj.values():
-                try_collect(v)
-        elif isinstance(obj, list):
-            for v in obj:
-                try_collect(v)
-
-    try_collect(sli)
-    return count, detectors
+    """
+    只看 results.detectors[*]：每个检测结果计一次（不再遍历整棵树、也不会重复计数）
+    返回：(条数, detector 集合, [(check, impact, confidence, location)])
+    """
+    if not sli or not isinstance(sli, dict):
+        return 0, set(), []
+    dets = (sli.get("results") or {}).get("detectors") or []
+    items = [x for x in map(_finding, dets) if x]
+    return len(items), {x[0] for x in items}, items
+
+def slither_findings_file(p):
+    """同 slither_findings，但直接读文件；有 ijson 时逐条流式解析 detectors"""
+    p = pathlib.Path(p)
+    if not p.exists():
+        return 0, set(), []
+    if ijson is None:
+        return slither_findings(read_json(p))
+    items = []
+    try:
+        with open(p, "rb") as f:
+            for det in ijson.items(f, "results.detectors.item"):
+                x = _finding(det)
+                if x: items.append(x)
+    except Exception:
+        return 0, set(), []
+    return len(items), {x[0] for x in items}, items
+
+def load_file_findings(outdir, base):
+    """进程池任务：读取一个文件的 Mythril / Slither 结果"""
+    outdir = pathlib.Path(outdir)
+    m_cnt, m_swcs, m_titles = mythril_findings(read_json(outdir / (base + ".myth.json")))
+    s_cnt, s_detectors, s_items = slither_findings_file(outdir / (base + ".slither.json"))
+    impacts = collections.Counter(x[1] for x in s_items if x[1])
+    return m_cnt, m_swcs, m_titles, s_cnt, s_detectors, impacts
+
+def load_chunk(outdir, bases):
+    """进程池任务：一批文件（减少进程间往返）"""
+    return [load_file_findings(outdir, b) for b in bases]
+
+def csv_findings(summary_csv, outdir, workers, chunk=64):
+    """
+    逐行读取 summary.csv，产出与 db_findings 相同的 (summary 行, 文件名, 结果元组)。
+    workers > 1 时按 chunk 个文件一批提交到进程池，在途批次不超过 workers*4，按输入顺序产出
+    """
+    with open(summary_csv, newline="") as f:
+        rows = csv.DictReader(f)
+        if workers <= 1:
+            for r in rows:
+                base = pathlib.Path(r.get("file_path") or r.get("file")).name
+                yield r, base, load_file_findings(outdir, base)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            pending = collections.deque()
+            def drain():
+                rs, bases, fut = pending.popleft()
+                yield from zip(rs, bases, fut.result())
+            while True:
+                rs = list(itertools.islice(rows, chunk))
+                if not rs:
+                    break
+                bases = [pathlib.Path(r.get("file_path") or r.get("file")).name for r in rs]
+                pending.append((rs, bases, ex.submit(load_chunk, str(outdir), bases)))
+                if len(pending) >= workers * 4:
+                    yield from drain()
+            while pending:
+                yield from drain()
 
 def load_pmap(yaml_path):
     """
@@ -84,28 +163,209 @@ def load_pmap(yaml_path):
         norm[key] = {"name": name, "mythril_swc": swcs, "slither": dets}
     return norm
 
-def map_to_p(per_file_item, pmap):
+class PIndex:
+    """
+    P 映射编译后的查找结构（加载时构建一次）：
+    - swc:  SWC-ID -> P 集合（精确匹配）
+    - trie: detector 前缀树，节点上的 "$" 记录以该前缀结尾的 P 集合
+      （配置中写 reentrancy 则 reentrancy-* 也算；精确匹配是前缀匹配的特例）
+    - 每个 detector 名只在 trie 上走一次，结果记入 _det_memo
+    """
+    def __init__(self, pmap):
+        self.swc = collections.defaultdict(set)
+        self.trie = {}
+        for P, rule in pmap.items():
+            for s in rule["mythril_swc"]:
+                self.swc[s].add(P)
+            for pat in rule["slither"]:
+                node = self.trie
+                for ch in pat:
+                    node = node.setdefault(ch, {})
+                node.setdefault("$", set()).add(P)
+        self._det_memo = {}
+
+    def det_ps(self, d):
+        ps = self._det_memo.get(d)
+        if ps is None:
+            acc = set()
+            node = self.trie
+            acc.update(node.get("$", ()))
+            for ch in d:
+                node = node.get(ch)
+                if node is None:
+                    break
+                acc.update(node.get("$", ()))
+            ps = self._det_memo[d] = frozenset(acc)
+        return ps
+
+def map_to_p(swcs, dets, pindex):
     """
-    根据 pmap 把当前文件的 {swcs, detectors} 映射到若干 P 类别
+    根据编译好的 PIndex 把当前文件的 SWC / detector 集合映射到若干 P 类别
     返回：命中的P集合(set) 与 命中明细 dict(P -> {"swc":{...}, "det":{...}})
     """
-    swcs = set(filter(None, (per_file_item.get("mythril_swcs") or "").split(";")))
-    dets = set(filter(None, (per_file_item.get("slither_detectors") or "").split(";")))
-    ps_hit = set()
     detail = {}
-    for P, rule in pmap.items():
-        s_hit = swcs & rule["mythril_swc"] if rule["mythril_swc"] else set()
-        d_hit = set()
-        if rule["slither"]:
-            # 支持前缀匹配：配置中写 reentrancy 则 reentrancy-* 也算
-            for pat in rule["slither"]:
-                for d in dets:
-                    if d == pat or d.startswith(pat):
-                        d_hit.add(d)
-        if s_hit or d_hit:
-            ps_hit.add(P)
-            detail[P] = {"swc": s_hit, "det": d_hit}
-    return ps_hit, detail
+    for s in swcs:
+        for P in pindex.swc.get(s, ()):
+            detail.setdefault(P, {"swc": set(), "det": set()})["swc"].add(s)
+    for d in dets:
+        for P in pindex.det_ps(d):
+            detail.setdefault(P, {"swc": set(), "det": set()})["det"].add(d)
+    return set(detail), detail
+
+def db_findings(db):
+    """
+    从结果库取每个文件每个工具最近一次运行的发现；
+    逐个产出 (summary 行, 文件名, load_file_findings 同结构的元组)，按路径排序
+    （单条查询按路径有序流式读取，同一文件的发现相邻，内存只保留当前文件）
+    """
+    rows = db.iter_query("""
+        SELECT f.id, f.path, x.tool, x.rule, x.title, x.severity FROM files f
+        LEFT JOIN current_findings x ON x.file_id = f.id AND x.tool IN ('slither', 'mythril')
+        WHERE EXISTS (SELECT 1 FROM latest_runs r WHERE r.file_id = f.id AND r.tool IN ('slither', 'mythril'))
+        ORDER BY f.path""")
+    cur, a = None, None
+    for x in rows:
+        if cur is None or x["id"] != cur["id"]:
+            if cur is not None:
+                yield _db_item(cur["path"], a)
+            cur, a = x, [0, set(), set(), 0, set(), collections.Counter()]
+        if x["tool"] == "mythril":
+            a[0] += 1
+            if x["rule"]: a[1].add(x["rule"])
+            if x["title"]: a[2].add(x["title"])
+        elif x["tool"] == "slither":
+            a[3] += 1
+            a[4].add(x["rule"])
+            if x["severity"]: a[5][x["severity"]] += 1
+    if cur is not None:
+        yield _db_item(cur["path"], a)
+
+def _db_item(path, a):
+    r = {"file": path, "slither_issues": a[3], "mythril_issues": a[0]}
+    return r, pathlib.Path(path).name, tuple(a)
+
+def store_rule_p(db, pindex):
+    """把库中出现过的每个 rule 经 PIndex 展开后写入 rule_p（SQL 侧即可按 P 类别聚合）"""
+    pairs = []
+    for x in db.query("SELECT DISTINCT tool, rule FROM findings WHERE tool IN ('slither', 'mythril')"):
+        ps = pindex.swc.get(x["rule"], ()) if x["tool"] == "mythril" else pindex.det_ps(x["rule"])
+        pairs.extend((x["tool"], x["rule"], P) for P in ps)
+    db.set_rule_p(pairs)
+
+def percentile(sorted_vals, q):
+    """最近秩百分位；sorted_vals 需已排序"""
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[max(0, math.ceil(q * len(sorted_vals)) - 1)]
+
+def load_metrics(path):
+    """逐行读取 metrics.jsonl 并聚合；文件不存在返回 None"""
+    p = pathlib.Path(path)
+    if not p.exists():
+        return None
+    walls = collections.defaultdict(list)                 # tool -> [wall]
+    per_file = collections.Counter()                      # (tool, file) -> 总墙钟
+    peak = {}                                             # tool -> (maxrss_kb, file)
+    grow = {}                                             # tool -> (rss_delta_kb, file)：常驻 worker 中单个任务的 RSS 增量
+    worker_peak = collections.Counter()                   # tool -> 常驻 worker 的生命周期峰值（kb）
+    cpu = collections.Counter()                           # tool -> user+sys
+    by_solc = collections.defaultdict(lambda: [0, 0.0])   # solc -> [次数, 总墙钟]
+    with open(p, encoding="utf-8") as f:
+        for line in f:
+            try:
+                m = json.loads(line)
+            except ValueError:
+                continue
+            tool, wall = m.get("tool") or "?", float(m.get("wall") or 0)
+            walls[tool].append(wall)
+            per_file[(tool, m.get("file") or "")] += wall
+            cpu[tool] += float(m.get("utime") or 0) + float(m.get("stime") or 0)
+            rss = int(m.get("maxrss_kb") or 0)
+            if rss > peak.get(tool, (-1, ""))[0]:
+                peak[tool] = (rss, m.get("file") or "")
+            if "worker_maxrss_kb" in m:
+                d = int(m.get("rss_delta_kb") or 0)
+                if d > grow.get(tool, (-1, ""))[0]:
+                    grow[tool] = (d, m.get("file") or "")
+                worker_peak[tool] = max(worker_peak[tool], int(m.get("worker_maxrss_kb") or 0))
+            s = by_solc[m.get("solc") or "unknown"]
+            s[0] += 1; s[1] += wall
+    for v in walls.values():
+        v.sort()
+    return {"walls": walls, "per_file": per_file, "peak": peak, "cpu": cpu, "by_solc": by_solc,
+            "grow": grow, "worker_peak": worker_peak}
+
+def perf_section(m, top=15):
+    md = ["## Performance（子进程开销，来自 metrics.jsonl）\n"]
+    md.append("| tool | runs | total wall (s) | cpu (s) | p50 | p95 | p99 | max | peak RSS (MB) | peak file |")
+    md.append("|---|---:|---:|---:|---:|---:|---:|---:|---:|---|")
+    for tool in sorted(m["walls"]):
+        w = m["walls"][tool]
+        rss, f = m["peak"].get(tool, (0, ""))
+        md.append(f"| {tool} | {len(w)} | {sum(w):.1f} | {m['cpu'][tool]:.1f} | {percentile(w, .5):.2f} | "
+                  f"{percentile(w, .95):.2f} | {percentile(w, .99):.2f} | {w[-1]:.2f} | {rss/1024:.0f} | {f or '-'} |")
+    if m["worker_peak"]:
+        # 常驻 worker 里的任务没有单独的峰值：列出单个任务的最大 RSS 增量与 worker 级峰值
+        md.append("\n| tool (warm workers) | max job RSS growth (MB) | file | worker peak RSS (MB) |")
+        md.append("|---|---:|---|---:|")
+        for tool in sorted(m["worker_peak"]):
+            d, f = m["grow"].get(tool, (0, ""))
+            md.append(f"| {tool} | {d/1024:.0f} | {f or '-'} | {m['worker_peak'][tool]/1024:.0f} |")
+    md.append("\n### Slowest files\n")
+    for (tool, f), wall in m["per_file"].most_common(top):
+        md.append(f"- {f or '-'} ({tool}): {wall:.1f}s")
+    md.append("\n### Time per solc version\n")
+    for ver, (n, wall) in sorted(m["by_solc"].items(), key=lambda kv: -kv[1][1]):
+        md.append(f"- {ver}: {wall:.1f}s total, {n} runs, {wall/n:.2f}s avg")
+    md.append("")
+    return md
+
+FIELDS = ["file", "slither_issues", "mythril_issues", "mythril_swcs", "mythril_titles",
+          "slither_detectors", "slither_impacts", "P_hits", "P_detail"]
+
+class PagedTable:
+    """
+    Per-file 表按 page_size 行分页写入 <报告名>_files_NNNN.md（与报告同目录）；
+    每页写满立即关闭，运行中即可打开已完成的页。旧运行遗留的多余分页在开始时删除。
+    """
+    def __init__(self, index_md, cols, page_size):
+        index_md = pathlib.Path(index_md)
+        self.dir, self.stem = index_md.parent, index_md.stem
+        self.index_name = index_md.name
+        self.cols, self.page_size = cols, max(1, page_size)
+        self.pages = []          # [(文件名, 首个文件, 末个文件, 行数)]
+        self.f = None
+        for old in self.dir.glob(f"{self.stem}_files_*.md"):
+            old.unlink()
+
+    def add(self, item):
+        if self.f is None:
+            name = f"{self.stem}_files_{len(self.pages) + 1:04d}.md"
+            self.pages.append([name, item["file"], item["file"], 0])
+            self.f = open(self.dir / name, "w", encoding="utf-8")
+            self.f.write(f"# Per-file Findings — page {len(self.pages)}\n\n[← {self.index_name}]({self.index_name})\n\n")
+            self.f.write("| " + " | ".join(self.cols) + " |\n")
+            self.f.write("|" + "|".join(["---"] * len(self.cols)) + "|\n")
+        self.f.write("| " + " | ".join(str(item.get(k, "") or "-") for k in self.cols) + " |\n")
+        page = self.pages[-1]
+        page[2] = item["file"]
+        page[3] += 1
+        if page[3] >= self.page_size:
+            self.close()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def index(self):
+        """主报告中的分页目录"""
+        md = ["| page | files | first | last |", "|---|---:|---|---|"]
+        start = 1
+        for name, first, last, n in self.pages:
+            md.append(f"| [{name}]({name}) | {start}–{start + n - 1} | {first} | {last} |")
+            start += n
+        return md
 
 def main():
     ap = argparse.ArgumentParser()
@@ -113,89 +373,102 @@ def main():
     ap.add_argument("--emit-md", default="out/report.md")
     ap.add_argument("--emit-csv", default="out/findings.csv")
     ap.add_argument("--pmap", default="", help="P 映射 YAML 路径，如 config/p_mapping.yaml")
+    ap.add_argument("--metrics", default="", help="子进程开销记录（默认 <outdir>/metrics.jsonl；不存在则跳过 Performance 段）")
+    ap.add_argument("--db", default="", help="SQLite 结果库（如 out/findings.db）；给出时不再读取 summary.csv / JSON")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="并行解析结果 JSON 的进程数")
+    ap.add_argument("--page-size", type=int, default=1000, help="Per-file 表每个分页文件的行数")
     args = ap.parse_args()
 
     outdir = pathlib.Path(args.outdir)
-    summary_csv = outdir / "summary.csv"
-    if not summary_csv.exists():
-        print(f"[ERR] 找不到 {summary_csv}", file=sys.stderr)
-        sys.exit(1)
-
-    rows = list(csv.DictReader(open(summary_csv)))
     pmap = load_pmap(args.pmap) if args.pmap else {}
+    pindex = PIndex(pmap) if pmap else None
+    db = None
+    if args.db:
+        from findings_db import FindingsDB
+        if not pathlib.Path(args.db).exists():
+            print(f"[ERR] 找不到 {args.db}", file=sys.stderr)
+            sys.exit(1)
+        db = FindingsDB(pathlib.Path(args.db))
+        results = db_findings(db)
+    else:
+        summary_csv = outdir / "summary.csv"
+        if not summary_csv.exists():
+            print(f"[ERR] 找不到 {summary_csv}", file=sys.stderr)
+            sys.exit(1)
+        if ijson is None:
+            print("[WARN] 缺少 ijson，Slither JSON 将整个读入内存；执行 pip install ijson（见 requirements.txt）可流式解析。",
+                  file=sys.stderr)
+        results = csv_findings(summary_csv, outdir, args.workers)
 
-    myth_any = 0
-    slit_any = 0
+    # 聚合量只按规则 / 类别计数，大小与文件数无关；逐文件的行直接写入 CSV 与分页表
+    total = myth_any = slit_any = any_hit = 0
     myth_swc_freq = collections.Counter()
     myth_title_freq = collections.Counter()
     slit_detector_freq = collections.Counter()
-    p_freq = collections.Counter()
-
-    per_file = []
-
-    for r in rows:
-        fname = r.get("file_path") or r.get("file")
-        base = pathlib.Path(fname).name
-        myth_p = outdir / (base + ".myth.json")
-        slit_p = outdir / (base + ".slither.json")
-
-        myth = read_json(myth_p)
-        slit = read_json(slit_p)
-
-        m_cnt, m_swcs, m_titles = mythril_findings(myth)
-        s_cnt, s_detectors = slither_findings(slit)
-
-        if m_cnt > 0: myth_any += 1
-        if s_cnt > 0: slit_any += 1
-
-        myth_swc_freq.update(m_swcs)
-        myth_title_freq.update(m_titles)
-        slit_detector_freq.update(s_detectors)
-
-        item = {
-            "file": base,
-            "slither_issues": int(r.get("slither_issues") or 0),
-            "mythril_issues": int(r.get("mythril_issues") or 0),
-            "mythril_swcs": ";".join(sorted(m_swcs)) if m_swcs else "",
-            "mythril_titles": ";".join(sorted(m_titles)) if m_titles else "",
-            "slither_detectors": ";".join(sorted(s_detectors)) if s_detectors else "",
-        }
-
-        # P 映射
-        if pmap:
-            ps_hit, detail = map_to_p(item, pmap)
-            for P in ps_hit:
-                p_freq.update([P])
-            item["P_hits"] = ";".join(sorted(ps_hit))
-            # 人类可读的 P->(swc|det) 汇总
-            pretty = []
-            for P in sorted(ps_hit):
-                part = []
-                if detail[P]["swc"]:
-                    part.append("SWC=" + "|".join(sorted(detail[P]["swc"])))
-                if detail[P]["det"]:
-                    part.append("Det=" + "|".join(sorted(detail[P]["det"])))
-                pretty.append(f"{P}({','.join(part)})")
-            item["P_detail"] = ";".join(pretty)
-        else:
-            item["P_hits"] = ""
-            item["P_detail"] = ""
-
-        per_file.append(item)
-
-    total = len(rows)
-    hit_rate_myth = myth_any / total if total else 0.0
-    hit_rate_slit = slit_any / total if total else 0.0
-    hit_rate_any = sum(1 for x in per_file if (x["slither_issues"]>0 or x["mythril_issues"]>0)) / total if total else 0.0
+    p_freq = collections.Counter()          # 命中过该 P 的文件数（文件层去重）
+
+    cols = ["file","slither_issues","mythril_issues","mythril_swcs","mythril_titles","slither_detectors"]
+    if pmap:
+        cols += ["P_hits","P_detail"]
+    pathlib.Path(args.emit_md).parent.mkdir(parents=True, exist_ok=True)
+    table = PagedTable(args.emit_md, cols, args.page_size)
 
-    # 写 CSV
-    header = list(per_file[0].keys()) if per_file else ["file"]
     with open(args.emit_csv, "w", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=header)
+        w = csv.DictWriter(f, fieldnames=FIELDS)
         w.writeheader()
-        w.writerows(per_file)
+        for r, base, (m_cnt, m_swcs, m_titles, s_cnt, s_detectors, s_impacts) in results:
+            total += 1
+            if m_cnt > 0: myth_any += 1
+            if s_cnt > 0: slit_any += 1
+
+            myth_swc_freq.update(m_swcs)
+            myth_title_freq.update(m_titles)
+            slit_detector_freq.update(s_detectors)
+
+            item = {
+                "file": base,
+                "slither_issues": int(r.get("slither_issues") or 0),
+                "mythril_issues": int(r.get("mythril_issues") or 0),
+                "mythril_swcs": ";".join(sorted(m_swcs)) if m_swcs else "",
+                "mythril_titles": ";".join(sorted(m_titles)) if m_titles else "",
+                "slither_detectors": ";".join(sorted(s_detectors)) if s_detectors else "",
+                "slither_impacts": ";".join(f"{k}:{v}" for k, v in sorted(s_impacts.items())),
+                "P_hits": "",
+                "P_detail": "",
+            }
+            if item["slither_issues"] > 0 or item["mythril_issues"] > 0:
+                any_hit += 1
 
-    # 写 Markdown
+            # P 映射
+            if pmap:
+                ps_hit, detail = map_to_p(m_swcs, s_detectors, pindex)
+                p_freq.update(ps_hit)
+                item["P_hits"] = ";".join(sorted(ps_hit))
+                # 人类可读的 P->(swc|det) 汇总
+                pretty = []
+                for P in sorted(ps_hit):
+                    part = []
+                    if detail[P]["swc"]:
+                        part.append("SWC=" + "|".join(sorted(detail[P]["swc"])))
+                    if detail[P]["det"]:
+                        part.append("Det=" + "|".join(sorted(detail[P]["det"])))
+                    pretty.append(f"{P}({','.join(part)})")
+                item["P_detail"] = ";".join(pretty)
+
+            w.writerow(item)
+            table.add(item)
+    table.close()
+
+    if db is not None:
+        if pindex:
+            store_rule_p(db, pindex)
+        db.close()
+
+    hit_rate_myth = myth_any / total if total else 0.0
+    hit_rate_slit = slit_any / total if total else 0.0
+    hit_rate_any = any_hit / total if total else 0.0
+
+    # 写 Markdown（主报告只含汇总与分页目录）
     md = []
     md.append(f"# Batch Report ({total} files)\n")
     md.append("## Hit Rates\n")
@@ -205,16 +478,9 @@ def main():
 
     if pmap:
         md.append("## P 类别命中率（文件层去重）\n")
-        # 计算：命中过该 P 的文件数 / 总数
-        # 我们已在 p_freq 中累计“每个命中过 P 的文件一次”
-        # 需要从 per_file 逐个文件统计命中过的 P（去重）
-        per_p_counts = collections.Counter()
-        for item in per_file:
-            if item["P_hits"]:
-                for P in item["P_hits"].split(";"):
-                    per_p_counts[P] += 1
+        # 命中过该 P 的文件数 / 总数
         for P in sorted(pmap.keys()):
-            n = per_p_counts.get(P, 0)
+            n = p_freq.get(P, 0)
             rate = (n/total) if total else 0.0
             name = pmap[P]["name"]
             md.append(f"- {P} ({name}): **{rate:.2%}**  （{n}/{total}）")
@@ -233,18 +499,18 @@ def main():
         for P, c in p_freq.most_common(15):
             md.append(f"- {P} ({pmap[P]['name']}): {c}")
 
+    metrics = load_metrics(args.metrics or outdir / "metrics.jsonl")
+    if metrics:
+        md.append("")
+        md.extend(perf_section(metrics))
+
     md.append("\n## Per-file Findings\n")
-    cols = ["file","slither_issues","mythril_issues","mythril_swcs","mythril_titles","slither_detectors"]
-    if pmap:
-        cols += ["P_hits","P_detail"]
-    md.append("| " + " | ".join(cols) + " |")
-    md.append("|" + "|".join(["---"]*len(cols)) + "|")
-    for r in per_file:
-        md.append("| " + " | ".join(str(r.get(k,"") or "-") for k in cols) + " |")
+    md.append(f"{total} files in {len(table.pages)} pages (≤{table.page_size} rows each); full rows also in {args.emit_csv}\n")
+    md.extend(table.index())
 
     pathlib.Path(args.emit_md).write_text("\n".join(md), encoding="utf-8")
 
-    print(f"[OK] Wrote Markdown -> {args.emit_md}")
+    print(f"[OK] Wrote Markdown -> {args.emit_md} (+{len(table.pages)} pages)")
     print(f"[OK] Wrote CSV      -> {args.emit_csv}")
     print(f"HitRates: mythril={hit_rate_myth:.2%} slither={hit_rate_slit:.2%} any={hit_rate_any:.2%}")
     if pmap:
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pipeline.py — 流式全流程编排（prepare → screen → slither / mythril → report）
+Streaming orchestrator: each file moves to the next stage as soon as its
+upstream stage is done, instead of every stage waiting for the whole corpus.
+
+- 每个阶段是一个有界队列 + 固定数量的 worker 线程（真正的工作在 solc / slither / myth
+  子进程里，线程只负责等待）；下游队列满时上游阻塞，形成背压，内存与在途文件数有界。
+  Mythril 的优先队列例外，不设上限（元素只是路径），才能在所有已筛完的文件中按风险排序
+- prepare：增量清单 / 去重逻辑与 01_prepare.py 相同（共用 Preparer）；flatten 在主线程串行，
+  按 solc 版本攒批后进入并行的编译阶段（与 01 相同的 --standard-json 批量编译；编译阶段有空闲 worker 时
+  不等攒满，先送出最大的一批）；未变化的入口直接送往下游
+- screen：对入口源码做 02 的快筛，命中分数决定 Mythril 队列中的优先级（高风险先跑）；
+  quick_screen.csv 只替换本次筛过的文件的行，LIST / LIMIT / FILE 等部分运行不会丢掉其他文件的结果
+- slither / mythril：同一文件筛完后同时进入两个扫描队列，各自限流
+- report：全部结束后用 make_report.py --db 从结果库生成报告
+
+环境变量（与 tools/00_fullscan.sh 相同的旋钮，命令行参数优先）：
+  LIMIT=N          最多处理的入口文件数（默认全部）
+  PARALLEL=N       各阶段默认并发数（默认 4）
+  ONLY=slither|mythril
+  LIST=list.txt    文件清单（每行一个路径；work/flattened/ 下的文件跳过 prepare）
+  FILE=a.sol       单个文件
+  MYTH_TIMEOUT / MYTH_DEPTH
+
+用法 / Usage:
+  python3 tools/pipeline.py
+  LIMIT=50 PARALLEL=8 ONLY=mythril python3 tools/pipeline.py
+  python3 tools/pipeline.py --file datasets/A.sol --mythril-workers 2
+"""
+import argparse, csv, importlib, itertools, os, queue, subprocess, sys, threading, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+prepare = importlib.import_module("01_prepare")
+screen = importlib.import_module("02_quick_screen")
+slither = importlib.import_module("03_run_slither")
+mythril = importlib.import_module("04_run_mythril")
+from scan_pool import which, tool_version, default_workers
+from scan_cache import ScanCache, DEFAULT_MAX_MB
+from findings_db import DEFAULT_DB, open_db
+from artifacts import compile_failed_stems
+from myth_schedule import Slot, CATEGORY_BONUS
+
+DONE = object()
+
+class Stage:
+    """有界（可按优先级出队的）队列 + workers 个线程；fn 抛异常只记失败，不影响其他文件"""
+    def __init__(self, name, fn, workers, maxsize, priority=False):
+        self.name, self.fn, self.workers = name, fn, max(1, workers)
+        self.q = queue.PriorityQueue(maxsize) if priority else queue.Queue(maxsize)
+        self.seq = itertools.count()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.done = self.failed = 0
+        self.running = 0
+        self.busy = 0.0
+
+    def put(self, item, prio=0.0):
+        self.q.put((prio, next(self.seq), item))
+
+    def idle(self) -> bool:
+        """队列为空且有 worker 空着"""
+        with self.lock:
+            return self.q.empty() and self.running < self.workers
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def _loop(self):
+        while True:
+            _, _, item = self.q.get()
+            if item is DONE:
+                return
+            t0 = time.monotonic()
+            with self.lock:
+                self.running += 1
+            try:
+                res = self.fn(item)
+            except Exception as e:
+                print(f"[ERR] {self.name}: {item}: {e!r}")
+                res = False
+            # fn 可返回 (成功数, 失败数)：一个任务包含多个文件时（批量编译）按文件计数
+            ok, bad = res if isinstance(res, tuple) else (res is not False, res is False)
+            with self.lock:
+                self.running -= 1
+                self.busy += time.monotonic() - t0
+                self.done += ok
+                self.failed += bad
+
+    def close(self):
+        """上游已全部送完：每个 worker 一个结束标记，排在所有真实任务之后"""
+        for _ in self.threads:
+            self.q.put((float("inf"), next(self.seq), DONE))
+        for t in self.threads:
+            t.join()
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name) or default)
+    except ValueError:
+        return default
+
+def read_targets(list_file, one_file):
+    if one_file:
+        paths = [one_file]
+    elif list_file:
+        paths = [x.strip() for x in Path(list_file).read_text(encoding="utf-8").splitlines() if x.strip()]
+    else:
+        return None
+    return [p if p.is_absolute() else (ROOT / p) for p in map(Path, paths)]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limit", type=int, default=env_int("LIMIT", 0), help="最多处理的入口文件数，0 为全部（默认取 LIMIT）")
+    ap.add_argument("-j", "--workers", type=int, default=default_workers(), help="各阶段默认并发数（默认取 PARALLEL 或 4）")
+    ap.add_argument("--prepare-workers", type=int, help="编译并发数")
+    ap.add_argument("--batch", type=int, default=prepare.BATCH_FILES,
+                    help="同一 solc 版本每次 --standard-json 编译的文件数（与 01_prepare.py 相同）；1 为逐个编译")
+    ap.add_argument("--slither-workers", type=int, help="Slither 并发数")
+    ap.add_argument("--mythril-workers", type=int, help="Mythril 并发数")
+    ap.add_argument("--queue", type=int, default=0, help="每个阶段队列的容量（默认为该阶段并发数的 2 倍）")
+    ap.add_argument("--only", choices=["slither", "mythril"], default=os.environ.get("ONLY") or None)
+    ap.add_argument("--list", default=os.environ.get("LIST") or "", help="文件清单（默认取 LIST）")
+    ap.add_argument("--file", default=os.environ.get("FILE") or "", help="单个文件（默认取 FILE）")
+    ap.add_argument("--timeout", type=int, default=env_int("MYTH_TIMEOUT", 60), help="Mythril --execution-timeout")
+    ap.add_argument("--depth", type=int, default=env_int("MYTH_DEPTH", 80), help="Mythril --max-depth")
+    ap.add_argument("--force", action="store_true", help="忽略增量清单，全部重新 flatten + 编译")
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--no-artifacts", action="store_true")
+    ap.add_argument("--db", default=str(DEFAULT_DB))
+    ap.add_argument("--no-db", action="store_true")
+    ap.add_argument("--no-report", action="store_true")
+    args = ap.parse_args()
+    started = time.time()
+
+    use_slither = args.only in (None, "slither")
+    use_mythril = args.only in (None, "mythril")
+    if use_slither and not which("slither"):
+        print("[WARN] slither not found, Slither 阶段跳过"); use_slither = False
+    if use_mythril and not which("myth"):
+        print("[WARN] myth not found, Mythril 阶段跳过"); use_mythril = False
+
+    targets = read_targets(args.list, args.file)
+    if targets is None:
+        entries = sorted(p for p in prepare.DATASETS.rglob("*.sol") if p.is_file())
+        flats = []
+    else:
+        flat_dir = prepare.FLAT_DIR.resolve()
+        flats = [p for p in targets if p.resolve().parent == flat_dir]
+        entries = [p for p in targets if p.resolve().parent != flat_dir]
+    subset = targets is not None or args.limit > 0
+    if args.limit > 0:
+        entries = entries[:args.limit]
+        flats = flats[:max(0, args.limit - len(entries))]
+
+    db = open_db(args.db, not args.no_db)
+    cache = None if args.no_cache else ScanCache(slither.CACHE_DIR, DEFAULT_MAX_MB * 1024 * 1024)
+    prep = prepare.Preparer(force=args.force, db=db)
+    use_artifacts = not args.no_artifacts
+    s_ver = tool_version(["slither", "--version"]) if use_slither else ""
+    m_ver = tool_version(["myth", "version"]) if use_mythril else ""
+
+    def qsize(workers):
+        return args.queue or workers * 2
+
+    # ---- 各阶段 ----
+    def run_slither(flat):
+        return slither.scan_one(flat, prep.resolver, cache, s_ver, use_artifacts, db, slither.DEFAULT_HARD_TIMEOUT)
+
+    def run_mythril(flat):
+        slot = Slot(args.timeout, args.depth, "normal")
+        return mythril.scan_one((flat, slot), prep.resolver, cache, m_ver, use_artifacts, 0.0, db,
+                                mythril.DEFAULT_MEM_MB, mythril.DEFAULT_RETRIES) is not False
+
+    sw = args.slither_workers or args.workers
+    mw = args.mythril_workers or args.workers
+    slither_stage = Stage("slither", run_slither, sw, qsize(sw)).start() if use_slither else None
+    # Mythril 队列不设上限（元素只是路径）：有界时只能在队列容量那么小的窗口里按分数排序，
+    # 先筛完的低分文件会占住队列；不设上限时所有已筛完的文件一起按风险分出队
+    mythril_stage = Stage("mythril", run_mythril, mw, 0, priority=True).start() if use_mythril else None
+
+    # 本次的命中先写到分片文件，结束时再按文件并入 quick_screen.csv
+    qs_csv = screen.OUT / "quick_screen.csv"
+    qs_part = qs_csv.with_name("quick_screen.pipeline.csv")
+    qs_file = open(qs_part, "w", newline="", encoding="utf-8")
+    qs_writer = csv.writer(qs_file)
+    qs_lock = threading.Lock()
+    screened = set()
+
+    def run_screen(pair):
+        entry, flat = pair
+        t0 = time.time()
+        hits = screen.scan_file(entry)
+        score = len(hits) + CATEGORY_BONUS * len({h[0] for h in hits})
+        with qs_lock:
+            screened.add(str(entry))
+            for hit in hits:
+                qs_writer.writerow([str(entry), *hit])
+        if db and hits:
+            db.record_run(entry, "quick_screen", "", [], t0, time.time() - t0, "ok",
+                          [(pat, cat, ctx[:200], "", f"{func}:{line}") for cat, pat, ctx, func, line in hits])
+        if slither_stage:
+            slither_stage.put(flat)
+        if mythril_stage:
+            mythril_stage.put(flat, prio=-score)   # 分数高的先出队
+
+    screen_stage = Stage("screen", run_screen, 1, qsize(args.workers)).start()
+
+    def run_compile(item):
+        key, chunk = item
+        res = prep.compile_chunk(key, chunk, args.batch)
+        for job, (out_path, ok) in zip(chunk, res):
+            if ok:
+                screen_stage.put((Path(job[0]), out_path))
+        good = sum(ok for _, ok in res)
+        return good, len(res) - good
+
+    pw = args.prepare_workers or args.workers
+    compile_stage = Stage("compile", run_compile, pw, qsize(pw)).start()
+
+    pending = {}        # batch_key -> 攒着的编译任务
+
+    def send(key):
+        for chunk in prepare.batches(pending.pop(key), args.batch):
+            compile_stage.put((key, chunk))
+
+    # ---- 投料：未变化的入口直接进入 screen，需要处理的入口在本线程 flatten 后进入编译队列 ----
+    failed = compile_failed_stems()
+    for f in flats:
+        if f.stem not in failed:
+            screen_stage.put((f, f))
+    todo, ready = prep.classify(entries)
+    for pair in ready:
+        screen_stage.put(pair)
+    for f in todo:
+        job = prep.flatten(f)
+        if job is None:
+            continue
+        key = prep.batch_key(job)
+        pending.setdefault(key, []).append(prep.slim(job))
+        if len(pending[key]) >= max(1, args.batch):
+            send(key)
+        elif compile_stage.idle():
+            send(max(pending, key=lambda k: len(pending[k])))
+    for key in list(pending):
+        send(key)
+
+    compile_stage.close()
+    # 与已编译文件正文相同的入口：规范文件编译完后才能硬链接出它们的 flattened 文件与产物
+    for pair in prep.register_aliases():
+        screen_stage.put(pair)
+    screen_stage.close()
+    qs_file.close()
+    if subset:
+        screen.merge_by_file(qs_csv, qs_part, screened)
+    else:
+        screen.merge_csv([qs_part], qs_csv, with_header=False)
+    qs_part.unlink(missing_ok=True)
+    for st in (slither_stage, mythril_stage):
+        if st: st.close()
+
+    pass_list, fail_list = prep.finish(entries, prune=not subset)
+    if cache:
+        cache.save_stats("pipeline")
+    if db:
+        db.close()
+
+    wall = time.time() - started
+    print(f"[DONE] pipeline {wall:.1f}s  compile pass={len(pass_list)} fail={len(fail_list)} "
+          f"(unchanged {prep.skipped}, aliased {prep.aliased})")
+    for st in (compile_stage, screen_stage, slither_stage, mythril_stage):
+        if st:
+            print(f"  {st.name:<8} workers={st.workers:<3} ok={st.done:<6} fail={st.failed:<6} busy={st.busy:.1f}s")
+
+    if not args.no_report and not args.no_db:
+        cmd = [sys.executable, str(ROOT / "tools" / "make_report.py"), str(ROOT / "out"), "--db", args.db]
+        pmap = ROOT / "config" / "p_mapping.yaml"
+        if pmap.exists():
+            cmd += ["--pmap", str(pmap)]
+        subprocess.run(cmd)
+
+if __name__ == "__main__":
+    main()
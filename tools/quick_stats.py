@@ -1,12 +1,5 @@
 #!/usr/bin/env python3
-import argparse, csv, os, sys, statistics as st, pathlib as pl
-
-def read_rows(csv_path):
-    rows = []
-    with open(csv_path, newline='') as f:
-        for r in csv.DictReader(f):
-            rows.append(r)
-    return rows
+import argparse, csv, heapq, os, sys, pathlib as pl
 
 def to_int(x):
     try:
@@ -14,9 +7,96 @@ def to_int(x):
     except:
         return None
 
-def mean_int(vals):
-    vals = [v for v in vals if isinstance(v, int)]
-    return st.mean(vals) if vals else None
+def scan_csv(csv_path, key_col, top, flt_col=None, ge=None):
+    """
+    单次流式读取 summary.csv：计数 / 均值 / 最值边读边累加，Top-N 用大小为 top 的堆，
+    只有满足 --filter 的行和 P_hits 计数留在内存
+    """
+    stats = {c: [0, 0, None, None] for c in ("slither_issues", "mythril_issues")}   # [n, sum, min, max]
+    heap, flt, ph, files = [], [], {}, 0
+    with open(csv_path, newline='') as f:
+        for i, r in enumerate(csv.DictReader(f)):
+            files += 1
+            for c, s in stats.items():
+                v = to_int(r.get(c))
+                if v is None:
+                    continue
+                s[0] += 1; s[1] += v
+                s[2] = v if s[2] is None else min(s[2], v)
+                s[3] = v if s[3] is None else max(s[3], v)
+            # 堆里放 (key, -行号)：同 key 时保持 CSV 中靠前的行，与稳定排序一致
+            item = (to_int(r.get(key_col)) or -1, -i, r)
+            if len(heap) < top:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+            if flt_col and ge is not None and (to_int(r.get(flt_col)) or 0) >= ge:
+                flt.append(r)
+            for p in [x.strip() for x in (r.get("P_hits") or "").split(";") if x.strip()]:
+                ph[p] = ph.get(p, 0) + 1
+    return {"files": files, "stats": stats, "top": [x[2] for x in sorted(heap, key=lambda x: x[:2], reverse=True)],
+            "filter": flt, "p": ph}
+
+# --db：读取 scripts/findings_db.py 在写入时增量维护的汇总表（rollup_*），
+# 不扫描 findings / runs，代价与库中的文件数无关（看板可以频繁轮询）
+def open_db(path):
+    sys.path.insert(0, str(pl.Path(__file__).resolve().parents[1] / "scripts"))
+    from findings_db import FindingsDB
+    if not os.path.exists(path):
+        sys.exit(f"[ERR] 找不到 {path}")
+    return FindingsDB(pl.Path(path))
+
+def _solc_like(solc_prefix):
+    return solc_prefix.rstrip(".") + ".%"
+
+def db_rows(db, order_tool, limit=None, ge=None, ge_tool=None):
+    """
+    Top-N：rollup_file(tool, n) 索引倒序取前 limit 个；--filter：同一索引上的范围扫描，
+    结果再按 order_tool 的发现数排序（只涉及输出的行）
+    """
+    sql = """SELECT f.stem AS file, f.path AS file_path, f.solc AS solc, s.n AS slither_issues, m.n AS mythril_issues
+             FROM rollup_file k JOIN files f ON f.id = k.file_id
+             LEFT JOIN rollup_file s ON s.file_id = k.file_id AND s.tool = 'slither'
+             LEFT JOIN rollup_file m ON m.file_id = k.file_id AND m.tool = 'mythril'"""
+    if ge is not None:
+        sql += " WHERE k.tool = ? AND k.n >= ?"
+        params = [ge_tool, ge]
+        col = "slither_issues" if order_tool == "slither" else "mythril_issues"
+        rows = [{k: ("" if r[k] is None else r[k]) for k in r.keys()} for r in db.query(sql, params)]
+        return sorted(rows, key=lambda r: r[col] if r[col] != "" else -1, reverse=True)
+    sql += " WHERE k.tool = ? ORDER BY k.n DESC LIMIT ?"
+    return [{k: ("" if r[k] is None else r[k]) for k in r.keys()} for r in db.query(sql, [order_tool, limit])]
+
+def db_summary(db, solc_prefix=None):
+    """文件数、每个工具的均值 / 最值（rollup_count 的直方图）；给出 solc_prefix 时只看该版本前缀"""
+    agg = {}
+    for tool, k in (("any", "a"), ("slither", "s"), ("mythril", "m")):
+        sql = "SELECT SUM(files) AS files, SUM(n * files) AS total, MIN(n) AS lo, MAX(n) AS hi FROM rollup_count WHERE tool = ?"
+        params = [tool]
+        if solc_prefix:
+            sql += " AND solc LIKE ?"
+            params.append(_solc_like(solc_prefix))
+        r = db.query(sql, params)[0]
+        agg[f"{k}_files"] = r["files"] or 0
+        agg[f"{k}_mean"] = r["total"] / r["files"] if r["files"] else None
+        agg[f"{k}_min"], agg[f"{k}_max"] = r["lo"], r["hi"]
+    agg["files"] = agg["a_files"]
+    return agg
+
+def db_top_rules(db, tool, solc_prefix, top):
+    """如 "0.4 版本文件里最常见的 detector"：按命中文件数排序"""
+    sql = "SELECT rule, SUM(hits) AS hits, SUM(files) AS files FROM rollup_rule WHERE tool = ?"
+    params = [tool]
+    if solc_prefix:
+        sql += " AND solc LIKE ?"
+        params.append(_solc_like(solc_prefix))
+    sql += " GROUP BY rule ORDER BY files DESC, hits DESC LIMIT ?"
+    params.append(top)
+    return db.query(sql, params)
+
+def db_p_hist(db):
+    """rollup_p 依赖 rule_p（由 make_report.py --db --pmap 写入）"""
+    return db.query("SELECT p, files FROM rollup_p WHERE files > 0 ORDER BY p")
 
 def try_load_yaml(path):
     try:
@@ -33,7 +113,10 @@ def try_load_yaml(path):
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("csv", help="out/summary.csv")
+    ap.add_argument("csv", nargs="?", default="out/summary.csv", help="out/summary.csv（使用 --db 时忽略）")
+    ap.add_argument("--db", help="SQLite 结果库，如 out/findings.db")
+    ap.add_argument("--top-rules", choices=["slither","mythril","quick_screen"], help="（需 --db）列出最常见的 detector / SWC / 快筛模式")
+    ap.add_argument("--solc", help="（需 --db）只看该版本前缀的文件，如 0.4；作用于 --top-rules 与汇总行")
     ap.add_argument("--top", type=int, default=10)
     ap.add_argument("--by", choices=["slither","mythril"], default="slither")
     ap.add_argument("--filter", choices=["slither","mythril"])
@@ -45,26 +128,43 @@ def main():
     ap.add_argument("--p-mapping", default=os.getenv("P_MAPPING","configs/p_mapping.yaml"))
     args = ap.parse_args()
 
-    rows = read_rows(args.csv)
-    files = len(rows)
-    S = [to_int(r.get("slither_issues")) for r in rows]
-    M = [to_int(r.get("mythril_issues")) for r in rows]
-    s_mean = mean_int(S)
-    m_mean = mean_int(M)
-    s_min, s_max = (min([x for x in S if x is not None] or [None]) , max([x for x in S if x is not None] or [None]))
-    m_min, m_max = (min([x for x in M if x is not None] or [None]) , max([x for x in M if x is not None] or [None]))
+    key_col = "slither_issues" if args.by == "slither" else "mythril_issues"
+    db = open_db(args.db) if args.db else None
+    if db is not None:
+        if args.top_rules:
+            print(f"Top-{args.top} {args.top_rules} rules" + (f" (solc {args.solc}.x)" if args.solc else "") + ":\n")
+            for r in db_top_rules(db, args.top_rules, args.solc, args.top):
+                print(f"  {r['rule']:<40} files={r['files']:<8} hits={r['hits']}")
+            return
+        agg = db_summary(db, args.solc)
+        files = agg["files"]
+        s_mean, s_min, s_max = agg["s_mean"], agg["s_min"], agg["s_max"]
+        m_mean, m_min, m_max = agg["m_mean"], agg["m_min"], agg["m_max"]
+    else:
+        flt_col = None
+        if args.filter:
+            flt_col = "slither_issues" if args.filter == "slither" else "mythril_issues"
+        scan = scan_csv(args.csv, key_col, args.top, flt_col, args.ge)
+        files = scan["files"]
+        (sn, ssum, s_min, s_max), (mn, msum, m_min, m_max) = scan["stats"]["slither_issues"], scan["stats"]["mythril_issues"]
+        s_mean = ssum / sn if sn else None
+        m_mean = msum / mn if mn else None
 
     print(f"files={files}  slither(mean)={s_mean if s_mean is not None else 'NA'}  mythril(mean)={m_mean if m_mean is not None else 'NA'}")
     print(f"slither[min,max]={s_min},{s_max}  mythril[min,max]={m_min},{m_max}\n")
 
     # sorting
-    key_col = "slither_issues" if args.by == "slither" else "mythril_issues"
-    sorted_rows = sorted(rows, key=lambda r: to_int(r.get(key_col)) or -1, reverse=True)
+    if db is not None:
+        sorted_rows = db_rows(db, args.by, limit=args.top)
+    else:
+        sorted_rows = scan["top"]
 
     # optional filter
     if args.filter and args.ge is not None:
-        col = "slither_issues" if args.filter == "slither" else "mythril_issues"
-        flt = [r for r in rows if (to_int(r.get(col)) or 0) >= args.ge]
+        if db is not None:
+            flt = db_rows(db, args.by, ge=args.ge, ge_tool=args.filter)
+        else:
+            flt = scan["filter"]
         print(f"Filter: {args.filter} >= {args.ge}\n")
         header = f"{'file':<60} {'slither_issues':>14}  {'mythril_issues':>14}"
         print(header)
@@ -103,7 +203,15 @@ def main():
         print(f"PARALLEL=2 LIMIT={len(items)} MYTH_TIMEOUT=120 MYTH_DEPTH=160 tools/run_batch.sh {args.emit_list}")
 
     # optional: show P histogram if mapping present
-    if args.show_p:
+    if args.show_p and db is not None:
+        ph = db_p_hist(db)
+        if ph:
+            print("\nP 类别（结果库 rule_p 聚合的文件层命中数）：")
+            for r in ph:
+                print(f"  {r['p']}: {r['files']}")
+        else:
+            print("\n[INFO] 结果库中还没有 rule_p，先运行 tools/make_report.py out --db out/findings.db --pmap config/p_mapping.yaml")
+    elif args.show_p:
         mapping, err = try_load_yaml(args.p_mapping)
         if err == "NO_PYYAML":
             print("\n[WARN] 未安装 pyyaml，无法加载 P 映射。请运行: python3 -m pip install pyyaml")
@@ -114,13 +222,7 @@ def main():
         else:
             # rows 来自 summarize 的 findings_*.csv 更全面；这里先用 summary.csv 的 P_hits（如有）
             # 如果 summary 没有 P_hits，可在 summarize 阶段写入一个文件级别的 P 集合统计。
-            ph = {}
-            for r in rows:
-                ps = (r.get("P_hits") or "").strip()
-                if not ps:
-                    continue
-                for p in [x.strip() for x in ps.split(";") if x.strip()]:
-                    ph[p] = ph.get(p, 0) + 1
+            ph = scan["p"]
             if ph:
                 print("\nP 类别（summary.csv 聚合的文件层命中数）：")
                 for k in sorted(ph.keys()):
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scan_daemon.py — 常驻扫描服务：监视 datasets/ 的变化 + 本地 HTTP 提交接口
+Long-running watch-mode daemon: changed or submitted contracts go through
+prepare → quick screen → Slither / Mythril incrementally, with every cache kept warm.
+
+- 监视：每 --interval 秒 stat 一遍被监视目录下的 .sol（只比较 mtime / 大小，不读内容），
+  新增、修改、删除的文件在安静 --settle 秒后成批进入一轮处理；启动时先对全部文件做一轮追平
+  （增量清单判定未变化的入口不会重新扫描；--no-catch-up 跳过）
+- 每一轮：变化的文件、import 了它们的入口（增量清单中的依赖闭包）、以它们为规范文件的别名
+  一起 classify → flatten → 按 solc 版本批量编译 → 快筛 → Slither / Mythril（同一文件两者并行）
+- 各轮之间保留：solc 解析缓存、增量清单、结果缓存、结果库连接、常驻 Slither worker，
+  单个文件改动的周转只剩真正的编译与分析时间
+- HTTP（只监听 127.0.0.1）：
+    POST /scan        {"path": "datasets/A.sol"} / {"paths": [...]} / {"source": "...", "name": "A.sol"}
+                      默认等待结果（?timeout=秒，默认 600）；?wait=0 立即返回任务号
+    GET  /jobs/<id>   任务状态与结果
+    GET  /status      计数、队列、运行时间
+  提交的文件即使未变化也会扫描（命中结果缓存时直接返回）；提交的源码写到 work/submitted/。
+  每个文件的结果：编译结果、快筛命中、Slither / Mythril 的发现（字段同 findings_db 的 Finding）
+
+用法 / Usage:
+  python3 tools/scan_daemon.py --port 8765
+  curl -s localhost:8765/scan -d '{"path": "datasets/A.sol"}'
+  curl -s 'localhost:8765/scan?wait=0' -d "{\"name\": \"T.sol\", \"source\": $(jq -Rs . < T.sol)}"
+"""
+import argparse, collections, hashlib, importlib, itertools, json, os, re, sys, threading, time, queue
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+prepare = importlib.import_module("01_prepare")
+screen = importlib.import_module("02_quick_screen")
+slither = importlib.import_module("03_run_slither")
+mythril = importlib.import_module("04_run_mythril")
+from scan_pool import which, tool_version, default_workers
+from scan_cache import ScanCache, DEFAULT_MAX_MB
+from findings_db import DEFAULT_DB, open_db, slither_rows, mythril_rows
+from solc_resolver import SolcResolver
+from prepare_manifest import Manifest
+from myth_schedule import Slot
+from slither_worker import WarmSlither
+
+SUBMIT_DIR = ROOT / "work" / "submitted"
+KEEP_JOBS = 1000          # 保留的已完成任务数
+MAX_BODY = 8 << 20        # POST 正文上限
+FINDING_KEYS = ("rule", "category", "title", "severity", "location")
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name) or default)
+    except ValueError:
+        return default
+
+def rel(p) -> str:
+    try:
+        return str(Path(p).resolve().relative_to(ROOT))
+    except ValueError:
+        return str(p)
+
+def snapshot(dirs):
+    """path -> (mtime_ns, size)"""
+    snap = {}
+    for d in dirs:
+        for p in screen.iter_sol_files(d):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            snap[str(p.resolve())] = (st.st_mtime_ns, st.st_size)
+    return snap
+
+def findings(parse, out_json: Path):
+    try:
+        text = out_json.read_text(encoding="utf-8")
+    except OSError:
+        return []
+    return [dict(zip(FINDING_KEYS, row)) for row in parse(text)]
+
+def error_tail(err_txt: Path, n: int = 2000) -> str:
+    try:
+        return err_txt.read_text(encoding="utf-8", errors="replace")[-n:]
+    except OSError:
+        return ""
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, kind, paths, force):
+        self.id = f"{int(time.time())}-{next(Job._ids)}"
+        self.kind, self.paths, self.force = kind, list(paths), force
+        self.state = "queued"
+        self.created, self.finished = time.time(), None
+        self.files = {}           # 入口 -> 结果
+        self.pending = 1          # 本轮分派完成前先占 1，避免扫描先于分派结束时提前完成
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def settle(self, n=1):
+        with self.lock:
+            if self.done.is_set():
+                return
+            self.pending -= n
+            if self.pending <= 0:
+                self.state = "failed" if self.state == "failed" else "done"
+                self.finished = time.time()
+                self.done.set()
+
+    def to_json(self):
+        with self.lock:
+            files = [dict(v) for _, v in sorted(self.files.items())]
+        end = self.finished or time.time()
+        return {"id": self.id, "kind": self.kind, "state": self.state, "created": round(self.created, 3),
+                "elapsed": round(end - self.created, 3), "files": files}
+
+class Daemon:
+    def __init__(self, args):
+        self.args = args
+        self.started = time.time()
+        self.db = open_db(args.db, not args.no_db)
+        self.cache = None if args.no_cache else ScanCache(slither.CACHE_DIR, DEFAULT_MAX_MB * 1024 * 1024)
+        self.resolver = SolcResolver(prepare.RESOLVE_CACHE)
+        self.manifest = Manifest(prepare.MANIFEST, self.resolver.installed)
+        self.use_slither = args.only in (None, "slither") and bool(which("slither"))
+        self.use_mythril = args.only in (None, "mythril") and bool(which("myth"))
+        for tool, on in (("slither", self.use_slither), ("myth", self.use_mythril)):
+            if not on and args.only in (None, tool.replace("myth", "mythril")):
+                print(f"[WARN] {tool} not found, 跳过")
+        self.s_ver = tool_version(["slither", "--version"]) if self.use_slither else ""
+        self.m_ver = tool_version(["myth", "version"]) if self.use_mythril else ""
+        self.warm = None
+        if self.use_slither and not args.no_warm:
+            self.warm = WarmSlither()
+            if not self.warm.start():
+                self.warm = None
+        self.pool = ThreadPoolExecutor(max_workers=max(1, args.workers))
+        self.inflight = []        # 上一轮还在跑的扫描；下一轮 prepare 会改写 flattened 文件，先等它们结束
+        self.queue: "queue.Queue[Job]" = queue.Queue()
+        self.jobs: "collections.OrderedDict[str, Job]" = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    # ---- 任务 ----
+    def submit(self, kind, paths, force=False) -> Job:
+        job = Job(kind, paths, force)
+        with self.lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > KEEP_JOBS:
+                old = next(iter(self.jobs.values()))
+                if not old.done.is_set():
+                    break
+                self.jobs.popitem(last=False)
+        self.queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def submission(self, req: dict):
+        """POST /scan 的正文 → 待处理的路径列表；不合法时抛 ValueError"""
+        if req.get("source") is not None:
+            src = str(req["source"])
+            stem = re.sub(r"[^\w.-]", "_", Path(str(req.get("name") or "Submitted.sol")).stem)[:64] or "Submitted"
+            p = SUBMIT_DIR / f"{stem}_{hashlib.sha256(src.encode('utf-8')).hexdigest()[:10]}.sol"
+            if not p.exists():
+                SUBMIT_DIR.mkdir(parents=True, exist_ok=True)
+                p.write_text(src, encoding="utf-8")
+            return [p]
+        raw = req.get("paths") or ([req["path"]] if req.get("path") else [])
+        if not raw:
+            raise ValueError('expected "path", "paths" or "source"')
+        out = []
+        for x in raw:
+            p = Path(x) if Path(x).is_absolute() else ROOT / x
+            p = p.resolve()
+            if p.suffix != ".sol" or not p.is_file() or ROOT not in p.parents:
+                raise ValueError(f"not a .sol file under {ROOT}: {x}")
+            out.append(p)
+        return out
+
+    def status(self):
+        with self.lock:
+            states = collections.Counter(j.state for j in self.jobs.values())
+            stats = dict(self.stats)
+        return {"uptime": round(time.time() - self.started, 1), "queued": self.queue.qsize(),
+                "jobs": dict(states), "stats": stats,
+                "tools": {"slither": self.s_ver if self.use_slither else None,
+                          "mythril": self.m_ver if self.use_mythril else None,
+                          "warm_slither": {"started": self.warm.started, "recycled": self.warm.recycled} if self.warm else None},
+                "watch": [rel(d) for d in self.args.watch]}
+
+    # ---- 每一轮 ----
+    def affected(self, paths):
+        """变化的文件 + import 了它们的入口 + 以这些入口为规范文件的别名（只保留仍存在的文件）"""
+        changed = {str(Path(p).resolve()) for p in paths}
+        out = set(changed)
+        for entry, rec in self.manifest.entries.items():
+            if not changed.isdisjoint(rec.get("deps") or ()):
+                out.add(entry)
+        flats = {self.manifest.entries[e].get("flat") for e in out if e in self.manifest.entries}
+        for entry, rec in self.manifest.entries.items():
+            if rec.get("alias_of") in flats:
+                out.add(entry)
+        return sorted(Path(e) for e in out if os.path.isfile(e))
+
+    def cycle(self, job: Job):
+        job.state = "running"
+        wait(self.inflight)
+        t0 = time.monotonic()
+        self.manifest.new_run()
+        prep = prepare.Preparer(db=self.db, resolver=self.resolver, manifest=self.manifest)
+        entries = self.affected(job.paths)
+        todo, _ = prep.classify(entries)
+        jobs = [j for j in (prep.flatten(f) for f in todo) if j is not None]
+        prep.compile_many(jobs, self.args.workers)
+        prep.save()
+        with self.lock:
+            self.stats["cycles"] += 1
+            self.stats["prepared"] += len(todo)
+
+        # 监视到的变化只扫描确实需要重新 prepare 的入口；提交的文件总是扫描
+        want = {str(f.resolve()) for f in todo}
+        if job.force:
+            want |= {str(Path(p).resolve()) for p in job.paths}
+        self.inflight = []
+        by_flat = collections.defaultdict(list)
+        for f in entries:
+            entry = str(f.resolve())
+            if entry not in want:
+                continue
+            rec = self.manifest.entries.get(entry) or {}
+            ok, reason = prep.result.get(entry, (False, "not prepared"))
+            res = {"file": rel(entry), "flat": rec.get("alias_of") or rec.get("flat") or "",
+                   "compile": {"ok": ok, "reason": (reason or "")[-2000:]}}
+            if ok:
+                res["quick_screen"] = self.screen(f)
+                by_flat[prepare.FLAT_DIR / res["flat"]].append(entry)
+            with job.lock:
+                job.files[entry] = res
+        for flat, group in by_flat.items():
+            for tool, fn in (("slither", self.run_slither), ("mythril", self.run_mythril)):
+                if not getattr(self, f"use_{tool}"):
+                    continue
+                with job.lock:
+                    job.pending += 1
+                fut = self.pool.submit(fn, flat)
+                self.inflight.append(fut)
+                fut.add_done_callback(lambda fut, tool=tool, group=group: self._collect(job, tool, group, fut))
+        print(f"[CYCLE] {job.kind} {job.id}: {len(entries)} affected, {len(todo)} prepared, "
+              f"{len(by_flat)} to scan ({time.monotonic() - t0:.2f}s)")
+        job.settle()
+
+    def _collect(self, job: Job, tool, group, fut):
+        try:
+            res = fut.result()
+        except Exception as e:
+            res = {"ok": False, "error": repr(e), "findings": []}
+        with self.lock:  # 回调在线程池里执行
+            self.stats[f"{tool}_{'ok' if res['ok'] else 'fail'}"] += 1
+        with job.lock:
+            for entry in group:
+                job.files[entry][tool] = res
+        job.settle()
+
+    def screen(self, f: Path):
+        t0 = time.time()
+        hits = screen.scan_file(f)
+        if self.db:  # 没有命中也记一条 run，文件改好后 current_findings 里的旧命中随之消失
+            self.db.record_run(f, "quick_screen", "", [], t0, time.time() - t0, "ok",
+                               [(pat, cat, ctx[:200], "", f"{func}:{line}") for cat, pat, ctx, func, line in hits])
+        return [{"category": cat, "pattern": pat, "function": func, "line": line} for cat, pat, _, func, line in hits]
+
+    def run_slither(self, flat: Path):
+        ok = slither.scan_one(flat, self.resolver, self.cache, self.s_ver, not self.args.no_artifacts, self.db,
+                              slither.DEFAULT_HARD_TIMEOUT, self.warm)
+        if ok:
+            return {"ok": True, "findings": findings(slither_rows, slither.OUT_DIR / (flat.stem + ".json"))}
+        return {"ok": False, "findings": [], "error": error_tail(slither.OUT_DIR / (flat.stem + ".err.txt"))}
+
+    def run_mythril(self, flat: Path):
+        slot = Slot(self.args.timeout, self.args.depth, "normal")
+        ok = mythril.scan_one((flat, slot), self.resolver, self.cache, self.m_ver, not self.args.no_artifacts, 0.0,
+                              self.db, mythril.DEFAULT_MEM_MB, mythril.DEFAULT_RETRIES)
+        if ok:
+            return {"ok": True, "findings": findings(mythril_rows, mythril.OUT_DIR / (flat.stem + ".json"))}
+        return {"ok": False, "findings": [], "error": error_tail(mythril.OUT_DIR / (flat.stem + ".err.txt"))}
+
+    def run_cycles(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self.cycle(job)
+            except Exception as e:
+                print(f"[ERR] cycle {job.id}: {e!r}")
+                job.state = "failed"
+                job.settle(job.pending)
+
+    # ---- 监视 ----
+    def watch(self, catch_up: bool):
+        snap = snapshot(self.args.watch)
+        if catch_up and snap:
+            self.submit("catch-up", list(snap))
+        pending, last = set(), 0.0
+        while True:
+            time.sleep(self.args.interval)
+            cur = snapshot(self.args.watch)
+            changed = {p for p, st in cur.items() if snap.get(p) != st} | (snap.keys() - cur.keys())
+            snap = cur
+            if changed:
+                pending |= changed
+                last = time.monotonic()
+            if pending and time.monotonic() - last >= self.args.settle:
+                self.submit("watch", sorted(pending))
+                pending = set()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self.warm:
+            self.warm.close()
+        self.resolver.save()
+        if self.db:
+            self.db.close()
+
+class Handler(BaseHTTPRequestHandler):
+    daemon: Daemon = None
+
+    def _send(self, code, obj):
+        body = json.dumps(obj, ensure_ascii=False, indent=1).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        if u.path == "/status":
+            return self._send(200, self.daemon.status())
+        m = re.fullmatch(r"/jobs/([\w-]+)", u.path)
+        if m:
+            job = self.daemon.get(m.group(1))
+            return self._send(200, job.to_json()) if job else self._send(404, {"error": "no such job"})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        u = urlparse(self.path)
+        if u.path != "/scan":
+            return self._send(404, {"error": "not found"})
+        q = parse_qs(u.query)
+        try:
+            # 参数先全部校验完再提交任务：出错时不会留下一个没人等的任务
+            n = int(self.headers.get("Content-Length") or 0)
+            if n < 0:
+                raise ValueError(f"bad Content-Length: {n}")
+            if n > MAX_BODY:
+                return self._send(413, {"error": f"body larger than {MAX_BODY} bytes"})
+            timeout = float(q.get("timeout", ["600"])[0])
+            if not 0 <= timeout < float("inf"):
+                raise ValueError(f"bad timeout: {timeout}")
+            req = json.loads(self.rfile.read(n) or b"{}")
+            paths = self.daemon.submission(req if isinstance(req, dict) else {})
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+        job = self.daemon.submit("api", paths, force=True)
+        if q.get("wait", ["1"])[0] not in ("0", "false"):
+            job.done.wait(timeout)
+        self._send(200 if job.done.is_set() else 202, job.to_json())
+
+    def log_message(self, fmt, *a):
+        pass
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=env_int("SCAN_DAEMON_PORT", 8765), help="HTTP 端口（只监听 127.0.0.1）")
+    ap.add_argument("--watch", action="append", default=None, help="被监视的目录，可重复（默认 datasets/）")
+    ap.add_argument("--interval", type=float, default=2.0, help="轮询间隔（秒）")
+    ap.add_argument("--settle", type=float, default=0.5, help="最后一次变化后等待多久再处理（秒）")
+    ap.add_argument("--no-catch-up", action="store_true", help="启动时不对现有文件做追平")
+    ap.add_argument("-j", "--workers", type=int, default=default_workers(), help="编译 / 扫描并发数（默认取 PARALLEL 或 4）")
+    ap.add_argument("--only", choices=["slither", "mythril"], default=os.environ.get("ONLY") or None)
+    ap.add_argument("--timeout", type=int, default=env_int("MYTH_TIMEOUT", 60), help="Mythril --execution-timeout")
+    ap.add_argument("--depth", type=int, default=env_int("MYTH_DEPTH", 80), help="Mythril --max-depth")
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--no-artifacts", action="store_true")
+    ap.add_argument("--no-warm", action="store_true", help="Slither 不用常驻 worker")
+    ap.add_argument("--db", default=str(DEFAULT_DB))
+    ap.add_argument("--no-db", action="store_true")
+    args = ap.parse_args()
+    args.watch = [Path(d) if Path(d).is_absolute() else ROOT / d for d in (args.watch or ["datasets"])]
+
+    d = Daemon(args)
+    Handler.daemon = d
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=d.run_cycles, name="cycles", daemon=True).start()
+    threading.Thread(target=d.watch, args=(not args.no_catch_up,), name="watch", daemon=True).start()
+    print(f"[INFO] scan daemon on http://127.0.0.1:{args.port}  watching {', '.join(rel(w) for w in args.watch)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[INFO] shutting down")
+    finally:
+        server.server_close()
+        d.close()
+
+if __name__ == "__main__":
+    main()